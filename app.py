@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
+import html
+import logging
 import os
-from typing import List
+from typing import List, Optional
 from operator import itemgetter
 
 from pathlib import Path
@@ -9,14 +11,23 @@ import streamlit as st
 # LangChain pieces
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableLambda
-from langchain.schema import Document
-from langchain_ollama import ChatOllama
+from langchain_core.documents import Document
 
-# Our helpers
-from scripts.retriever import get_retriever, preprocess_query
+# Our helpers (retriever is lazy: no torch / index load until first RAG question)
+from scripts.retriever import (
+    get_embedder, get_retriever, get_settings, preprocess_query, retrieval_settings, store_generation,
+    warm_up,
+)
 from scripts.faq_router import maybe_answer_faq
+from scripts.answer_cache import AnswerCache, answer_key, docs_to_records
+from scripts.context_packer import doc_sources, estimate_tokens, pack_context
+from scripts.query_cache import normalize_query
+from scripts.semantic_cache import SemanticAnswerCache
+from scripts.ollama_keeper import OllamaKeeper
+from scripts.route_planner import TransferPlanner, build_planner
 
 APP_TITLE = "TramMate (offline)"
+log = logging.getLogger("trammate")
 
 SYSTEM = (
     "You are TramMate, a Melbourne tram helper focused on the CBD. "
@@ -83,32 +94,113 @@ with colB:
         mmr_lambda = st.slider("MMR diversity (λ)", 0.0, 1.0, 0.5, 0.05)
         show_chunks = st.checkbox("Show retrieved chunks", value=False)
         require_ctx = st.checkbox("Only answer if context found", value=False)
+        llm_status = st.empty()  # filled once the Ollama keeper exists (below)
         st.caption("Tip: Rebuild index after KB changes → `scripts/make_chunks.py` then `scripts/build_faiss.py`.")
 
 # -------------------- LLM & Chain --------------------
 @st.cache_resource(show_spinner=False)
-def get_llm(model: str, temperature: float):
-    base_url = os.environ.get("TRAMMATE_OLLAMA_URL", "http://127.0.0.1:11434")
-    return ChatOllama(model=model, temperature=temperature, num_ctx=4096, base_url=base_url)
+def start_retriever_warmup():
+    """Load embedder + index in the background once per process (TRAMMATE_WARMUP=0 disables)."""
+    if os.environ.get("TRAMMATE_WARMUP", "1") == "0":
+        return None
+    return warm_up(background=True)
+
+start_retriever_warmup()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache (settings.yaml → answer_cache)."""
+    cfg = get_settings().get("answer_cache") or {}
+    db = cfg.get("sqlite_path")
+    return AnswerCache(
+        max_entries=int(cfg.get("max_entries", 256)),
+        db_path=(Path(__file__).resolve().parent / db) if db else None,
+        ttl_seconds=float(cfg.get("ttl_seconds", 86400)),
+    )
 
 @st.cache_resource(show_spinner=False)
-def get_chain(model: str, temperature: float, k: int, lambda_mult: float):
-    retriever = get_retriever(k=k, lambda_mult=lambda_mult)
-
-    def format_docs(docs: List[Document]) -> str:
-        if not docs:
-            return "[no context retrieved]"
-        parts = []
-        for d in docs:
-            src = (d.metadata or {}).get("source", "unknown")
-            parts.append(f"{d.page_content}\n[{src}]")
-        return "\n\n".join(parts)
-
-    def build_inputs(q: str):
-        qn = preprocess_query(q)
-        docs = retriever.invoke(qn) if qn else []
-        return {"question": qn, "docs": docs}
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Process-wide paraphrase cache (settings.yaml → semantic_cache)."""
+    cfg = get_settings().get("semantic_cache") or {}
+    return SemanticAnswerCache(
+        threshold=float(cfg.get("threshold", 0.9)),
+        max_entries=int(cfg.get("max_entries", 512)),
+        max_age_seconds=float(cfg.get("max_age_seconds", 86400)),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_ollama() -> OllamaKeeper:
+    """Process-wide Ollama client + keep-warm pinger (settings.yaml → ollama)."""
+    cfg = get_settings().get("ollama") or {}
+    keeper = OllamaKeeper(
+        base_url=os.environ.get("TRAMMATE_OLLAMA_URL", cfg.get("base_url", "http://127.0.0.1:11434")),
+        keep_alive=cfg.get("keep_alive", "30m"),
+        ping_interval_s=float(cfg.get("ping_interval_s", 240)),
+        timeout_s=float(cfg.get("timeout_s", 120)),
+        idle_s=float(cfg.get("idle_s", 3600)),
+        retry_s=float(cfg.get("retry_s", 60)),
+    )
+    keeper.start_pinger()
+    return keeper
+
+@st.cache_resource(show_spinner=False)
+def get_planner() -> Optional[TransferPlanner]:
+    """Process-wide CBD trip planner (settings.yaml → planner); None if disabled or not curated yet."""
+    cfg = get_settings().get("planner") or {}
+    if not cfg.get("enabled", True):
+        return None
+    try:
+        return build_planner(cfg)
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model: str, temperature: float):
+    from langchain_ollama import ChatOllama  # deferred: not needed for FAQ answers
+    keeper = get_ollama()
+    # pooled keep-alive connections + timeout through ChatOllama's public client_kwargs
+    llm = ChatOllama(model=model, temperature=temperature, num_ctx=4096,
+                     base_url=keeper.base_url, keep_alive=keeper.keep_alive,
+                     client_kwargs=keeper.client_kwargs())
+    keeper.ensure(model)
+    return llm
+
+# preload the selected model while the user types (TRAMMATE_WARMUP=0 disables)
+if os.environ.get("TRAMMATE_WARMUP", "1") != "0" and (get_settings().get("ollama") or {}).get("warm_up", True):
+    get_ollama().ensure(model_name)
+llm_status.caption(get_ollama().describe(model_name))  # local state only; probed by the keeper's threads
+
+def format_docs(docs: List[Document]) -> str:
+    """Prompt context: overlapping / repeated chunks merged, capped at the token budget
+    (settings.yaml → context_packer)."""
+    cfg = get_settings().get("context_packer") or {}
+    cpt = float(cfg.get("chars_per_token", 3.5))
+    context, _ = pack_context(
+        docs,
+        max_tokens=int(cfg.get("max_tokens", 1800)),
+        min_overlap=int(cfg.get("min_overlap_chars", 30)),
+        min_tail_tokens=int(cfg.get("min_tail_tokens", 64)),
+        count_tokens=lambda text: estimate_tokens(text, cpt),
+    )
+    return context
 
+def render_cached(answer: str, sources: list, label: str) -> None:
+    """Replay a cached answer in the answer card and restore its sources panel."""
+    docs = [Document(page_content=r["page_content"], metadata=r["metadata"]) for r in sources]
+    st.session_state["last_docs"] = docs
+    chips = "".join(
+        f'<span class="chip">{src}</span>'
+        for src in dict.fromkeys(src for d in docs for src in doc_sources(d))
+    )
+    st.empty().markdown(
+        f'<div class="card">{answer}<div class="chips"><span class="chip">{label}</span>{chips}</div></div>',
+        unsafe_allow_html=True,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_chain(model: str, temperature: float):
+    """Generation stage only: expects {"question": str, "docs": List[Document]}.
+    Retrieval happens once in the answer flow and its docs are passed in."""
     prompt = ChatPromptTemplate.from_messages([
         ("system", SYSTEM),
         ("human", "Question: {question}\n\nContext:\n{context}\n\nAnswer concisely with citations.")
@@ -116,8 +208,7 @@ def get_chain(model: str, temperature: float, k: int, lambda_mult: float):
     llm = get_llm(model, temperature)
 
     chain = (
-        RunnableLambda(build_inputs)
-        | {
+        {
             "question": itemgetter("question"),
             "context":  RunnableLambda(lambda x: format_docs(x["docs"])),
         }
@@ -156,15 +247,54 @@ if submitted:
         st.session_state["last_docs"] = []
         st.stop()
 
+    # Trip planner fast-path: routing questions ("how do I get from X to Y") inside the CBD;
+    # fare / myki / policy questions fall through to the KB (deterministic, no LLM)
+    planner = get_planner()
+    trip_ans = planner.answer(q_pre) if planner else None
+    if trip_ans:
+        st.success("Answer from the CBD tram planner")
+        with st.container():
+            body = html.escape(trip_ans).replace("\n", "<br>")  # stop names go into raw HTML
+            st.markdown(f'<div class="card">{body}<div class="chips"><span class="chip">route_stops_cbd.csv</span></div></div>', unsafe_allow_html=True)
+        st.session_state["last_docs"] = []
+        st.stop()
+
+    # Answer cache: same normalized question + model/settings + index → replay instantly
+    cache = get_answer_cache()
+    q_norm, retrieval = normalize_query(q_pre), retrieval_settings()
+    cache_key = answer_key(q_norm, model_name, temperature, top_k, mmr_lambda, store_generation(), retrieval)
+    cached = cache.get(cache_key)
+    if cached:
+        render_cached(*cached, label="cached")
+        st.stop()
+
     try:
-        chain = get_chain(model_name, temperature, top_k, mmr_lambda)
+        chain = get_chain(model_name, temperature)
+        retriever = get_retriever(k=top_k, lambda_mult=mmr_lambda)
+        # one forward pass; the query-embedding cache hands it to retrieval below
+        q_vec = get_embedder().embed_query(q_pre)
     except Exception as e:
         st.error("Couldn't initialize retriever/LLM. Did you build the FAISS index and start Ollama?")
         st.exception(e)
         st.stop()
 
+    # key on the store this retriever reads: a rebuild since the lookup must not file
+    # these answers under the new generation (or old ones under it)
+    gen = store_generation(retriever.vectorstore)
+    cache_key = answer_key(q_norm, model_name, temperature, top_k, mmr_lambda, gen, retrieval)
+
+    # Semantic cache: a paraphrase of a recent question asked under the same settings
+    sem_cache = get_semantic_cache()
+    sem_ns = answer_key("", model_name, temperature, top_k, mmr_lambda, gen, retrieval)
+    near = sem_cache.get(sem_ns, q_vec)
+    if near:
+        past_q, answer, sources, sim = near
+        st.caption(f"Similar to an earlier question: “{past_q}” (similarity {sim:.2f})")
+        render_cached(answer, sources, label="similar question")
+        st.stop()
+
     with st.spinner("Retrieving & generating…"):
-        retriever = get_retriever(k=top_k, lambda_mult=mmr_lambda)
+        # single retrieval; the same docs feed the prompt and the sources panel
         docs = retriever.invoke(q_pre)
         st.session_state["last_docs"] = docs
 
@@ -173,26 +303,43 @@ if submitted:
             st.stop()
 
         # Stream the answer
+        inputs = {"question": q_pre, "docs": docs}
         ph = st.empty()
         answer_chunks = []
+        answer = None
         try:
-            for chunk in chain.stream(query):
+            for chunk in chain.stream(inputs):
                 text = getattr(chunk, "content", str(chunk))
                 answer_chunks.append(text)
                 ph.markdown(f'<div class="card">{"".join(answer_chunks)}</div>', unsafe_allow_html=True)
+            answer = "".join(answer_chunks)
         except Exception:
             st.error("Streaming failed — trying a single call…")
             try:
-                resp = chain.invoke(query)
-                ph.markdown(f'<div class="card">{getattr(resp, "content", str(resp))}</div>', unsafe_allow_html=True)
+                resp = chain.invoke(inputs)
+                answer = getattr(resp, "content", str(resp))
+                ph.markdown(f'<div class="card">{answer}</div>', unsafe_allow_html=True)
             except Exception as e2:
                 st.exception(e2)
 
+        # the answer is already on screen: cache writes are best-effort and must not
+        # send a delivered answer back through the fallback (or show an error under it)
+        if answer is not None:
+            sources = docs_to_records(docs)
+            try:
+                cache.put(cache_key, answer, sources)
+            except Exception as e:
+                log.warning("answer cache write failed: %s", e)
+            try:
+                sem_cache.put(sem_ns, q_vec, q_pre, answer, sources)
+            except Exception as e:
+                log.warning("semantic cache write failed: %s", e)
+
 # -------------------- OPTIONAL: Sources panel --------------------
 if 'last_docs' in st.session_state and st.session_state['last_docs'] and show_chunks:
     st.subheader("Retrieved context")
     for i, d in enumerate(st.session_state["last_docs"], 1):
-        with st.expander(f"#{i} — {(d.metadata or {}).get('source', 'unknown')}"):
+        with st.expander(f"#{i} — {', '.join(doc_sources(d))}"):
             st.write(d.page_content)
             st.code(d.metadata, language="json")
 
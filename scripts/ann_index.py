@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""FAISS index kinds for the mmap store: flat (exact), ivf_flat and hnsw (approximate).
+The approximate kinds can hold quantized codes instead of floats (see build_index).
+
+Knobs live under store.ann in config/settings.yaml; build_vectors.py picks the kind
+from store.kind and writes it as <store>/index.faiss. Search-time knobs (nprobe /
+ef_search) are recorded in the store manifest so the retriever applies them on load.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+INDEX_KINDS = ("flat", "ivf_flat", "hnsw")
+# faiss wants ~39 training points per IVF centroid
+_MIN_POINTS_PER_CENTROID = 39
+# rows copied into RAM per index.add() call when X is a memmap
+_ADD_ROWS = 1 << 16
+
+
+def auto_nlist(n: int) -> int:
+    nlist = int(4 * math.sqrt(max(n, 1)))
+    return max(1, min(nlist, n // _MIN_POINTS_PER_CENTROID))
+
+
+def training_sample(X: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    """Uniform sample of rows used to train IVF centroids (all rows if n <= size)."""
+    if X.shape[0] <= size:
+        return X
+    rng = np.random.default_rng(seed)
+    return X[np.sort(rng.choice(X.shape[0], size=size, replace=False))]
+
+
+def search_params(kind: str, ann: Optional[Dict[str, Any]], n: int) -> Dict[str, Any]:
+    """Resolve the effective build + search params for `kind` from store.ann."""
+    ann = ann or {}
+    if kind == "ivf_flat":
+        nlist = int(ann.get("nlist") or auto_nlist(n))
+        return {"nlist": nlist, "nprobe": min(int(ann.get("nprobe", 8)), nlist),
+                "train_sample": int(ann.get("train_sample", 20000))}
+    if kind == "hnsw":
+        return {"m": int(ann.get("hnsw_m", 32)),
+                "ef_construction": int(ann.get("ef_construction", 80)),
+                "ef_search": int(ann.get("ef_search", 64))}
+    return {}
+
+
+def build_index(X: np.ndarray, kind: str = "flat", params: Optional[Dict[str, Any]] = None,
+                quant: Optional[Dict[str, Any]] = None):
+    """Build an inner-product faiss index of `kind` over X (float32, normalized rows).
+    X may be a memmap: it is added in blocks of _ADD_ROWS rows, so besides the index
+    itself only one block (plus the training sample) is held in memory.
+
+    quant (quantize.quant_params) makes an approximate kind store float16 / int8 / PQ
+    codes instead of full floats (IVF-SQ / IVF-PQ, HNSW-SQ / HNSW-PQ); its scores are
+    then approximate too, and the store re-scores its candidates exactly."""
+    import faiss
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind {kind!r}; expected one of {INDEX_KINDS}")
+    params = params or {}
+    mode = (quant or {}).get("mode", "none")
+    if mode != "none" and kind == "flat":
+        raise ValueError("A flat index is exact; quantized stores scan their codes instead")
+    d = X.shape[1]
+    if mode == "pq" and d % quant["pq_m"]:
+        raise ValueError(f"pq_m={quant['pq_m']} must divide the embedding dim {d}")
+    sq = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}.get(mode)
+    # PQ needs a few dozen points per centroid of each sub-quantizer
+    n_train = 40 * (1 << quant["pq_nbits"]) if mode == "pq" else 0
+    if kind == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(d)
+        if sq is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, params["nlist"], sq, faiss.METRIC_INNER_PRODUCT)
+        elif mode == "pq":
+            index = faiss.IndexIVFPQ(quantizer, d, params["nlist"], quant["pq_m"], quant["pq_nbits"],
+                                     faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        n_train = max(n_train, params["train_sample"], params["nlist"] * _MIN_POINTS_PER_CENTROID)
+    elif kind == "hnsw":
+        if sq is not None:
+            index = faiss.IndexHNSWSQ(d, sq, params["m"], faiss.METRIC_INNER_PRODUCT)
+        elif mode == "pq":
+            index = faiss.IndexHNSWPQ(d, quant["pq_m"], params["m"], quant["pq_nbits"],
+                                      faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(d, params["m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+        if mode != "none":
+            n_train = max(n_train, quant["train_sample"])
+    else:
+        index = faiss.IndexFlatIP(d)
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(training_sample(X, n_train), dtype=np.float32))
+    for a in range(0, X.shape[0], _ADD_ROWS):
+        index.add(np.ascontiguousarray(X[a:a + _ADD_ROWS], dtype=np.float32))
+    configure_search(index, kind, params)
+    return index
+
+
+def configure_search(index, kind: str, params: Optional[Dict[str, Any]]) -> None:
+    """Apply search-time knobs (nprobe / efSearch) to a loaded index."""
+    params = params or {}
+    if kind == "ivf_flat" and "nprobe" in params:
+        index.nprobe = int(params["nprobe"])
+    elif kind == "hnsw" and "ef_search" in params:
+        index.hnsw.efSearch = int(params["ef_search"])
+
+
+def recall_report(index, X: np.ndarray, kind: str, k: int = 10, n_queries: int = 200,
+                  seed: int = 0) -> List[Dict[str, float]]:
+    """recall@k and per-query latency of `index` vs exact search, sweeping its search knob.
+
+    Queries are stored vectors with a little noise, so they resemble real questions
+    that land near, but not exactly on, a chunk.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(X.shape[0], size=min(n_queries, X.shape[0]), replace=False)]
+    Q = Q + rng.normal(0, 0.05, Q.shape).astype(np.float32)
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True)
+    k = min(k, X.shape[0])
+
+    t = time.perf_counter()
+    S = Q @ X.T
+    gt = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    flat_ms = (time.perf_counter() - t) * 1000 / len(Q)
+
+    if kind == "ivf_flat":
+        knob, values = "nprobe", [v for v in (1, 2, 4, 8, 16, 32, 64, 128) if v <= index.nlist]
+    elif kind == "hnsw":
+        knob, values = "ef_search", [16, 32, 64, 128, 256]
+    else:
+        knob, values = None, [None]
+
+    saved = index.nprobe if kind == "ivf_flat" else index.hnsw.efSearch if kind == "hnsw" else None
+    rows = []
+    for v in values:
+        if knob:
+            configure_search(index, kind, {knob: v})
+        t = time.perf_counter()
+        _, ids = index.search(Q, k)
+        ms = (time.perf_counter() - t) * 1000 / len(Q)
+        hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(ids, gt))
+        rows.append({"knob": knob or "-", "value": v if v is not None else "-",
+                     f"recall@{k}": hits / (k * len(Q)), "ms_per_query": ms, "flat_ms_per_query": flat_ms})
+    if knob:
+        configure_search(index, kind, {knob: saved})
+    return rows
+
+
+def print_report(rows: List[Dict[str, float]], kind: str) -> None:
+    if not rows:
+        return
+    rkey = next(key for key in rows[0] if key.startswith("recall@"))
+    print(f"ANN report ({kind}) vs exact flat search, {rows[0]['flat_ms_per_query']:.3f} ms/query:")
+    print(f"  {'knob':>10} {'value':>6} {rkey:>10} {'ms/query':>10}")
+    for r in rows:
+        print(f"  {r['knob']:>10} {str(r['value']):>6} {r[rkey]:>10.3f} {r['ms_per_query']:>10.3f}")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Full-answer cache: (question, model, temperature, k, λ, retrieval settings, index
+generation) -> answer + sources.
+
+In-process LRU in front of an optional SQLite file; entries older than ttl_seconds
+are treated as misses (and purged from SQLite on open).
+"""
+from pathlib import Path
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def answer_key(question: str, model: str, temperature: float, k: int,
+               lambda_mult: float, generation: str, retrieval: Optional[Dict[str, Any]] = None) -> str:
+    """`retrieval`: the other retrieval knobs (search type, fetch_k, ...), see
+    retriever.retrieval_settings()."""
+    payload = json.dumps(
+        [question, model, round(float(temperature), 4), int(k), round(float(lambda_mult), 4), generation,
+         retrieval or {}],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def docs_to_records(docs) -> List[Dict[str, Any]]:
+    return [{"page_content": d.page_content, "metadata": dict(d.metadata or {})} for d in docs]
+
+
+class AnswerCache:
+    """LRU of key -> (created_at, answer, source records), backed by an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 256, db_path: Optional[Path] = None,
+                 ttl_seconds: float = 86400, clock: Callable[[], float] = time.time):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.clock = clock  # wall-clock seconds; injectable so expiry is testable
+        self._lru: "OrderedDict[str, Tuple[float, str, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        if db_path:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, created REAL NOT NULL, answer TEXT NOT NULL, sources TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM answers WHERE created < ?", (self.clock() - self.ttl,))
+            self._db.commit()
+
+    def _fresh(self, created: float) -> bool:
+        return self.clock() - created <= self.ttl
+
+    def _remember(self, key: str, entry: Tuple[float, str, list]) -> None:
+        if not self.max_entries:
+            return
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """(answer, source records) for a fresh entry, else None."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and not self._fresh(entry[0]):
+                del self._lru[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, answer, sources FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self._fresh(row[0]):
+                    entry = (row[0], row[1], json.loads(row[2]))
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: str, answer: str, sources: List[Dict[str, Any]]) -> None:
+        entry = (self.clock(), answer, sources)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers (key, created, answer, sources) VALUES (?, ?, ?, ?)",
+                    (key, entry[0], answer, json.dumps(sources, ensure_ascii=False)),
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size_mem": len(self._lru)}
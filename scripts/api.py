@@ -1,9 +1,17 @@
 # scripts/api.py
-from retriever import get_retriever, preprocess_query
+from typing import List
+
+from retriever import get_retriever, preprocess_query, retrieve_many as _retrieve_many
+
+def _to_ui(docs) -> List[dict]:
+    return [{"text": d.page_content, "source": d.metadata.get("source", ""), "meta": d.metadata} for d in docs]
 
 def retrieve_for_ui(question: str, k: int = 6):
     retriever = get_retriever(k)
     q = preprocess_query(question)
-    docs = retriever.get_relevant_documents(q)
-    return [{"text": d.page_content, "source": d.metadata.get("source", ""),"meta": d.metadata} for d in docs]
+    docs = retriever.invoke(q) if q else []
+    return _to_ui(docs)
 
+def retrieve_many(questions: List[str], k: int = 6) -> List[List[dict]]:
+    """Batched retrieve_for_ui for log replay / evals: one encoder call, one index search."""
+    return [_to_ui(docs) for docs in _retrieve_many(questions, k=k)]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Latency of NumPy MMR (scripts/mmr.py) vs langchain's maximal_marginal_relevance.
+
+Runs on the built mmap store when present (data/kb/vectorstore/mmap), otherwise on a
+random unit-norm matrix of the same width. Both pickers get identical candidates.
+
+Usage: python scripts/bench_mmr.py [--k 6] [--lambda 0.5] [--repeats 50]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from mmr import mmr_select
+
+STORE = Path("data/kb/vectorstore/mmap/vectors.npy")
+
+
+def load_matrix(n_min: int) -> np.ndarray:
+    if STORE.exists():
+        X = np.load(STORE, mmap_mode="r")
+        if X.shape[0] >= n_min:
+            return X
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((max(n_min, 2000), 384)).astype(np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def timeit(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.5)
+    ap.add_argument("--repeats", type=int, default=50)
+    args = ap.parse_args()
+
+    X = load_matrix(500)
+    rng = np.random.default_rng(1)
+    print(f"matrix {X.shape}, k={args.k}, λ={args.lam}")
+    print(f"{'fetch_k':>8} {'langchain':>12} {'numpy':>12} {'speedup':>8}  same picks")
+    for fetch_k in (35, 100, 500):
+        q = np.asarray(X[rng.integers(X.shape[0])], dtype=np.float32) + rng.normal(0, 0.05, X.shape[1]).astype(np.float32)
+        ids = np.argsort(-(X @ q))[:fetch_k]
+        cand = np.asarray(X[ids], dtype=np.float32)
+        t_lc = timeit(lambda: maximal_marginal_relevance(q, cand, lambda_mult=args.lam, k=args.k), args.repeats)
+        t_np = timeit(lambda: mmr_select(q, cand, k=args.k, lambda_mult=args.lam), args.repeats)
+        same = maximal_marginal_relevance(q, cand, lambda_mult=args.lam, k=args.k) == \
+            mmr_select(q, cand, k=args.k, lambda_mult=args.lam)
+        print(f"{fetch_k:>8} {t_lc * 1e3:>10.3f}ms {t_np * 1e3:>10.3f}ms {t_lc / t_np:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark for the FAQ fast-path vs. the retriever stack.
+
+Each case runs in a fresh interpreter so import caches don't leak between runs.
+  before: importing the baseline retriever module (scripts/ at <baseline>, extracted to a
+          temp dir with git archive), which built the embedder at import time
+  after:  the lazy import, and an FAQ answer right after process start
+
+Without --baseline, the baseline is the parent of the commit that made
+scripts/retriever.py lazy (the one adding get_embedder(), found with git log -S), so
+the benchmark works in any clone with history.
+
+Usage: python scripts/bench_startup.py [--runs 5] [--baseline <rev>]
+"""
+import argparse
+import io
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# introduced by the commit that moved the embedder out of import time
+LAZY_MARKER = "def get_embedder("
+
+CASES = {
+    "before: import baseline retriever (eager)": (
+        "import sys; sys.path.insert(0, {baseline_dir!r}); import retriever"
+    ),
+    "after:  import scripts.retriever (lazy)": "import scripts.retriever",
+    "after:  FAQ answer from cold start": (
+        "import scripts.retriever; from scripts.faq_router import maybe_answer_faq; "
+        "maybe_answer_faq('is the city circle tram free?')"
+    ),
+}
+
+TIMER = (
+    "import time; _t = time.perf_counter()\n"
+    "{body}\n"
+    "print(time.perf_counter() - _t)\n"
+)
+
+
+def git(*args: str) -> str:
+    return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def resolve_baseline() -> str:
+    """Last revision whose scripts/retriever.py constructed the embedder at import."""
+    added = git("log", "--format=%H", "-S", LAZY_MARKER, "--", "scripts/retriever.py").splitlines()
+    if not added:
+        raise SystemExit("Can't find the eager retriever in this checkout's history "
+                         "(shallow clone?); pass --baseline <rev>")
+    return git("rev-parse", "--short", f"{added[-1]}^")  # oldest match: where it was added
+
+
+def extract_baseline(rev: str, out_dir: Path) -> Path:
+    """Extract scripts/ at `rev` (the retriever and the siblings it imports) into
+    out_dir; returns the directory holding retriever.py."""
+    tar = subprocess.run(["git", "archive", "--format=tar", rev, "scripts"], cwd=ROOT,
+                         capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(tar)) as tf:
+        tf.extractall(out_dir)
+    return out_dir / "scripts"
+
+
+def time_case(body: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", TIMER.format(body=body)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "failed")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--baseline", help="git revision of the eager retriever (default: found in history)")
+    args = ap.parse_args()
+    rev = args.baseline or resolve_baseline()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_dir = str(extract_baseline(rev, Path(tmp)))
+        print(f"baseline: {rev}")
+        print(f"{'case':<42} {'median':>10} {'min':>10}")
+        for name, body in CASES.items():
+            try:
+                times = [time_case(body.format(baseline_dir=baseline_dir)) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{name:<42} {'n/a':>10}  ({e})")
+                continue
+            print(f"{name:<42} {statistics.median(times) * 1000:>8.1f}ms {min(times) * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
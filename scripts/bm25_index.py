@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Sparse BM25 index stored next to the mmap vector store (same row ids).
+
+Layout of <store>/bm25/:
+  params.json   k1, b, n_docs, avg_len, vocabulary (term -> term id)
+  indptr.npy    int64 (V + 1) CSR row pointers, one row per term
+  doc_ids.npy   int32 postings, sorted by doc id within each term
+  tfs.npy       float32 term frequencies matching doc_ids
+  doc_len.npy   float32 token count per doc
+
+Usage (rebuild for an existing store): python scripts/bm25_index.py [store_dir]
+"""
+from pathlib import Path
+from array import array
+from collections import Counter
+import json
+import os
+import re
+import shutil
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# route numbers ("96"), stop numbers ("#19" -> "19") and street names survive as exact tokens
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+# postings buffered before a sorted run is spilled to disk (12 bytes each)
+_RUN_POSTINGS = 1 << 22
+
+
+def _spill_run(run_dir: Path, k: int, terms: array, docs: array, tfs: array) -> Path:
+    """Sort one buffer of (term, doc, tf) postings by term (docs stay ascending within
+    a term: they arrive in doc order and the sort is stable) and save it as a run."""
+    t = np.frombuffer(terms, dtype=np.int32)
+    order = np.argsort(t, kind="stable")
+    path = run_dir / f"run{k:05d}.npy"
+    np.save(path, np.stack([t[order], np.frombuffer(docs, dtype=np.int32)[order],
+                            np.frombuffer(tfs, dtype=np.int32)[order]]))
+    return path
+
+
+def build_bm25(out_dir: Path, texts: Iterable[str], k1: float = 1.2, b: float = 0.75,
+               run_postings: int = _RUN_POSTINGS) -> Path:
+    """Tokenize texts (row i == vector id i) and write the CSR postings to out_dir.
+
+    texts is consumed once, so a generator over the store's texts.bin works. Postings
+    are buffered as int32 arrays and spilled to sorted runs every `run_postings`, then
+    the runs are scattered into memmapped doc_ids / tfs using the per-term counts; memory
+    stays at one run (12 bytes a posting) plus the vocabulary and 4 bytes per doc."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    run_dir = out_dir / "runs.tmp"
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    run_dir.mkdir()
+    vocab: Dict[str, int] = {}
+    df = array("q")
+    lengths = array("f")
+    runs: List[Path] = []
+    terms, docs, tfs = array("i"), array("i"), array("i")
+    for i, t in enumerate(texts):
+        toks = tokenize(t)
+        lengths.append(len(toks))
+        for term, tf in Counter(toks).items():
+            tid = vocab.get(term)
+            if tid is None:
+                tid = vocab[term] = len(df)
+                df.append(0)
+            df[tid] += 1
+            terms.append(tid)
+            docs.append(i)
+            tfs.append(tf)
+        if len(terms) >= run_postings:
+            runs.append(_spill_run(run_dir, len(runs), terms, docs, tfs))
+            terms, docs, tfs = array("i"), array("i"), array("i")
+    if len(terms):
+        runs.append(_spill_run(run_dir, len(runs), terms, docs, tfs))
+    del terms, docs, tfs
+    doc_len = np.frombuffer(lengths, dtype=np.float32) if len(lengths) else np.zeros(0, dtype=np.float32)
+
+    indptr = np.zeros(len(df) + 1, dtype=np.int64)
+    if len(df):
+        indptr[1:] = np.cumsum(np.frombuffer(df, dtype=np.int64))
+    total = int(indptr[-1])
+    # write-then-rename so a running app's memmaps of the old postings stay valid
+    tmp = {name: out_dir / (name + ".tmp") for name in ("indptr.npy", "doc_ids.npy", "tfs.npy", "doc_len.npy")}
+    doc_ids = np.lib.format.open_memmap(tmp["doc_ids.npy"], mode="w+", dtype=np.int32, shape=(total,))
+    tf_out = np.lib.format.open_memmap(tmp["tfs.npy"], mode="w+", dtype=np.float32, shape=(total,))
+    # runs cover ascending doc ranges, so appending each run's slice per term keeps docs sorted
+    fill = indptr[:-1].copy()
+    for path in runs:
+        run_terms, run_docs, run_tfs = np.load(path)
+        uniq, start, count = np.unique(run_terms, return_index=True, return_counts=True)
+        pos = fill[run_terms] + (np.arange(len(run_terms)) - np.repeat(start, count))
+        doc_ids[pos] = run_docs
+        tf_out[pos] = run_tfs
+        fill[uniq] += count
+    doc_ids.flush()
+    tf_out.flush()
+    del doc_ids, tf_out
+    shutil.rmtree(run_dir)
+    for name, arr in (("indptr.npy", indptr), ("doc_len.npy", doc_len)):
+        with tmp[name].open("wb") as f:  # a path without .npy would get one appended
+            np.save(f, arr)
+    for name, path in tmp.items():
+        os.replace(path, out_dir / name)
+    params = {
+        "k1": k1,
+        "b": b,
+        "n_docs": len(doc_len),
+        "avg_len": float(doc_len.mean()) if len(doc_len) else 0.0,
+        "vocab": vocab,
+    }
+    (out_dir / "params.json").write_text(json.dumps(params, ensure_ascii=False), encoding="utf-8")
+    return out_dir
+
+
+class BM25Index:
+    """Read side of build_bm25(); postings are memory-mapped."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        params = json.loads((path / "params.json").read_text(encoding="utf-8"))
+        self.k1 = float(params["k1"])
+        self.b = float(params["b"])
+        self.n_docs = int(params["n_docs"])
+        self.avg_len = float(params["avg_len"]) or 1.0
+        self.vocab: Dict[str, int] = params["vocab"]
+        self.indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+        self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+        self.doc_len = np.load(path / "doc_len.npy", mmap_mode="r")
+        df = np.diff(np.asarray(self.indptr)).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # per-doc length normalisation term, computed once
+        self._norm = (self.k1 * (1.0 - self.b + self.b * np.asarray(self.doc_len) / self.avg_len)).astype(np.float32)
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / "params.json").exists()
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every doc for `query` (zeros where no term matches)."""
+        out = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            a, b = int(self.indptr[tid]), int(self.indptr[tid + 1])
+            ids = np.asarray(self.doc_ids[a:b])
+            tf = np.asarray(self.tfs[a:b])
+            # ids are unique within a term's postings, so fancy += is safe
+            out[ids] += self.idf[tid] * tf * (self.k1 + 1.0) / (tf + self._norm[ids])
+        return out
+
+    def search(self, query: str, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, scores) with score > 0, optionally restricted by a boolean mask."""
+        s = self.scores(query)
+        if mask is not None:
+            s[~mask] = 0.0
+        hits = np.flatnonzero(s > 0)
+        if not len(hits):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        k = min(int(k), len(hits))
+        top = hits[np.argpartition(-s[hits], k - 1)[:k]]
+        top = top[np.argsort(-s[top], kind="stable")]
+        return top.astype(np.int64), s[top]
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> List[int]:
+    """Fuse several ranked id lists: score(d) = sum 1 / (rrf_k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking, 1):
+            fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (rrf_k + rank)
+    return [i for i, _ in sorted(fused.items(), key=lambda x: (-x[1], x[0]))[:k]]
+
+
+if __name__ == "__main__":
+    store = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data/kb/vectorstore/mmap")
+    offsets = np.load(store / "offsets.npy", mmap_mode="r")
+    blob = np.memmap(store / "texts.bin", dtype=np.uint8, mode="r") if int(offsets[-1]) else b""
+    texts = (bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1))
+    build_bm25(store / "bm25", texts)
+    print(f"BM25 index over {len(offsets) - 1} chunks → {store / 'bm25'}")
@@ -3,27 +3,55 @@ import json
 from pathlib import Path
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
+import numpy as np
+import yaml
+from mmap_store import splice_embeddings, write_store
+from kb_manifest import chunk_id
+from embedding_cache import open_cache
 
+CFG = yaml.safe_load(Path("config/settings.yaml").read_text())
+MODEL_NAME = CFG['embed']['model_name']
+NORMALIZE = bool(CFG['embed'].get('normalize', True))
 KB_DIR = Path("data/kb")
 CHUNKS = KB_DIR / "chunks.jsonl"
 OUTDIR = KB_DIR / "vectorstore"  # will contain FAISS files
 OUTDIR.mkdir(parents=True, exist_ok=True)
 
-texts, metas = [], []
+texts, metas, ids = [], [], []
 
 with CHUNKS.open('r', encoding='utf-8') as f:
     for line in f:
         obj = json.loads(line)
+        if obj.get("dup_of"):  # dedupe marks repeats; their sources live on the survivor
+            continue
         texts.append(obj["text"])
         metas.append(obj.get("meta", {}))
+        ids.append(obj.get("id") or chunk_id(obj))
 
 emb = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    encode_kwargs={"normalize_embeddings": True},
+    model_name=MODEL_NAME,
+    encode_kwargs={"normalize_embeddings": NORMALIZE},
 )
 
-vs = FAISS.from_texts(texts=texts, embedding=emb, metadatas=metas)
+# embed once (only chunk ids the existing mmap store doesn't hold, and of those only
+# texts the embedding cache hasn't seen), feed both the LangChain FAISS index and
+# the pickle-free mmap store
+cache = open_cache(CFG['embed'])
+encode = cache.wrap(emb.embed_documents) if cache else emb.embed_documents
+X, n_new = splice_embeddings(ids, texts, encode, OUTDIR / "mmap",
+                             model_name=MODEL_NAME, normalize=NORMALIZE)
+print(f"{len(texts)} chunks: {len(texts) - n_new} reused from the existing store, {n_new} new ids"
+      + (f" ({cache.hits} from the embedding cache, {cache.misses} encoded)" if cache else ""))
+vs = FAISS.from_embeddings(list(zip(texts, X.tolist())), embedding=emb, metadatas=metas)
 vs.save_local(str(OUTDIR / "faiss_index"))
-
 print("Saved FAISS index →", OUTDIR / "faiss_index")
 
+# same index kind / quantization as build_vectors.py, so rerunning this script
+# doesn't replace an IVF/HNSW or quantized store with a plain flat one
+kind = CFG['store'].get('kind', 'npz')
+index_kind = kind if kind in ('ivf_flat', 'hnsw') else 'flat'
+write_store(OUTDIR / "mmap", X, texts, metas, model_name=MODEL_NAME, normalize=NORMALIZE,
+            index_kind=index_kind, ann=CFG['store'].get('ann'),
+            quantization=CFG['store'].get('quantization'), ids=ids)
+print(f"Saved memory-mapped store ({index_kind} index) →", OUTDIR / "mmap")
+
@@ -5,6 +5,10 @@ import numpy as np
 from tqdm import tqdm
 import yaml
 from sentence_transformers import SentenceTransformer
+from mmap_store import splice_embeddings, write_store
+from kb_manifest import chunk_id
+from ann_index import print_report, recall_report
+from embedding_cache import open_cache
 
 CFG = yaml.safe_load(Path("config/settings.yaml").read_text())
 KB_DIR = Path("data/kb"); KB_DIR.mkdir(parents=True, exist_ok=True)
@@ -12,34 +16,63 @@ CHUNKS = KB_DIR/"chunks.jsonl"
 STORE_DIR = Path(CFG['store']['path']); STORE_DIR.mkdir(parents=True, exist_ok=True)
 
 # load chunks
-texts, metas = [], []
+texts, metas, ids = [], [], []
 with CHUNKS.open('r', encoding='utf-8') as f:
     for line in f:
         obj = json.loads(line)
         t = (obj.get('text') or '').strip()
-        if not t:
+        if not t or obj.get('dup_of'):  # dedupe marks repeats; their sources live on the survivor
             continue
         texts.append(t)
         metas.append(obj.get('meta', {}))
+        ids.append(obj.get('id') or chunk_id(obj))
 
-print(f"Embedding {len(texts)} chunks …")
-model = SentenceTransformer(CFG['embed']['model_name'])
-X = model.encode(texts, normalize_embeddings=bool(CFG['embed'].get('normalize', True)), batch_size=64, show_progress_bar=True)
-X = X.astype(np.float32)
+_model = None
+def encode(batch):
+    global _model
+    if _model is None:  # only pay for the model load when something actually changed
+        _model = SentenceTransformer(CFG['embed']['model_name'])
+    print(f"Embedding {len(batch)} new/changed chunks …")
+    return _model.encode(batch, normalize_embeddings=bool(CFG['embed'].get('normalize', True)), batch_size=64, show_progress_bar=True)
+
+# reuse vectors of chunk ids the existing mmap store already holds; the rest go
+# through the content-addressed embedding cache before reaching the model
+cache = open_cache(CFG['embed'])
+X, n_new = splice_embeddings(ids, texts, cache.wrap(encode) if cache else encode, STORE_DIR/"mmap",
+                             model_name=CFG['embed']['model_name'],
+                             normalize=bool(CFG['embed'].get('normalize', True)))
+print(f"{len(texts)} chunks: {len(texts) - n_new} reused from the existing store, {n_new} new ids"
+      + (f" ({cache.hits} from the embedding cache, {cache.misses} encoded)" if cache else ""))
 
 # save texts + metas
 (Path(STORE_DIR/"texts.jsonl")).write_text("\n".join(json.dumps({"text": t}, ensure_ascii=False) for t in texts), encoding='utf-8')
 (Path(STORE_DIR/"metas.json")).write_text(json.dumps(metas, ensure_ascii=False, indent=2), encoding='utf-8')
 
 kind = CFG['store'].get('kind', 'npz')
-if kind == 'faiss':
+if kind in ('faiss', 'ivf_flat', 'hnsw'):
     try:
         import faiss
     except Exception as e:
-        print(f"FAISS not available ({e}); falling back to NPZ")
-        kind = 'npz'
-        
-if kind == 'faiss':
+        fallback = 'npz' if kind == 'faiss' else 'mmap'
+        print(f"FAISS not available ({e}); falling back to {fallback.upper()}")
+        kind = fallback
+
+if kind in ('mmap', 'ivf_flat', 'hnsw'):
+    # mmap store; its index.faiss is flat (exact) for 'mmap', approximate otherwise
+    index_kind = 'flat' if kind == 'mmap' else kind
+    mm_dir = write_store(STORE_DIR/"mmap", X, texts, metas,
+                         model_name=CFG['embed']['model_name'],
+                         normalize=bool(CFG['embed'].get('normalize', True)),
+                         index_kind=index_kind, ann=CFG['store'].get('ann'),
+                         quantization=CFG['store'].get('quantization'), ids=ids)
+    print(f"Memory-mapped store ({index_kind} index) saved → {mm_dir}")
+    if index_kind != 'flat':
+        ann_cfg = CFG['store'].get('ann') or {}
+        rows = recall_report(faiss.read_index(str(mm_dir/"index.faiss")), X, index_kind,
+                             k=int(ann_cfg.get('report_k', 10)))
+        print_report(rows, index_kind)
+        (mm_dir/"ann_report.json").write_text(json.dumps(rows, indent=2), encoding='utf-8')
+elif kind == 'faiss':
     d = X.shape[1]
     index = faiss.IndexFlatIP(d) # cosine if vectors are normalized
     index.add(X)
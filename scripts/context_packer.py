@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Token-budgeted prompt context from retrieved chunks.
+
+Retrieved chunks are 900-char windows with 150-char overlap, so neighbours from the
+same document repeat text, and exact repeats turn up across sources. pack_context()
+stitches overlapping windows of the same source/page back into one passage, drops
+chunks whose text is already contained in a kept passage (their sources are still
+cited), and adds passages in relevance order until max_tokens is reached. Prefill
+time on a CPU model grows with every prompt token, so the budget (context_packer in
+config/settings.yaml) directly bounds time-to-first-token.
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SEP = "\n\n"
+
+
+def estimate_tokens(text: str, chars_per_token: float = 3.5) -> int:
+    """Cheap token estimate; ~3.5 chars/token errs high for Llama/Mistral tokenizers on English."""
+    return max(1, math.ceil(len(text) / chars_per_token)) if text else 0
+
+
+def doc_sources(doc) -> List[str]:
+    """Every source a chunk stands for (build-time dedupe merges repeats into one survivor)."""
+    meta = doc.metadata or {}
+    return list(meta.get("sources") or [meta.get("source", "unknown")])
+
+
+def _overlap(a: str, b: str, min_overlap: int) -> int:
+    """Length of the longest suffix of a that is a prefix of b (0 if < min_overlap)."""
+    if min(len(a), len(b)) < min_overlap:
+        return 0
+    anchor = b[:min_overlap]
+    start = max(0, len(a) - len(b))
+    best = 0
+    p = a.find(anchor, start)
+    while p != -1:
+        if b.startswith(a[p:]):
+            best = len(a) - p  # earliest match = longest overlap
+            break
+        p = a.find(anchor, p + 1)
+    return best
+
+
+class _Passage:
+    __slots__ = ("key", "text", "sources", "rank")
+
+    def __init__(self, key: Tuple, text: str, sources: List[str], rank: int):
+        self.key = key
+        self.text = text
+        self.sources = sources
+        self.rank = rank
+
+    def cite(self, sources: List[str]) -> None:
+        self.sources.extend(s for s in sources if s not in self.sources)
+
+    def render(self) -> str:
+        return f"{self.text}\n[{', '.join(self.sources)}]"
+
+
+def merge_passages(docs, min_overlap: int = 30) -> List[_Passage]:
+    """Passages in relevance order (rank of their best chunk), overlapping windows of
+    the same (source, page) stitched together and contained repeats folded in."""
+    passages: List[_Passage] = []
+    for rank, d in enumerate(docs):
+        text = (d.page_content or "").strip()
+        if not text:
+            continue
+        meta = d.metadata or {}
+        key = (meta.get("source"), meta.get("page"))
+        sources = doc_sources(d)
+        folded = " ".join(text.split())
+        placed = False
+        for p in passages:
+            if folded in " ".join(p.text.split()):
+                p.cite(sources)  # duplicated span: keep the citation, not the text
+                placed = True
+                break
+            if p.key != key:
+                continue
+            if p.text in text:
+                p.text = text
+            elif (k := _overlap(p.text, text, min_overlap)):
+                p.text += text[k:]
+            elif (k := _overlap(text, p.text, min_overlap)):
+                p.text = text + p.text[k:]
+            else:
+                continue
+            p.cite(sources)
+            placed = True
+            break
+        if not placed:
+            passages.append(_Passage(key, text, sources, rank))
+    return passages
+
+
+def _truncate(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Longest word-boundary prefix of text that fits max_tokens (binary search)."""
+    words = text.split(" ")
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid]) + " …") <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo]) + " …" if lo else ""
+
+
+def pack_context(docs, max_tokens: int = 1800, min_overlap: int = 30, min_tail_tokens: int = 64,
+                 count_tokens: Optional[Callable[[str], int]] = None) -> Tuple[str, Dict[str, Any]]:
+    """(context string, stats) for the prompt. Passages go in relevance order while they
+    fit; one that doesn't is cut at a word boundary when at least min_tail_tokens remain,
+    else skipped in favour of shorter ones further down."""
+    count = count_tokens or estimate_tokens
+    passages = merge_passages(docs, min_overlap=min_overlap)
+    parts: List[str] = []
+    used = 0
+    truncated = dropped = 0
+    sep = count(_SEP)
+    for p in passages:
+        part = p.render()
+        cost = count(part) + (sep if parts else 0)
+        if used + cost <= max_tokens:
+            parts.append(part)
+            used += cost
+            continue
+        room = max_tokens - used - (sep if parts else 0)
+        cite = f"\n[{', '.join(p.sources)}]"
+        if room >= min_tail_tokens:
+            text = _truncate(p.text, room - count(cite), count)
+            if text:
+                part = text + cite
+                parts.append(part)
+                used += count(part) + (sep if len(parts) > 1 else 0)
+                truncated += 1
+                continue
+        dropped += 1
+    stats = {"docs": len(docs), "passages": len(passages), "packed": len(parts),
+             "truncated": truncated, "dropped": dropped, "tokens": used}
+    return (_SEP.join(parts) if parts else "[no context retrieved]"), stats
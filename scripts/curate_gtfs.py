@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
-import csv, json, zipfile, statistics
+import csv, io, zipfile
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from geo import PolygonSet
+from gtfs_cache import INVALID, GtfsCache, blocks, open_cache
 
 GTFS_DIR = Path("data/gtfs")
 GTFS_DIR.mkdir(parents=True, exist_ok=True)
@@ -22,37 +27,83 @@ def pick_gtfs_zip() -> Path:
     cands.sort(key=lambda p: p.stat().st_mtime, reverse=True)
     return cands[0]
 
-def load_geojson_polygon(path: Path):
-    # Use utf-8-sig to tolerate BOM
-    gj = json.loads(path.read_text(encoding="utf-8-sig"))
-    if gj.get("type") == "FeatureCollection":
-        gj = gj["features"][0]["geometry"]
-    if gj.get("type") == "Polygon":
-        coords = gj["coordinates"][0]           # outer ring
-    elif gj.get("type") == "MultiPolygon":
-        coords = gj["coordinates"][0][0]        # first polygon outer ring
-    else:
-        raise ValueError("Unsupported GeoJSON geometry")
-    # return as list of (lon, lat)
-    return [(float(x), float(y)) for x, y in coords]
-
-def point_in_polygon(lon, lat, polygon):
-    # Ray casting algorithm
-    x, y = lon, lat
-    inside = False
-    n = len(polygon)
-    for i in range(n):
-        x1, y1 = polygon[i]
-        x2, y2 = polygon[(i + 1) % n]
-        intersect = ((y1 > y) != (y2 > y)) and (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-12) + x1)
-        if intersect:
-            inside = not inside
-    return inside
-
-def read_txt(zf: zipfile.ZipFile, name: str):
-    with zf.open(name) as f:
-        rows = list(csv.DictReader((line.decode("utf-8-sig") for line in f)))
-    return rows
+def iter_columns(zf: zipfile.ZipFile, name: str, columns):
+    """Stream `name` out of the zip as tuples of just `columns` ("" where a column is
+    missing or a row is short). Nothing but the current row is held in memory."""
+    with zf.open(name) as raw:
+        f = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        rdr = csv.reader(f)
+        header = [h.strip() for h in next(rdr, [])]
+        idx = [header.index(c) if c in header else None for c in columns]
+        for row in rdr:
+            if not row:
+                continue
+            yield tuple(row[i] if i is not None and i < len(row) else "" for i in idx)
+
+def median_from_counts(counts: Counter):
+    """statistics.median of the multiset {value: count} without expanding it."""
+    n = sum(counts.values())
+    if not n:
+        return 0
+    lo_rank, hi_rank = (n - 1) // 2, n // 2
+    lo = hi = None
+    seen = 0
+    for v in sorted(counts):
+        seen += counts[v]
+        if lo is None and seen > lo_rank:
+            lo = v
+        if seen > hi_rank:
+            hi = v
+            break
+    return lo if lo == hi or n % 2 else (lo + hi) / 2
+
+def route_stop_orders(cache: GtfsCache, tram_route_codes, ftz_stop_codes):
+    """{(route code, stop code): median stop_sequence} over tram trips calling at FTZ
+    stops, in order of first appearance in stop_times. Scans the memmapped stop_times
+    columns block by block; only matching rows are kept."""
+    n_trip = len(cache.strings("trip_id"))
+    n_stop = len(cache.strings("stop_id"))
+    # trip code -> route code, -1 for trips of non-tram routes
+    trip_route = np.full(n_trip, -1, dtype=np.int64)
+    t_route, t_trip = np.asarray(cache.column("trips", "route_id")), np.asarray(cache.column("trips", "trip_id"))
+    keep = np.isin(t_route, tram_route_codes)
+    trip_route[t_trip[keep]] = t_route[keep]
+    in_ftz = np.zeros(n_stop, dtype=bool)
+    in_ftz[ftz_stop_codes] = True
+
+    st_trip = cache.column("stop_times", "trip_id")
+    st_stop = cache.column("stop_times", "stop_id")
+    st_seq = cache.column("stop_times", "stop_sequence")
+    empty = np.zeros(0, dtype=np.int64)
+    keys, seqs, first = [empty], [empty], [empty]
+    for sl in blocks(len(st_trip)):
+        stop = np.asarray(st_stop[sl])
+        route = trip_route[st_trip[sl]]
+        seq = np.asarray(st_seq[sl])
+        m = in_ftz[stop] & (route >= 0) & (seq != INVALID)
+        keys.append(route[m] * n_stop + stop[m])
+        seqs.append(seq[m].astype(np.int64))
+        first.append(np.flatnonzero(m) + sl.start)
+    keys, seqs, first = np.concatenate(keys), np.concatenate(seqs), np.concatenate(first)
+    if not len(keys):
+        return {}
+
+    # distinct (key, seq) with counts -> one Counter per key, ordered by first row seen
+    uniq, inv = np.unique(keys, return_inverse=True)
+    first_row = np.full(len(uniq), np.iinfo(np.int64).max)
+    np.minimum.at(first_row, inv, first)
+    # (key, seq) packed into one int64 so a plain 1-D unique counts the pairs
+    lo = int(seqs.min())
+    span = int(seqs.max()) - lo + 1
+    pairs, counts = np.unique(inv.ravel() * span + (seqs - lo), return_counts=True)
+    per_key = defaultdict(Counter)
+    for pair, c in zip(pairs.tolist(), counts.tolist()):
+        per_key[pair // span][pair % span + lo] = c
+    out = {}
+    for k in np.argsort(first_row, kind="stable").tolist():
+        key = int(uniq[k])
+        out[key // n_stop, key % n_stop] = median_from_counts(per_key[k])
+    return out
 
 def main():
     if not POLY_PATH.exists():
@@ -61,94 +112,57 @@ def main():
     gtfs_zip = pick_gtfs_zip()
     print(f"Using GTFS zip: {gtfs_zip.name}")
 
-    poly = load_geojson_polygon(POLY_PATH)
-
-    with zipfile.ZipFile(gtfs_zip, "r") as z:
-        try:
-            routes = read_txt(z, "routes.txt")
-            trips = read_txt(z, "trips.txt")
-            stop_times = read_txt(z, "stop_times.txt")
-            stops = read_txt(z, "stops.txt")
-        except KeyError as e:
-            raise FileNotFoundError(f"GTFS missing expected file: {e}. "
-                                    "Zip must contain routes.txt, trips.txt, stop_times.txt, stops.txt")
+    ftz = PolygonSet.from_geojson(POLY_PATH)
+    # CSVs are parsed once per zip; every later run works on the memmapped columns
+    cache = open_cache(gtfs_zip, iter_columns)
 
     # Filter tram routes
-    tram_routes = []
-    for r in routes:
-        try:
-            rtype = int(float(r.get("route_type", 0)))
-        except Exception:
-            rtype = 0
-        if rtype in TRAM_ROUTE_TYPES:
-            tram_routes.append(r)
-    tram_route_ids = {r["route_id"] for r in tram_routes}
+    route_ids = cache.strings("route_id")
+    r_codes = np.asarray(cache.column("routes", "route_id"))
+    r_type = np.asarray(cache.column("routes", "route_type"))
+    r_type = np.where(np.isfinite(r_type), r_type, 0).astype(np.int64)  # int(float(x)), unparsable -> 0
+    short, long_name, desc = (cache.text("routes", c) for c in ("route_short_name", "route_long_name", "route_desc"))
+    tram_routes = [{"route_id": route_ids[r_codes[i]], "route_no": short[i], "route_name": long_name[i] or desc[i]}
+                   for i in np.flatnonzero(np.isin(r_type, list(TRAM_ROUTE_TYPES)))]
+    tram_route_codes = r_codes[np.isin(r_type, list(TRAM_ROUTE_TYPES))]
 
     # Write tram_routes.csv
-    out_routes = [{
-        "route_id": r.get("route_id", ""),
-        "route_no": r.get("route_short_name", ""),
-        "route_name": r.get("route_long_name") or r.get("route_desc", "")
-    } for r in tram_routes]
     with (OUT_DIR / "tram_routes.csv").open("w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=["route_id", "route_no", "route_name"])
-        w.writeheader(); w.writerows(out_routes)
+        w.writeheader(); w.writerows(tram_routes)
 
     # Stops + FTZ flag
-    out_stops = []
-    in_ftz = set()
-    for s in stops:
-        lat = float(s.get("stop_lat", "0"))
-        lon = float(s.get("stop_lon", "0"))
-        if point_in_polygon(lon, lat, poly):
-            in_ftz.add(s["stop_id"])
-        out_stops.append({
-            "stop_id": s.get("stop_id", ""),
-            "stop_name": s.get("stop_name", ""),
-            "lat": lat,
-            "lon": lon,
-            "wheelchair_boarding": s.get("wheelchair_boarding", "")
-        })
+    stop_ids = cache.strings("stop_id")
+    s_codes = np.asarray(cache.column("stops", "stop_id"))
+    lats = np.asarray(cache.column("stops", "stop_lat"))
+    lons = np.asarray(cache.column("stops", "stop_lon"))
+    names = cache.text("stops", "stop_name")
+    wheelchair = cache.text("stops", "wheelchair_boarding")
+    ftz_mask = ftz.contains(lons, lats)
     with (OUT_DIR / "tram_stops.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["stop_id", "stop_name", "lat", "lon", "wheelchair_boarding"])
-        w.writeheader(); w.writerows(out_stops)
+        w = csv.writer(f)
+        w.writerow(["stop_id", "stop_name", "lat", "lon", "wheelchair_boarding"])
+        w.writerows(zip((stop_ids[c] for c in s_codes.tolist()), names, lats.tolist(), lons.tolist(), wheelchair))
 
+    in_ftz = {stop_ids[c] for c in s_codes[ftz_mask].tolist()}
+    sid_to_name = {stop_ids[c]: names[i] for i, c in zip(np.flatnonzero(ftz_mask).tolist(), s_codes[ftz_mask].tolist())}
     with (OUT_DIR / "stops_in_ftz.csv").open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f); w.writerow(["stop_id"])
         for sid in sorted(in_ftz):
             w.writerow([sid])
 
-    # Map stop_ids to route_ids using trips + stop_times
-    route_stops = defaultdict(lambda: defaultdict(list))  # route_id -> stop_id -> [sequences]
-    trip_to_route = {t["trip_id"]: t["route_id"] for t in trips if t["route_id"] in tram_route_ids}
-
-    for st in stop_times:
-        route_id = trip_to_route.get(st["trip_id"])
-        if not route_id:
-            continue
-        sid = st["stop_id"]
-        if sid not in in_ftz:
-            continue
-        try:
-            seq = int(st.get("stop_sequence", "0"))
-        except Exception:
-            continue
-        route_stops[route_id][sid].append(seq)
-
-    # Aggregate: median sequence → order
+    # Map stop_ids to route_ids using trips + stop_times; median sequence → order
     rows = []
-    sid_to_name = {s["stop_id"]: s["stop_name"] for s in stops}
-    rid_to_no   = {r["route_id"]: r.get("route_short_name", "") for r in tram_routes}
-    for rid, stops_dict in route_stops.items():
-        for sid, seqs in stops_dict.items():
-            med = statistics.median(seqs) if seqs else 0
-            rows.append({
-                "route_id": rid,
-                "route_no": rid_to_no.get(rid, ""),
-                "stop_id": sid,
-                "stop_name": sid_to_name.get(sid, ""),
-                "order_in_cbd": f"{med:09.2f}",
-            })
+    rid_to_no   = {r["route_id"]: r["route_no"] for r in tram_routes}
+    for (rc, sc), med in route_stop_orders(cache, tram_route_codes, s_codes[ftz_mask]).items():
+        rid, sid = route_ids[rc], stop_ids[sc]
+        rows.append({
+            "route_id": rid,
+            "route_no": rid_to_no.get(rid, ""),
+            "stop_id": sid,
+            "stop_name": sid_to_name.get(sid, ""),
+            "order_in_cbd": f"{med:09.2f}",
+        })
 
     # Sort by public-facing route number, then route_id, then order
     rows.sort(key=lambda r: (r["route_no"], r["route_id"], r["order_in_cbd"]))
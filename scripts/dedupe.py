@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Exact + near-duplicate chunk detection for make_chunks.py.
+
+Exact duplicates are caught by a sha1 of the case/whitespace-folded text. Near
+duplicates (repeated PDF boilerplate, the same FAQ from faqs.json and a PDF) by
+MinHash signatures over word shingles, bucketed with LSH banding and confirmed by
+the signature-estimated Jaccard similarity. Knobs live under `dedupe` in
+config/settings.yaml.
+"""
+import hashlib
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_PRIME = np.uint64(4294967311)  # smallest prime > 2**32; (a * x + b) stays below 2**64
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) with bands * rows == num_perm whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is closest to the Jaccard threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or err < best[0]:
+            best = (err, bands, rows)
+    return best[1], best[2]
+
+
+class ChunkDeduper:
+    """Feed chunk texts in build order; check() returns the key of an earlier chunk
+    the text duplicates, or registers the text as a new survivor under `key`."""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, shingle_words: int = 3,
+                 min_shingles: int = 8, seed: int = 1):
+        self.threshold = float(threshold)
+        self.num_perm = int(num_perm)
+        self.shingle_words = max(1, int(shingle_words))
+        self.min_shingles = int(min_shingles)
+        self.bands, self.rows = lsh_params(self.num_perm, self.threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._exact: Dict[bytes, Any] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._sigs: List[np.ndarray] = []
+        self._keys: List[Any] = []
+        self.n_exact = 0
+        self.n_near = 0
+
+    @staticmethod
+    def _fold(text: str) -> str:
+        return " ".join((text or "").lower().split())
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (num_perm uint64), or None when the text is too short for
+        the estimate to be meaningful (those are only matched exactly)."""
+        words = _WORD.findall(text.lower())
+        w = self.shingle_words
+        shingles = {" ".join(words[i:i + w]) for i in range(max(1, len(words) - w + 1))}
+        if len(shingles) < self.min_shingles:
+            return None
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def check(self, key: Any, text: str) -> Optional[Any]:
+        digest = hashlib.sha1(self._fold(text).encode("utf-8")).digest()
+        hit = self._exact.get(digest)
+        if hit is not None:
+            self.n_exact += 1
+            return hit
+        sig = self.signature(text)
+        if sig is not None:
+            bands = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+            seen = set()
+            for bucket, band in zip(self._buckets, bands):
+                for j in bucket.get(band, ()):
+                    if j in seen:
+                        continue
+                    seen.add(j)
+                    if float(np.mean(self._sigs[j] == sig)) >= self.threshold:
+                        self.n_near += 1
+                        return self._keys[j]
+            j = len(self._sigs)
+            self._sigs.append(sig)
+            self._keys.append(key)
+            for bucket, band in zip(self._buckets, bands):
+                bucket.setdefault(band, []).append(j)
+        self._exact[digest] = key
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"exact": self.n_exact, "near": self.n_near}
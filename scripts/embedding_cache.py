@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of chunk embeddings for KB builds.
+
+Key = sha1(model name, normalize flag, text), value = the float32 vector, in one SQLite
+table. The builders wrap their encode function with EmbeddingCache.wrap(), so a rebuild
+after re-chunking (size / overlap sweeps) or a metadata-only change only encodes texts
+that were never embedded with this model before. embed.cache_path in settings.yaml
+sets the file; leave it empty to disable.
+"""
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_DB = Path("data/kb/cache/doc_embeddings.sqlite")
+_SQL_BATCH = 500  # keys per SELECT ... IN (...), under SQLite's bound-parameter limit
+
+
+def text_key(model_name: str, normalize: bool, text: str) -> str:
+    payload = json.dumps([model_name, bool(normalize), text], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """hash(model, normalize, text) -> vector, persisted in SQLite."""
+
+    def __init__(self, db_path: Path, model_name: str, normalize: bool = True):
+        self.model_name = model_name
+        self.normalize = bool(normalize)
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path))
+        self._db.execute("CREATE TABLE IF NOT EXISTS demb (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return text_key(self.model_name, self.normalize, text)
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self._key(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        for a in range(0, len(keys), _SQL_BATCH):
+            part = keys[a:a + _SQL_BATCH]
+            rows = self._db.execute(
+                f"SELECT key, vec FROM demb WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            found.update((k, np.frombuffer(v, dtype=np.float32)) for k, v in rows)
+        out = [found.get(k) for k in keys]
+        n_hit = sum(v is not None for v in out)
+        self.hits += n_hit
+        self.misses += len(out) - n_hit
+        return out
+
+    def put_many(self, texts: List[str], X: np.ndarray) -> None:
+        X = np.asarray(X, dtype=np.float32)
+        self._db.executemany(
+            "INSERT OR REPLACE INTO demb (key, vec) VALUES (?, ?)",
+            ((self._key(t), x.tobytes()) for t, x in zip(texts, X)),
+        )
+        self._db.commit()
+
+    def wrap(self, encode: Callable[[List[str]], Any]) -> Callable[[List[str]], np.ndarray]:
+        """encode() that serves cached vectors and only passes the (deduplicated) misses on."""
+        def cached(texts: List[str]) -> np.ndarray:
+            vecs = self.get_many(texts)
+            todo = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+            if todo:
+                fresh = np.asarray(encode(todo), dtype=np.float32)
+                self.put_many(todo, fresh)
+                by_text = dict(zip(todo, fresh))
+                vecs = [v if v is not None else by_text[t] for t, v in zip(texts, vecs)]
+            return np.stack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+        return cached
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def open_cache(embed_cfg: Dict[str, Any]) -> Optional[EmbeddingCache]:
+    """EmbeddingCache for the `embed` section of settings.yaml, or None when disabled."""
+    path = embed_cfg.get("cache_path", DEFAULT_DB)
+    if not path:
+        return None
+    return EmbeddingCache(path, embed_cfg["model_name"], bool(embed_cfg.get("normalize", True)))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Columnar, memory-mapped cache of a GTFS zip.
+
+The first use of a zip converts the columns curation needs into NumPy arrays under
+data/gtfs/cache/<sha1 of the zip>/; later runs (and runtime lookups) np.load them with
+mmap_mode="r" instead of re-parsing CSV. Identifier columns are interned: each
+domain (route_id, trip_id, stop_id) has one string table and every column of that
+domain stores int32 codes into it, so joins are integer array lookups.
+
+Layout of a cache directory:
+  manifest.json          zip sha1, format, row counts, column kinds per table
+  strings/<domain>.json  interned strings, code i == list index i
+  <table>/<column>.npy   codes (int32), numbers (int32 / float64)
+
+A small data/gtfs/cache/index.json remembers (path, size, mtime) -> sha1 so an
+unchanged zip isn't re-hashed on every run.
+
+The statewide PTV download nests one feed per mode (1/google_transit.zip,
+2/google_transit.zip, ...) instead of carrying the .txt files itself; those inner
+feeds are extracted one at a time and their tables appended to the same columns.
+"""
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_ROOT = Path("data/gtfs/cache")
+FORMAT_VERSION = 2
+_BLOCK = 1 << 20  # rows buffered per column before spilling to disk
+
+# table -> [(column, kind)]; kind is a string domain, "str" (own table), "int" or "float"
+SCHEMA: Dict[str, List[Tuple[str, str]]] = {
+    "routes": [("route_id", "route_id"), ("route_short_name", "str"), ("route_long_name", "str"),
+               ("route_desc", "str"), ("route_type", "float")],
+    "stops": [("stop_id", "stop_id"), ("stop_name", "str"), ("stop_lat", "float"),
+              ("stop_lon", "float"), ("wheelchair_boarding", "str")],
+    "trips": [("route_id", "route_id"), ("trip_id", "trip_id")],
+    "stop_times": [("trip_id", "trip_id"), ("stop_id", "stop_id"), ("stop_sequence", "int")],
+}
+_NUMERIC = {"int": ("i", np.int32), "float": ("d", np.float64)}
+INVALID = -1  # int value stored for unparsable numbers
+_NESTED = "google_transit.zip"
+
+
+def zip_hash(path: Path) -> str:
+    """sha1 of the zip, remembered per (path, size, mtime) in CACHE_ROOT/index.json."""
+    path = Path(path)
+    st = path.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    index_path = CACHE_ROOT / "index.json"
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        index = {}
+    entry = index.get(str(path.resolve()))
+    if entry and entry.get("stamp") == stamp:
+        return entry["sha1"]
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    index[str(path.resolve())] = {"stamp": stamp, "sha1": h.hexdigest()}
+    CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+    index_path.write_text(json.dumps(index, indent=2), encoding="utf-8")
+    return h.hexdigest()
+
+
+class _Interner:
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __call__(self, s: str) -> int:
+        code = self.codes.get(s)
+        if code is None:
+            code = self.codes[s] = len(self.strings)
+            self.strings.append(s)
+        return code
+
+
+class _Column:
+    """Append-only typed column spilled to a raw file in blocks, finished as .npy."""
+
+    def __init__(self, path: Path, typecode: str, dtype):
+        self.path = path
+        self.raw = path.with_name(path.name + ".raw")
+        self.typecode = typecode
+        self.dtype = np.dtype(dtype)
+        self.buf = array(typecode)
+        self.n = 0
+        self.f = self.raw.open("wb")
+
+    def append(self, v) -> None:
+        self.buf.append(v)
+        if len(self.buf) >= _BLOCK:
+            self.flush()
+
+    def flush(self) -> None:
+        self.n += len(self.buf)
+        self.buf.tofile(self.f)
+        self.buf = array(self.typecode)
+
+    def finish(self) -> None:
+        self.flush()
+        self.f.close()
+        with self.path.open("wb") as out, self.raw.open("rb") as raw:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.n,),
+            })
+            shutil.copyfileobj(raw, out, 1 << 24)
+        self.raw.unlink()
+
+
+def _to_int(s: str) -> int:
+    # strict, like the CSV curation it replaces: "3.5" or "" is INVALID (curation skips
+    # the row) rather than 3 or 0. route_type, parsed as int(float(x)) there, is a float.
+    try:
+        return int(s)
+    except ValueError:
+        return INVALID
+
+
+def _to_float(s: str) -> float:
+    try:
+        return float(s or "0")
+    except ValueError:
+        return float("nan")
+
+
+def _feeds(outer: zipfile.ZipFile, scratch: Path) -> Iterator[zipfile.ZipFile]:
+    """The GTFS feed(s) in `outer`: itself, or each nested */google_transit.zip in turn,
+    extracted to `scratch` while it is read."""
+    nested = sorted(n for n in outer.namelist() if n.rsplit("/", 1)[-1] == _NESTED)
+    if not nested or "stop_times.txt" in outer.namelist():
+        yield outer
+        return
+    for member in nested:
+        with outer.open(member) as src, scratch.open("wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 24)
+        try:
+            with zipfile.ZipFile(scratch) as z:
+                yield z
+        finally:
+            scratch.unlink()
+
+
+def convert(zip_path: Path, out_dir: Path, iter_columns) -> Path:
+    """Stream every SCHEMA table out of the zip (or out of each feed nested in it) into
+    the columnar layout at out_dir. iter_columns is curate_gtfs.iter_columns
+    (zip, name, columns) -> tuples."""
+    out_dir = Path(out_dir)
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    (tmp / "strings").mkdir(parents=True)
+    domains: Dict[str, _Interner] = {}
+    manifest = {"format": FORMAT_VERSION, "zip_sha1": out_dir.name, "tables": {}}
+    writers: Dict[str, list] = {}
+    parsers: Dict[str, list] = {}
+    for table, cols in SCHEMA.items():
+        (tmp / table).mkdir()
+        writers[table], parsers[table], kinds = [], [], {}
+        for col, kind in cols:
+            if kind in _NUMERIC:
+                typecode, dtype = _NUMERIC[kind]
+                parsers[table].append(_to_int if kind == "int" else _to_float)
+            else:
+                typecode, dtype = "i", np.int32
+                domain = kind if kind != "str" else f"{table}.{col}"
+                parsers[table].append(domains.setdefault(domain, _Interner()))
+                kinds[col] = {"kind": "str", "domain": domain}
+            kinds.setdefault(col, {"kind": kind})
+            writers[table].append(_Column(tmp / table / f"{col}.npy", typecode, dtype))
+        manifest["tables"][table] = {"columns": kinds}
+    seen = set()
+    with zipfile.ZipFile(zip_path) as outer:
+        for z in _feeds(outer, tmp / "feed.zip"):
+            names = set(z.namelist())
+            for table, cols in SCHEMA.items():
+                if f"{table}.txt" not in names:
+                    continue
+                seen.add(table)
+                for row in iter_columns(z, f"{table}.txt", [c for c, _ in cols]):
+                    for w, parse, v in zip(writers[table], parsers[table], row):
+                        w.append(parse(v))
+    missing = sorted(f"{t}.txt" for t in SCHEMA if t not in seen)
+    if missing:
+        for w in (w for ws in writers.values() for w in ws):
+            w.f.close()
+        shutil.rmtree(tmp)
+        raise FileNotFoundError(f"GTFS missing expected file(s): {', '.join(missing)}. "
+                                "Zip must contain routes.txt, trips.txt, stop_times.txt, stops.txt")
+    for table, ws in writers.items():
+        for w in ws:
+            w.finish()
+        manifest["tables"][table]["n"] = ws[0].n
+    for domain, interner in domains.items():
+        (tmp / "strings" / f"{domain}.json").write_text(json.dumps(interner.strings, ensure_ascii=False),
+                                                        encoding="utf-8")
+    # manifest last, then swap the finished directory into place
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    os.replace(tmp, out_dir)
+    return out_dir
+
+
+class GtfsCache:
+    """Read side: memory-mapped columns and interned string tables of one GTFS zip."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported GTFS cache format in {self.path}")
+        self._strings: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return sum(t["n"] for t in self.manifest["tables"].values())
+
+    def n(self, table: str) -> int:
+        return int(self.manifest["tables"][table]["n"])
+
+    def column(self, table: str, col: str) -> np.ndarray:
+        """Raw column: int32 codes for string columns, numbers otherwise (memory-mapped)."""
+        arr = np.load(self.path / table / f"{col}.npy", mmap_mode="r")
+        return arr if len(arr) else np.asarray(arr)
+
+    def domain(self, table: str, col: str) -> str:
+        return self.manifest["tables"][table]["columns"][col]["domain"]
+
+    def strings(self, domain: str) -> List[str]:
+        if domain not in self._strings:
+            self._strings[domain] = json.loads(
+                (self.path / "strings" / f"{domain}.json").read_text(encoding="utf-8"))
+        return self._strings[domain]
+
+    def text(self, table: str, col: str) -> List[str]:
+        """A string column decoded to Python strings (for small tables)."""
+        table_strings = self.strings(self.domain(table, col))
+        return [table_strings[c] for c in np.asarray(self.column(table, col))]
+
+    def code_of(self, domain: str) -> Dict[str, int]:
+        return {s: i for i, s in enumerate(self.strings(domain))}
+
+
+def open_cache(zip_path: Path, iter_columns, root: Optional[Path] = None) -> GtfsCache:
+    """GtfsCache for zip_path, converting it on first use."""
+    root = Path(root) if root else CACHE_ROOT
+    path = root / zip_hash(zip_path)[:16]
+    if not (path / "manifest.json").exists():
+        print(f"Building columnar GTFS cache → {path} (one-time per zip)")
+        convert(zip_path, path, iter_columns)
+    return GtfsCache(path)
+
+
+def blocks(n: int, size: int = 1 << 22) -> Iterable[slice]:
+    """Row slices for scanning a long memmapped column without materializing it."""
+    for a in range(0, n, size):
+        yield slice(a, min(n, a + size))
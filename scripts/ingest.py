@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Streaming KB build: extractors -> bounded queue -> batched embedding -> mmap store.
+
+One pass does the work of make_chunks.py + build_vectors.py for the mmap store. A
+producer thread runs make_chunks.stream_chunks() (PDF pages in its process pool,
+chunks.jsonl and the build manifest written as chunks go by) and hands fixed-size
+batches to a bounded queue; the main thread embeds each batch, reusing vectors the
+existing store holds for the same chunk id (and the embedding cache for the same
+text), and appends it to a StoreWriter. Extraction and embedding overlap, and resident
+chunks are bounded by ingest.queue_batches * ingest.batch_size rather than by the
+corpus; per row only an offset, a chunk id and metadata codes are kept until the
+index / BM25 step.
+
+store.kind picks the faiss index: ivf_flat / hnsw as configured, flat otherwise.
+
+Usage: python scripts/ingest.py
+"""
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+
+from tqdm import tqdm
+
+from make_chunks import CFG, stream_chunks
+from mmap_store import StoreWriter, reusable_rows, splice_rows
+from ann_index import print_report, recall_report
+from embedding_cache import open_cache
+
+_DONE = object()
+
+
+def batched(chunks, size: int):
+    """Non-empty chunks grouped into lists of `size` (the last one shorter)."""
+    batch = []
+    for ch in chunks:
+        if not (ch.get('text') or '').strip():
+            continue
+        batch.append(ch)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(chunks, size: int, q: queue.Queue, stop: threading.Event) -> None:
+    """Producer thread: feed batches until the stream ends, an error occurs or the
+    consumer gives up (stop set); the last item is _DONE or the exception."""
+    try:
+        for batch in batched(chunks, size):
+            if not _put(q, batch, stop):
+                return
+        item = _DONE
+    except BaseException as e:
+        item = e
+    finally:
+        chunks.close()
+    _put(q, item, stop)
+
+
+def main(encode=None):
+    """Build the store under CFG['store']['path']/mmap. encode: list of texts -> vectors,
+    by default the configured SentenceTransformer (loaded on the first cache miss)."""
+    ing = CFG.get('ingest') or {}
+    batch_size = max(1, int(ing.get('batch_size', 256)))
+    depth = max(1, int(ing.get('queue_batches', 4)))
+    model_name = CFG['embed']['model_name']
+    normalize = bool(CFG['embed'].get('normalize', True))
+    store_dir = Path(CFG['store']['path']) / "mmap"
+
+    index_kind = CFG['store'].get('kind', 'npz')
+    index_kind = index_kind if index_kind in ('ivf_flat', 'hnsw') else 'flat'
+    if index_kind != 'flat':
+        try:
+            import faiss
+        except Exception as e:
+            print(f"FAISS not available ({e}); building a flat mmap store")
+            index_kind = 'flat'
+
+    if encode is None:
+        model = None
+        def encode(texts):
+            nonlocal model
+            if model is None:  # only pay for the model load when something actually changed
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+            return model.encode(texts, normalize_embeddings=normalize, batch_size=64, show_progress_bar=False)
+
+    cache = open_cache(CFG['embed'])
+    if cache is not None:
+        encode = cache.wrap(encode)
+    old_rows, old_X = reusable_rows(store_dir, model_name, normalize)
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    merged = {}  # filled by stream_chunks at the end: survivor id -> meta with merged sources
+    rows = {}  # chunk id -> store row, to patch those survivors before finish()
+    producer = threading.Thread(target=_produce, args=(stream_chunks(merged), batch_size, q, stop),
+                                name="ingest-extract", daemon=True)
+    t0 = time.perf_counter()
+    n = n_new = 0
+    embed_s = wait_s = 0.0
+    with StoreWriter(store_dir, model_name=model_name, normalize=normalize, index_kind=index_kind,
+                     ann=CFG['store'].get('ann'),
+                     quantization=CFG['store'].get('quantization')) as writer:
+        producer.start()
+        try:
+            with tqdm(unit="chunk", desc="ingest") as bar:
+                while True:
+                    t = time.perf_counter()
+                    item = q.get()
+                    wait_s += time.perf_counter() - t
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    ids = [ch['id'] for ch in item]
+                    texts = [ch['text'].strip() for ch in item]
+                    t = time.perf_counter()
+                    X, k = splice_rows(ids, texts, encode, old_rows, old_X)
+                    embed_s += time.perf_counter() - t
+                    rows.update((cid, writer.n + i) for i, cid in enumerate(ids))
+                    writer.append(X, texts, [ch.get('meta', {}) for ch in item], ids)
+                    n += len(item)
+                    n_new += k
+                    bar.update(len(item))
+        except BaseException:
+            stop.set()
+            raise
+        producer.join()
+        writer.update_metas({rows[cid]: meta for cid, meta in merged.items() if cid in rows})
+        stream_s = time.perf_counter() - t0
+        out = writer.finish()
+
+    print(f"{n} chunks: {n - n_new} reused from the existing store, {n_new} new ids"
+          + (f" ({cache.hits} from the embedding cache, {cache.misses} encoded)" if cache else ""))
+    print(f"Streamed in {stream_s:.1f}s (embedding {embed_s:.1f}s, waiting on extraction {wait_s:.1f}s); "
+          f"store finalised in {time.perf_counter() - t0 - stream_s:.1f}s → {out}")
+    if index_kind != 'flat':
+        import faiss
+        import numpy as np
+        ann_cfg = CFG['store'].get('ann') or {}
+        rows = recall_report(faiss.read_index(str(out / "index.faiss")),
+                             np.load(out / "vectors.npy", mmap_mode="r"), index_kind,
+                             k=int(ann_cfg.get('report_k', 10)))
+        print_report(rows, index_kind)
+        (out / "ann_report.json").write_text(json.dumps(rows, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
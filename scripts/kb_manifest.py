@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Build manifest for incremental KB rebuilds.
+
+data/kb/build_manifest.json records, per source file, its content hash, the chunker
+config it was chunked with and the ids of the chunks it produced. make_chunks.py
+re-extracts a source only when its hash or the chunker config changed; the vector
+builders re-embed only chunk ids the existing store doesn't already hold.
+"""
+from pathlib import Path
+import hashlib
+import json
+from typing import Any, Dict
+
+MANIFEST_PATH = Path("data/kb/build_manifest.json")
+# bump when extraction / chunking code changes in a way that alters output
+CHUNKER_VERSION = 2
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(chunk: Dict[str, Any]) -> str:
+    """Content address of a chunk: same text + metadata => same id across builds."""
+    payload = json.dumps([chunk.get("text", ""), chunk.get("meta", {})], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def chunker_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "version": CHUNKER_VERSION,
+        "size_chars": cfg["chunk"]["size_chars"],
+        "overlap_chars": cfg["chunk"]["overlap_chars"],
+    }
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict[str, Any]:
+    path = Path(path)
+    if not path.exists():
+        return {"chunker": None, "sources": {}}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {"chunker": None, "sources": {}}
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_PATH) -> None:
+    Path(path).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
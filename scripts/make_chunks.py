@@ -4,10 +4,17 @@ import json
 from email.mime import text
 from importlib.resources import path
 import json, re
+import os
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path, PurePath
 from pdfminer.high_level import extract_text
 from tqdm import tqdm
 import yaml
+from kb_manifest import chunk_id, chunker_config, file_hash, load_manifest, save_manifest
+from dedupe import ChunkDeduper
 
 CFG = yaml.safe_load(Path("config/settings.yaml").read_text())
 KB_DIR = Path("data/kb"); KB_DIR.mkdir(parents=True, exist_ok=True)
@@ -31,17 +38,99 @@ def chunk_text(text: str, source: str, size=900, overlap=150):
         i = max(i + size - overlap, 0)
     return out
 
-def pdf_to_chunks(path: Path):
+def pdf_page_count(path: Path) -> int:
+    from pdfminer.pdfpage import PDFPage
+    with path.open('rb') as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+def _extract_pdf_page(task):
+    """Worker: text of one 0-based page. Returns (path, page, text or None, CPU seconds, error).
+    CPU time of this worker process, so pool queueing and contention aren't counted."""
+    path, page_no = task
+    t0 = time.process_time()
     try:
-        txt = extract_text(str(path))
+        txt = extract_text(path, page_numbers=[page_no])
     except Exception as e:
-        print(f"[warn] PDF extract failed for {path}: {e}")
-        return []
-    txt = clean_ws(txt)
-    # split by double newline into paragraphs for nicer boundaries
-    paras = [p.strip() for p in re.split(r"\n{2,}", txt) if len(p.strip()) > 60]
-    joined = "\n\n".join(paras)
-    return chunk_text(joined, str(path), CFG['chunk']['size_chars'], CFG['chunk']['overlap_chars'])
+        return path, page_no, None, time.process_time() - t0, str(e)
+    return path, page_no, txt, time.process_time() - t0, None
+
+def pdf_workers() -> int:
+    n = int((CFG.get('extract') or {}).get('pdf_workers', 0) or 0)
+    return n if n > 0 else (os.cpu_count() or 1)
+
+def _map_pages(tasks, workers: int):
+    """_extract_pdf_page over tasks, results in task order. With a pool, at most a few
+    pages per worker are in flight so results don't pile up ahead of the consumer."""
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(_extract_pdf_page, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+        todo = iter(tasks)
+        pending = deque(ex.submit(_extract_pdf_page, t) for t in itertools.islice(todo, 4 * workers))
+        while pending:
+            res = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(ex.submit(_extract_pdf_page, nxt))
+            yield res
+
+def iter_pdf_pages(paths, workers: int = 1):
+    """Yield (str(path), [(page_no, text)]) per PDF, in input order, as soon as that
+    file's pages are done. Pages of all files share one process pool (pdfminer is
+    pure-Python and CPU-bound). Prints per-file CPU time after the last file."""
+    files, tasks, stats = [], [], {}
+    for path in paths:
+        try:
+            n_pages = pdf_page_count(path)
+        except Exception as e:
+            print(f"[warn] PDF extract failed for {path}: {e}")
+            n_pages = 0
+        else:
+            stats[str(path)] = {"pages": n_pages, "cpu_s": 0.0, "slowest": (0.0, None)}
+        files.append((str(path), n_pages))
+        tasks += [(str(path), i) for i in range(n_pages)]
+
+    t0 = time.perf_counter()
+    results = _map_pages(tasks, workers)
+    for path, n_pages in files:
+        pages = []
+        for _ in range(n_pages):
+            _, page_no, txt, dt, err = next(results)
+            st = stats[path]
+            st["cpu_s"] += dt
+            if dt > st["slowest"][0]:
+                st["slowest"] = (dt, page_no + 1)
+            if err:
+                print(f"[warn] PDF extract failed for {path} page {page_no + 1}: {err}")
+            elif txt:
+                pages.append((page_no, txt))
+        yield path, pages
+    if tasks:
+        wall = time.perf_counter() - t0
+        print(f"PDF extraction: {len(tasks)} pages from {len(stats)} files in {wall:.1f}s "
+              f"({min(workers, len(tasks))} workers)")
+        for path, st in sorted(stats.items(), key=lambda kv: -kv[1]["cpu_s"]):
+            per_page = st["cpu_s"] / max(st["pages"], 1)
+            print(f"  {st['cpu_s']:7.2f}s CPU  {st['pages']:4d} pages  {per_page:6.3f}s/page  "
+                  f"slowest p.{st['slowest'][1]} {st['slowest'][0]:.2f}s  {path}")
+
+def pdf_pages_to_chunks(path: Path, pages):
+    """Chunk each page on its own so every chunk carries a 1-based `page`."""
+    out = []
+    for page_no, txt in pages:
+        txt = clean_ws(txt)
+        # skip near-empty pages (map legends, blank backs)
+        if len(txt) <= 60:
+            continue
+        for ch in chunk_text(txt, str(path), CFG['chunk']['size_chars'], CFG['chunk']['overlap_chars']):
+            ch['meta']['page'] = page_no + 1
+            out.append(ch)
+    return out
+
+def pdf_to_chunks(path: Path):
+    for _, pages in iter_pdf_pages([path]):
+        return pdf_pages_to_chunks(path, pages)
+    return []
 
 def md_to_chunks(path: Path):
     txt = clean_ws(path.read_text(encoding='utf-8'))
@@ -78,39 +167,179 @@ def csv_summary_lines(path: Path, max_kv=8):
     return rows
 
 # ---------- main ----------
-
-all_chunks = []
-# PDFs
-for p in CFG['sources'].get('include_pdfs', []):
-    path = Path(p)
-    if path.exists():
-        all_chunks += pdf_to_chunks(path)
-
-# Markdown
-for p in CFG['sources'].get('include_markdown', []):
-    path = Path(p)
-    if path.exists():
-        all_chunks += md_to_chunks(path)
-
-# JSON FAQs
-for p in CFG['sources'].get('include_json_faqs', []):
-    path = Path(p)
-    if path.suffix.lower() == '.json' and path.exists():
-        all_chunks += json_faqs_to_chunks(path)
-
-# Curated CSVs → concise lines (nice to answer place/stop questions)
-for name in [
+CURATED_CSVS = [
     'data/curated/tram_routes.csv',
     'data/curated/tram_stops.csv',
     'data/curated/route_stops_cbd.csv',
     'data/curated/stops_in_ftz.csv'
-]:
-    p = Path(name)
-    if p.exists():
-        all_chunks += csv_summary_lines(p)
-
-# write JSONL
-with CHUNKS.open('w', encoding='utf-8') as f:
-    for ch in all_chunks:
-        f.write(json.dumps(ch, ensure_ascii=False) + "\n")
-print(f"Wrote {len(all_chunks)} chunks to {CHUNKS}")
+]
+
+def iter_sources():
+    """(path, extractor) for every configured source, in build order."""
+    # PDFs
+    for p in CFG['sources'].get('include_pdfs', []):
+        yield Path(p), pdf_to_chunks
+    # Markdown
+    for p in CFG['sources'].get('include_markdown', []):
+        yield Path(p), md_to_chunks
+    # JSON FAQs
+    for p in CFG['sources'].get('include_json_faqs', []):
+        if Path(p).suffix.lower() == '.json':
+            yield Path(p), json_faqs_to_chunks
+    # Curated CSVs → concise lines (nice to answer place/stop questions)
+    for name in CURATED_CSVS:
+        yield Path(name), csv_summary_lines
+
+def index_previous_chunks() -> dict:
+    """chunk id -> byte offset of its line in the last chunks.jsonl (ids computed if the
+    file predates them), so unchanged sources are replayed without holding the file."""
+    prev = {}
+    if not CHUNKS.exists():
+        return prev
+    with CHUNKS.open('rb') as f:
+        off = 0
+        for line in f:
+            if line.strip():
+                ch = json.loads(line)
+                prev[ch.get('id') or chunk_id(ch)] = off
+            off += len(line)
+    return prev
+
+def read_chunk(f, offset: int, cid: str) -> dict:
+    """A chunk from the last chunks.jsonl as extracted, without the dedupe annotations
+    (dedupe runs again over every chunk, replayed or not)."""
+    f.seek(offset)
+    ch = json.loads(f.readline())
+    ch['id'] = cid
+    ch.pop('dup_of', None)
+    ch.get('meta', {}).pop('sources', None)
+    return ch
+
+def make_deduper():
+    cfg = CFG.get('dedupe') or {}
+    if not cfg.get('enabled', True):
+        return None
+    return ChunkDeduper(threshold=float(cfg.get('jaccard_threshold', 0.85)),
+                        num_perm=int(cfg.get('num_perm', 64)),
+                        shingle_words=int(cfg.get('shingle_words', 3)),
+                        min_shingles=int(cfg.get('min_shingles', 8)))
+
+def merge_sources(path: Path, merged: dict) -> dict:
+    """Rewrite chunks.jsonl-format `path` in place, giving every survivor that absorbed
+    duplicates from other sources a meta['sources'] list (own source first).
+    Returns chunk id -> updated meta for those survivors."""
+    updated = {}
+    tmp = path.with_name(path.name + '.merge')
+    with path.open('r', encoding='utf-8') as src, tmp.open('w', encoding='utf-8') as out:
+        for line in src:
+            ch = json.loads(line)
+            extra = merged.get(ch['id'])
+            if extra and 'dup_of' not in ch:
+                meta = ch.setdefault('meta', {})
+                sources = list(dict.fromkeys([meta.get('source')] + extra))
+                if len(sources) > 1:
+                    meta['sources'] = sources
+                    updated[ch['id']] = meta
+                    line = json.dumps(ch, ensure_ascii=False) + "\n"
+            out.write(line)
+    os.replace(tmp, path)
+    return updated
+
+def stream_chunks(merged_metas=None):
+    """Yield every chunk to index, in build order, while writing chunks.jsonl and the
+    build manifest.
+
+    Unchanged sources replay their previous chunks; changed PDFs come out of one process
+    pool a file at a time. Duplicates (see dedupe.py) are written to chunks.jsonl with
+    `dup_of` = the surviving chunk's id but not yielded; once the stream ends, survivors
+    that absorbed other sources get meta['sources'], and if `merged_metas` is a dict it
+    receives chunk id -> updated meta so a consumer can patch rows it already took.
+    The new chunks.jsonl replaces the old one, and the manifest is saved, only once the
+    stream has been consumed to the end."""
+    prev_manifest = load_manifest()
+    prev_index = index_previous_chunks()
+    chunker = chunker_config(CFG)
+    same_chunker = prev_manifest.get('chunker') == chunker
+    manifest = {"chunker": chunker, "sources": {}}
+
+    # decide per source: reuse last build's chunks, or extract again
+    plan = []
+    for path, extract in iter_sources():
+        if not path.exists():
+            continue
+        digest = file_hash(path)
+        entry = prev_manifest['sources'].get(str(path))
+        reuse = None
+        if (same_chunker and entry and entry.get('sha1') == digest
+                and entry.get('extractor') == extract.__name__
+                and all(cid in prev_index for cid in entry['chunk_ids'])):
+            reuse = entry['chunk_ids']
+        plan.append((path, extract, digest, reuse))
+
+    # all changed PDFs go through one process pool, pages interleaved across files
+    pdf_pages = iter_pdf_pages([p for p, ex, _, r in plan if r is None and ex is pdf_to_chunks],
+                               workers=pdf_workers())
+
+    tmp = CHUNKS.with_name(CHUNKS.name + '.tmp')
+    prev_f = CHUNKS.open('rb') if prev_index else None
+    deduper = make_deduper()
+    merged = {}  # survivor id -> sources of the duplicates it absorbed
+    n = n_dup = reused = extracted = 0
+    try:
+        with tmp.open('w', encoding='utf-8') as out:
+            for path, extract, digest, reuse in plan:
+                if reuse is not None:
+                    chunks = [read_chunk(prev_f, prev_index[cid], cid) for cid in reuse]
+                    reused += 1
+                else:
+                    if extract is pdf_to_chunks:
+                        _, pages = next(pdf_pages)
+                        chunks = pdf_pages_to_chunks(path, pages)
+                    else:
+                        chunks = extract(path)
+                    for ch in chunks:
+                        ch['id'] = chunk_id(ch)
+                    extracted += 1
+                manifest['sources'][str(path)] = {
+                    "sha1": digest,
+                    "extractor": extract.__name__,
+                    "chunk_ids": [ch['id'] for ch in chunks],
+                }
+                for ch in chunks:
+                    first = None
+                    if deduper is not None and (ch.get('text') or '').strip():
+                        first = deduper.check(ch['id'], ch['text'])
+                    if first is not None:
+                        ch['dup_of'] = first
+                        merged.setdefault(first, []).append(ch.get('meta', {}).get('source'))
+                        n_dup += 1
+                    out.write(json.dumps(ch, ensure_ascii=False) + "\n")
+                    if first is None:
+                        yield ch
+                n += len(chunks)
+            next(pdf_pages, None)  # let it print the timing report
+        if merged:
+            updated = merge_sources(tmp, merged)
+            if merged_metas is not None:
+                merged_metas.update(updated)
+        os.replace(tmp, CHUNKS)
+        save_manifest(manifest)
+    finally:
+        pdf_pages.close()
+        if prev_f is not None:
+            prev_f.close()
+        if tmp.exists():
+            tmp.unlink()
+    print(f"Wrote {n} chunks to {CHUNKS} "
+          f"({extracted} sources extracted, {reused} unchanged and reused)")
+    if deduper is not None:
+        st = deduper.stats()
+        print(f"Dedupe: {n_dup} duplicates marked ({st['exact']} exact, {st['near']} near), "
+              f"{n - n_dup} chunks to index")
+
+def main():
+    for _ in stream_chunks():
+        pass
+
+if __name__ == "__main__":
+    main()
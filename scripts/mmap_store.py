@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""Pickle-free, memory-mapped vector store.
+
+Layout of a store directory:
+  manifest.json   n, dim, model, generation id, metadata keys + value tables
+  vectors.npy     float32 (n, dim) embedding matrix, opened with mmap_mode="r"
+  texts.bin       every chunk text, utf-8, concatenated
+  offsets.npy     int64 (n + 1) byte offsets into texts.bin
+  meta_codes.npy  int32 (n, n_keys) codes into the per-key value tables, -1 = absent
+  index.faiss     optional faiss index (flat | ivf_flat | hnsw, see ann_index.py),
+                  read with IO_FLAG_MMAP when faiss is present
+  chunk_ids.json  content id of each row (kb_manifest.chunk_id), for incremental rebuilds
+  bm25/           sparse BM25 postings over the same rows (see bm25_index.py)
+  codes.npy/...   optional float16 / int8 / PQ codes (see quantize.py); searched first,
+                  then the top candidates are re-scored exactly against vectors.npy.
+                  With ivf_flat / hnsw the codes live in index.faiss instead, and
+                  filtered searches score the allowed rows of vectors.npy directly
+
+Nothing is unpickled; pages are only faulted in for the rows a query touches.
+"""
+from pathlib import Path
+from array import array
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+try:  # imported as scripts.mmap_store or as mmap_store (scripts/*.py)
+    from .bm25_index import BM25Index, build_bm25, reciprocal_rank_fusion
+    from .mmr import mmr_select
+    from .ann_index import build_index, configure_search, search_params
+    from .quantize import QuantizedCodes, quant_params, write_codes
+except ImportError:
+    from bm25_index import BM25Index, build_bm25, reciprocal_rank_fusion
+    from mmr import mmr_select
+    from ann_index import build_index, configure_search, search_params
+    from quantize import QuantizedCodes, quant_params, write_codes
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _swap_dir(staged: Path, out_dir: Path) -> None:
+    """Put the finished `staged` directory at out_dir. The old store is renamed aside
+    first and removed after; a running app's memmaps of its files stay valid."""
+    old = out_dir.with_name(out_dir.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if out_dir.exists():
+        os.replace(out_dir, old)
+    os.replace(staged, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class _MetaEncoder:
+    """Incremental dictionary encoding of metadata: keys, per-key value tables and one
+    row of codes per chunk (-1 = absent). Keys first seen later pad earlier rows."""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.tables: List[list] = []
+        self._key_index: Dict[str, int] = {}
+        self._lookups: List[Dict[str, int]] = []
+        self._blocks: List[np.ndarray] = []
+        self._overrides: Dict[int, List[Tuple[int, int]]] = {}
+
+    def _encode(self, m: Optional[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        pairs = []
+        for k, v in (m or {}).items():
+            j = self._key_index.get(k)
+            if j is None:
+                j = self._key_index[k] = len(self.keys)
+                self.keys.append(k)
+                self.tables.append([])
+                self._lookups.append({})
+            tag = json.dumps(v, sort_keys=True, ensure_ascii=False)
+            code = self._lookups[j].get(tag)
+            if code is None:
+                code = self._lookups[j][tag] = len(self.tables[j])
+                self.tables[j].append(v)
+            pairs.append((j, code))
+        return pairs
+
+    def add(self, metas: List[Dict[str, Any]]) -> None:
+        rows = [self._encode(m) for m in metas]
+        codes = np.full((len(metas), len(self.keys)), -1, dtype=np.int32)
+        for i, pairs in enumerate(rows):
+            for j, code in pairs:
+                codes[i, j] = code
+        self._blocks.append(codes)
+
+    def set(self, row: int, meta: Dict[str, Any]) -> None:
+        """Replace the metadata of an already added row."""
+        self._overrides[row] = self._encode(meta)
+
+    def codes(self) -> np.ndarray:
+        out = np.full((sum(len(c) for c in self._blocks), len(self.keys)), -1, dtype=np.int32)
+        row = 0
+        for c in self._blocks:
+            out[row:row + len(c), :c.shape[1]] = c
+            row += len(c)
+        for row, pairs in self._overrides.items():
+            out[row] = -1
+            for j, code in pairs:
+                out[row, j] = code
+        return out
+
+
+class StoreWriter:
+    """Builds the mmap layout from rows appended in batches (streaming ingestion).
+
+    Everything is written into a sibling staging directory (<out_dir>.building).
+    Vectors and texts go straight to files there as they arrive; per row only a text
+    length, a chunk id and a metadata code row stay in memory. finish() derives the
+    faiss index, quantized codes and BM25 postings from the memory-mapped vectors /
+    texts, writes the manifest last and only then swaps the staging directory in for
+    out_dir. A crash or abort at any point leaves the store being replaced untouched.
+    """
+
+    def __init__(self, out_dir: Path, model_name: str = "", normalize: bool = True,
+                 with_faiss: bool = True, index_kind: str = "flat",
+                 ann: Optional[Dict[str, Any]] = None,
+                 quantization: Optional[Dict[str, Any]] = None):
+        self.out_dir = Path(out_dir)
+        self.out_dir.parent.mkdir(parents=True, exist_ok=True)
+        self.stage_dir = self.out_dir.with_name(self.out_dir.name + ".building")
+        if self.stage_dir.exists():
+            shutil.rmtree(self.stage_dir)  # left over from an interrupted build
+        self.stage_dir.mkdir()
+        self.model_name = model_name
+        self.normalize = bool(normalize)
+        self.with_faiss = with_faiss
+        self.index_kind = index_kind
+        self.ann = ann
+        self.quantization = quantization
+        self.n = 0
+        self.dim: Optional[int] = None
+        self._vec_tmp = self.stage_dir / "vectors.f32.tmp"
+        self._vec_f = self._vec_tmp.open("wb")
+        self._txt_f = (self.stage_dir / "texts.bin").open("wb")
+        self._lengths = array("q")
+        self._ids: Optional[List[str]] = []
+        self._metas = _MetaEncoder()
+        self._done = False
+
+    def __enter__(self) -> "StoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._done:
+            self.abort()
+
+    def append(self, X: np.ndarray, texts: List[str], metas: List[Dict[str, Any]],
+               ids: Optional[List[str]] = None) -> None:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[0] != len(texts) or len(texts) != len(metas):
+            raise ValueError("X, texts and metas must describe the same number of chunks")
+        if self.dim is None:
+            self.dim = int(X.shape[1])
+        elif X.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim changed mid-build ({X.shape[1]} != {self.dim})")
+        self._vec_f.write(X.tobytes())
+        for t in texts:
+            blob = t.encode("utf-8")
+            self._txt_f.write(blob)
+            self._lengths.append(len(blob))
+        self._metas.add(metas)
+        if ids is None or self._ids is None:
+            self._ids = None  # chunk_ids.json only when every row has an id
+        else:
+            self._ids.extend(ids)
+        self.n += len(texts)
+
+    def update_metas(self, metas: Dict[int, Dict[str, Any]]) -> None:
+        """Replace the metadata of rows already appended (row number -> new metadata)."""
+        for row, meta in metas.items():
+            if not 0 <= row < self.n:
+                raise IndexError(f"row {row} out of range for {self.n} rows")
+            self._metas.set(row, meta)
+
+    def abort(self) -> None:
+        self._done = True
+        for f in (self._vec_f, self._txt_f):
+            f.close()
+        shutil.rmtree(self.stage_dir, ignore_errors=True)
+
+    def _iter_texts(self, blob: np.ndarray, offsets: np.ndarray) -> Iterable[str]:
+        for i in range(len(offsets) - 1):
+            yield blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def finish(self) -> Path:
+        if self._done:
+            raise RuntimeError("StoreWriter already finished or aborted")
+        if self.dim is None:
+            self.abort()
+            raise ValueError("No rows were appended")
+        try:
+            return self._finish()
+        except BaseException:
+            self.abort()
+            raise
+
+    def _finish(self) -> Path:
+        self._vec_f.close()
+        self._txt_f.close()
+        stage = self.stage_dir
+        gen = hashlib.sha1()
+        # raw rows -> .npy (header + same bytes), hashing on the way for the generation id
+        with (stage / "vectors.npy").open("wb") as f, self._vec_tmp.open("rb") as raw:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                "fortran_order": False,
+                "shape": (self.n, self.dim),
+            })
+            for block in iter(lambda: raw.read(1 << 24), b""):
+                gen.update(block)
+                f.write(block)
+        self._vec_tmp.unlink()
+        with (stage / "texts.bin").open("rb") as raw:
+            for block in iter(lambda: raw.read(1 << 24), b""):
+                gen.update(block)
+        offsets = np.zeros(self.n + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.frombuffer(self._lengths, dtype=np.int64))
+        np.save(stage / "offsets.npy", offsets)
+        np.save(stage / "meta_codes.npy", self._metas.codes())
+        if self._ids is not None:
+            (stage / "chunk_ids.json").write_text(json.dumps(self._ids), encoding="utf-8")
+
+        X = np.load(stage / "vectors.npy", mmap_mode="r")
+        with_faiss = self.with_faiss
+        qparams = quant_params(self.quantization)
+        quantized = qparams["mode"] != "none"
+        if quantized and (self.index_kind == "flat" or not with_faiss):
+            write_codes(stage, X, qparams)
+            with_faiss = False  # the code scan + rerank replaces an exact flat index
+        index_meta = None
+        if with_faiss:
+            params = search_params(self.index_kind, self.ann, self.n)
+            try:
+                import faiss
+            except ImportError:
+                if self.index_kind != "flat":
+                    raise  # approximate kinds need faiss; flat falls back to numpy search
+                faiss = None
+            if faiss is not None:
+                # approximate kinds hold the codes themselves (IVF-SQ/PQ, HNSW-SQ/PQ): no
+                # full-float index next to them, no second copy of the codes
+                faiss.write_index(build_index(X, self.index_kind, params, qparams if quantized else None),
+                                  str(stage / "index.faiss"))
+                index_meta = {"kind": self.index_kind, "params": params, "quantized": quantized}
+        del X
+        texts = np.memmap(stage / "texts.bin", dtype=np.uint8, mode="r") \
+            if int(offsets[-1]) else np.zeros(0, dtype=np.uint8)
+        build_bm25(stage / "bm25", self._iter_texts(texts, offsets))
+        del texts
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "n": self.n,
+            "dim": self.dim,
+            "model": self.model_name,
+            "normalize": self.normalize,
+            "generation": gen.hexdigest()[:16],
+            "index": index_meta,
+            "quantization": qparams if qparams["mode"] != "none" else None,
+            "meta_keys": self._metas.keys,
+            "meta_values": self._metas.tables,
+        }
+        # manifest last: a store without one is treated as absent/incomplete
+        (stage / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        _swap_dir(stage, self.out_dir)
+        self._done = True
+        return self.out_dir
+
+
+def write_store(out_dir: Path, X: np.ndarray, texts: List[str], metas: List[Dict[str, Any]],
+                model_name: str = "", normalize: bool = True, with_faiss: bool = True,
+                index_kind: str = "flat", ann: Optional[Dict[str, Any]] = None,
+                quantization: Optional[Dict[str, Any]] = None,
+                ids: Optional[List[str]] = None) -> Path:
+    """Write vectors, texts and metadata in the mmap layout; returns out_dir.
+    index_kind/ann choose the faiss index and quantization the compact codes
+    (store.kind / store.ann / store.quantization in settings.yaml)."""
+    with StoreWriter(out_dir, model_name=model_name, normalize=normalize, with_faiss=with_faiss,
+                     index_kind=index_kind, ann=ann, quantization=quantization) as writer:
+        writer.append(X, texts, metas, ids)
+        return writer.finish()
+
+
+def store_exists(path: Path) -> bool:
+    return (Path(path) / MANIFEST).exists()
+
+
+def reusable_rows(store_dir: Path, model_name: str,
+                  normalize: bool = True) -> Tuple[Dict[str, int], Optional[np.ndarray]]:
+    """(chunk id -> row, memmapped vectors) of the existing store at store_dir when it
+    was built with the same embedder, else ({}, None)."""
+    store_dir = Path(store_dir)
+    if store_exists(store_dir) and (store_dir / "chunk_ids.json").exists():
+        man = json.loads((store_dir / MANIFEST).read_text(encoding="utf-8"))
+        if man.get("model") == model_name and bool(man.get("normalize")) == bool(normalize):
+            old_ids = json.loads((store_dir / "chunk_ids.json").read_text(encoding="utf-8"))
+            return {cid: i for i, cid in enumerate(old_ids)}, np.load(store_dir / "vectors.npy", mmap_mode="r")
+    return {}, None
+
+
+def splice_rows(ids: List[str], texts: List[str], encode: Callable[[List[str]], Any],
+                old_rows: Dict[str, int], old_X: Optional[np.ndarray]) -> Tuple[np.ndarray, int]:
+    """Embedding matrix for (ids, texts): rows of old_X for known ids, `encode` for the
+    rest. Returns (X, number of texts actually encoded)."""
+    todo = [i for i, cid in enumerate(ids) if cid not in old_rows]
+    fresh = np.asarray(encode([texts[i] for i in todo]), dtype=np.float32) if todo else None
+    dim = fresh.shape[1] if fresh is not None else (old_X.shape[1] if old_X is not None else 0)
+    X = np.empty((len(ids), dim), dtype=np.float32)
+    keep = [i for i, cid in enumerate(ids) if cid in old_rows]
+    if keep:
+        # copy into memory before the store files the memmap points at are replaced
+        X[keep] = old_X[[old_rows[ids[i]] for i in keep]]
+    if todo:
+        X[todo] = fresh
+    return X, len(todo)
+
+
+def splice_embeddings(ids: List[str], texts: List[str], encode: Callable[[List[str]], Any],
+                      store_dir: Path, model_name: str, normalize: bool = True) -> Tuple[np.ndarray, int]:
+    """Embedding matrix for (ids, texts), reusing rows of the existing store at store_dir
+    when it was built with the same embedder; only unseen chunk ids go through `encode`.
+    Returns (X, number of texts actually encoded)."""
+    return splice_rows(ids, texts, encode, *reusable_rows(store_dir, model_name, normalize))
+
+
+class MmapVectorStore(VectorStore):
+    """Read-only VectorStore over the mmap layout (see module docstring)."""
+
+    def __init__(self, path: Path, embedding: Embeddings):
+        self.path = Path(path)
+        self.embedding = embedding
+        self.manifest = json.loads((self.path / MANIFEST).read_text(encoding="utf-8"))
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format in {self.path}")
+        self.generation: str = self.manifest["generation"]
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self.meta_codes = np.load(self.path / "meta_codes.npy", mmap_mode="r")
+        self.meta_keys: List[str] = self.manifest["meta_keys"]
+        self.meta_values: List[list] = self.manifest["meta_values"]
+        self._texts = np.memmap(self.path / "texts.bin", dtype=np.uint8, mode="r") \
+            if int(self.offsets[-1]) else np.zeros(0, dtype=np.uint8)
+        self.index = None
+        faiss_path = self.path / "index.faiss"
+        if self.manifest.get("index") and faiss_path.exists():
+            self.index = self._read_index(faiss_path)
+        self.postings = self._build_postings()
+        qparams = self.manifest.get("quantization")
+        self.quant = QuantizedCodes(self.path, qparams) \
+            if qparams and QuantizedCodes.exists(self.path, qparams["mode"]) else None
+        self.bm25 = BM25Index(self.path / "bm25") if BM25Index.exists(self.path / "bm25") else None
+
+    def _read_index(self, faiss_path: Path):
+        try:
+            import faiss
+        except ImportError:
+            return None  # exact numpy search over the memmap
+        meta = self.manifest["index"]
+        try:
+            index = faiss.read_index(str(faiss_path), faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            if meta["kind"] == "flat":
+                return None  # this faiss build can't mmap it; the memmap is just as exact
+            index = faiss.read_index(str(faiss_path))
+        configure_search(index, meta["kind"], meta.get("params"))
+        return index
+
+    def __len__(self) -> int:
+        return int(self.manifest["n"])
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    # --- row access (only touches the pages of the requested row) ---
+    def text(self, i: int) -> str:
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._texts[a:b].tobytes().decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        row = self.meta_codes[i]
+        return {k: self.meta_values[j][int(row[j])]
+                for j, k in enumerate(self.meta_keys) if row[j] >= 0}
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata=self.metadata(i), id=str(i))
+
+    # --- metadata inverted index: key -> value code -> sorted vector ids ---
+    def _build_postings(self) -> List[Dict[int, np.ndarray]]:
+        postings: List[Dict[int, np.ndarray]] = []
+        for j in range(len(self.meta_keys)):
+            col = np.asarray(self.meta_codes[:, j])
+            order = np.argsort(col, kind="stable")
+            codes, starts = np.unique(col[order], return_index=True)
+            ends = list(starts[1:]) + [len(order)]
+            postings.append({int(c): order[a:b] for c, a, b in zip(codes, starts, ends)})
+        return postings
+
+    def filter_mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Boolean mask of ids whose metadata satisfies every `where` clause.
+
+        A clause value may be a predicate (called once per *distinct* value, None for
+        docs missing the key), a list/tuple/set of allowed values, or a literal.
+        """
+        if not where:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for key, cond in where.items():
+            if callable(cond):
+                test = lambda v, c=cond: bool(c(v))
+            elif isinstance(cond, (list, tuple, set, frozenset)):
+                test = lambda v, c=cond: v in c
+            else:
+                test = lambda v, c=cond: v == c
+            keep = np.zeros(len(self), dtype=bool)
+            if key in self.meta_keys:
+                j = self.meta_keys.index(key)
+                for code, ids in self.postings[j].items():
+                    val = self.meta_values[j][code] if code >= 0 else None
+                    if test(val):
+                        keep[ids] = True
+            elif test(None):
+                keep[:] = True
+            mask &= keep
+        return mask
+
+    # --- search ---
+    def search_vectors(self, Q: np.ndarray, k: int,
+                       mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched top-k by inner product for a (nq, dim) query matrix.
+
+        Returns (ids, scores) of shape (nq, k'), k' = min(k, #allowed rows); short rows
+        are padded with id -1. With a mask only the allowed rows are scored, so k
+        results come back whenever at least k rows match. Quantized stores scan the
+        codes for k * rerank_factor candidates and re-score those exactly.
+        """
+        Q = np.ascontiguousarray(Q, dtype=np.float32).reshape(-1, self.vectors.shape[1])
+        allowed = np.flatnonzero(mask) if mask is not None else None
+        n = len(allowed) if allowed is not None else len(self)
+        k = min(int(k), n)
+        if k <= 0 or not len(Q):
+            return np.zeros((len(Q), 0), dtype=np.int64), np.zeros((len(Q), 0), dtype=np.float32)
+        if allowed is None and self.index is not None:
+            if self.manifest["index"].get("quantized"):
+                # ANN over codes: approximate candidates, re-scored exactly
+                _, cand = self.index.search(Q, self._n_candidates(k, n))
+                return self._rerank(Q, cand, k)
+            scores, ids = self.index.search(Q, k)
+            return ids.astype(np.int64), scores
+        if self.quant is not None:
+            return self._rerank(Q, self.quant.candidates(Q, self.quant.n_candidates(k, n), allowed), k)
+        rows = self.vectors if allowed is None else np.asarray(self.vectors[allowed])
+        S = (rows @ Q.T).T
+        top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(S, top, axis=1)
+        order = np.argsort(-part, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        ids = allowed[top] if allowed is not None else top
+        return ids.astype(np.int64), np.take_along_axis(part, order, axis=1)
+
+    def _n_candidates(self, k: int, n: int) -> int:
+        q = self.manifest["quantization"]
+        return min(n, max(k * q["rerank_factor"], q["min_candidates"], k))
+
+    def _rerank(self, Q: np.ndarray, cand: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact float32 scores for each query's candidate ids; keep the best k."""
+        ids_out = np.full((len(Q), k), -1, dtype=np.int64)
+        sc_out = np.full((len(Q), k), -np.inf, dtype=np.float32)
+        for i, (q, c) in enumerate(zip(Q, cand)):
+            c = np.unique(c[c >= 0])  # sorted -> sequential page reads
+            if not len(c):
+                continue
+            sims = np.asarray(self.vectors[c], dtype=np.float32) @ q
+            top = np.argsort(-sims)[:k]
+            ids_out[i, :len(top)] = c[top]
+            sc_out[i, :len(top)] = sims[top]
+        return ids_out, sc_out
+
+    def search_vector(self, qv: np.ndarray, k: int,
+                      mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, scores) for one query vector; see search_vectors."""
+        ids, scores = self.search_vectors(np.asarray(qv, dtype=np.float32).reshape(1, -1), k, mask=mask)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+    def mmr_many_by_vector(self, Q: np.ndarray, k: int = 4, fetch_k: int = 20,
+                           lambda_mult: float = 0.5) -> List[List[Document]]:
+        """One batched search for every query, then MMR per query over its candidates."""
+        Q = np.asarray(Q, dtype=np.float32)
+        all_ids, _ = self.search_vectors(Q, fetch_k)
+        out: List[List[Document]] = []
+        for qv, ids in zip(Q, all_ids):
+            ids = ids[ids >= 0]
+            cand = np.asarray(self.vectors[ids], dtype=np.float32)
+            out.append([self.document(int(ids[p])) for p in mmr_select(qv, cand, k=k, lambda_mult=lambda_mult)])
+        return out
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        ids, scores = self.search_vector(np.asarray(embedding, dtype=np.float32), k,
+                                         mask=self.filter_mask(filter))
+        return [(self.document(int(i)), float(s)) for i, s in zip(ids, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4,
+                                                fetch_k: int = 20, lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        qv = np.asarray(embedding, dtype=np.float32)
+        ids, _ = self.search_vector(qv, fetch_k, mask=self.filter_mask(filter))
+        if not len(ids):
+            return []
+        # candidate rows straight from the stored matrix; no per-id reconstruct
+        cand = np.asarray(self.vectors[ids], dtype=np.float32)
+        picked = mmr_select(qv, cand, k=k, lambda_mult=lambda_mult)
+        return [self.document(int(ids[p])) for p in picked]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, **kwargs)
+
+    def hybrid_search_by_vector(self, embedding: List[float], query: str, k: int = 4,
+                                fetch_k: int = 20, rrf_k: int = 60,
+                                filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Dense top-fetch_k and BM25 top-fetch_k fused by reciprocal rank fusion."""
+        mask = self.filter_mask(filter)
+        dense, _ = self.search_vector(np.asarray(embedding, dtype=np.float32), fetch_k, mask=mask)
+        rankings = [dense]
+        if self.bm25 is not None:
+            sparse, _ = self.bm25.search(query, fetch_k, mask=mask)
+            rankings.append(sparse)
+        return [self.document(i) for i in reciprocal_rank_fusion(rankings, k, rrf_k=rrf_k)]
+
+    def hybrid_search(self, query: str, k: int = 4, fetch_k: int = 20, rrf_k: int = 60,
+                      filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.hybrid_search_by_vector(self.embedding.embed_query(query), query, k=k,
+                                            fetch_k=fetch_k, rrf_k=rrf_k, filter=filter)
+
+    def _select_relevance_score_fn(self):
+        # vectors are normalized, inner product is already cosine similarity
+        return lambda score: score
+
+    # --- read-only: build with write_store() from build_vectors.py / build_faiss.py ---
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only; rebuild with scripts/build_vectors.py")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None, **kwargs: Any) -> "MmapVectorStore":
+        raise NotImplementedError("Use mmap_store.write_store() to build a store on disk")
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + dense retrieval fused with reciprocal rank fusion."""
+    vectorstore: Any
+    k: int = 6
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.vectorstore.hybrid_search(query, k=self.k, fetch_k=self.fetch_k, rrf_k=self.rrf_k)
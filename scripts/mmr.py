@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Maximal marginal relevance in NumPy.
+
+Same selection rule as langchain's maximal_marginal_relevance
+(argmax of λ·sim(q, d) − (1−λ)·max sim(d, selected)), but redundancy is kept as a
+running max vector updated with one mat-vec per pick instead of recomputing a
+candidates × selected similarity matrix and looping over it in Python.
+"""
+from typing import List
+
+import numpy as np
+
+
+def _unit_rows(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int = 4,
+               lambda_mult: float = 0.5) -> List[int]:
+    """Indices into `candidates` (rows) picked by MMR, in pick order."""
+    C = _unit_rows(candidates)
+    m = C.shape[0] if C.ndim == 2 else 0
+    k = min(int(k), m)
+    if k <= 0:
+        return []
+    q = _unit_rows(np.asarray(query, dtype=np.float32).reshape(-1))
+    sim = C @ q
+    relevance = lambda_mult * sim
+
+    # like langchain, the first pick is the most similar candidate whatever λ is
+    first = int(np.argmax(sim))
+    picked = [first]
+    max_sim = C @ C[first]
+    taken = np.zeros(m, dtype=bool)
+    taken[first] = True
+    while len(picked) < k:
+        score = relevance - (1.0 - lambda_mult) * max_sim
+        score[taken] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        taken[j] = True
+        np.maximum(max_sim, C @ C[j], out=max_sim)
+    return picked
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Keep the Ollama model warm and share one pooled HTTP client.
+
+A cold Ollama pays the model load (seconds on CPU) on the first chat request, and an
+idle model is evicted once its keep_alive runs out. OllamaKeeper preloads a model with
+an empty /api/generate carrying keep_alive, re-sends that every ping_interval_s so the
+model stays resident through quiet periods, and tracks per-model load state for the
+settings panel. Only the model selected last is pinged, and only while it is in use
+(ensure() within idle_s); a failed warm-up is retried no sooner than retry_s later,
+and a name `ollama list` doesn't know is reported instead of loaded. Residency
+(/api/ps) is probed from the background threads only, so status() / describe() never
+block a page render on Ollama. client_kwargs() are the httpx settings (connection pool
+with long-lived keep-alive connections, timeout) used by the keeper's own client and
+handed to ChatOllama. Knobs live under `ollama`
+in config/settings.yaml.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+
+def _models_of(resp) -> list:
+    """`models` of an /api/ps or /api/tags response (dict or ollama-python object)."""
+    return resp.get("models", []) if isinstance(resp, dict) else resp.models
+
+
+def _model_names(resp) -> List[str]:
+    names = (m.get("name") or m.get("model") if isinstance(m, dict) else getattr(m, "model", None)
+             for m in _models_of(resp))
+    return [n for n in names if n]
+
+
+def _match(names: Iterable[str], model: str) -> Optional[str]:
+    """The Ollama name `model` refers to ("llama3" is "llama3:latest"), or None."""
+    return next((n for n in names if n == model or n.split(":")[0] == model), None)
+
+
+class OllamaKeeper:
+    def __init__(self, base_url: str = "http://127.0.0.1:11434",
+                 keep_alive: Union[str, int] = "30m", ping_interval_s: float = 240,
+                 timeout_s: float = 120, idle_s: float = 3600, retry_s: float = 60):
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.ping_interval = float(ping_interval_s)
+        self.timeout = float(timeout_s)
+        self.idle_s = float(idle_s)
+        self.retry_s = float(retry_s)
+        self._client = None
+        self._lock = threading.Lock()
+        # model -> {"state": "loading" | "loaded" | "error", "load_s" (warm-up), "error", "at",
+        #           "used" (last ensure())}
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._current: Optional[str] = None  # model of the latest ensure(); the only one pinged
+        self._stop = threading.Event()
+        self._pinger: Optional[threading.Thread] = None
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        """httpx options for an ollama Client (ChatOllama(client_kwargs=...))."""
+        import httpx
+        # keep idle connections for a ping interval instead of httpx's 5 s default
+        limits = httpx.Limits(max_connections=20, max_keepalive_connections=10,
+                              keepalive_expiry=max(self.ping_interval, 60.0) + 30.0)
+        return {"timeout": self.timeout, "limits": limits}
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from ollama import Client
+                self._client = Client(host=self.base_url, **self.client_kwargs())
+            return self._client
+
+    def _set(self, model: str, **state: Any) -> None:
+        with self._lock:
+            self._models[model] = {**self._models.get(model, {}), **state, "at": time.time()}
+
+    def load(self, model: str) -> float:
+        """Load (or refresh the keep_alive of) `model`; returns seconds taken."""
+        t0 = time.perf_counter()
+        try:
+            self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            self._set(model, state="error", error=str(e))
+            raise
+        dt = time.perf_counter() - t0
+        self._set(model, state="loaded", error=None)
+        return dt
+
+    def installed(self) -> List[str]:
+        """Model names Ollama has pulled (`ollama list`)."""
+        return _model_names(self.client.list())
+
+    def ensure(self, model: str, background: bool = True) -> Optional[threading.Thread]:
+        """Start loading `model` unless it is loaded or loading already, or failed less
+        than retry_s ago. Marks it as the selected model: the pinger keeps it warm while
+        ensure() keeps being called for it (every app rerun)."""
+        now = time.time()
+        with self._lock:
+            self._current = model
+            st = self._models.setdefault(model, {"state": "not loaded", "at": now})
+            st["used"] = now
+            if st["state"] in ("loading", "loaded"):
+                return None
+            if st["state"] == "error" and now - st["at"] < self.retry_s:
+                return None
+            st.update(state="loading", at=now)
+
+        def _run():
+            try:
+                if _match(self.installed(), model) is None:
+                    self._set(model, state="error", error=f"not pulled (run `ollama pull {model}`)")
+                    return
+                self._set(model, load_s=self.load(model))
+            except Exception as e:  # Ollama not running must not crash the app
+                self._set(model, state="error", error=str(e))
+                print(f"[warn] Ollama warm-up of {model!r} failed: {e}")
+            self.probe()
+        if not background:
+            _run()
+            return None
+        t = threading.Thread(target=_run, name=f"ollama-warmup-{model}", daemon=True)
+        t.start()
+        return t
+
+    def ping(self) -> None:
+        """Refresh keep_alive of the selected model (reloads it if it was evicted) while it
+        is in use; models that failed or haven't been selected within idle_s are dropped."""
+        now = time.time()
+        with self._lock:
+            for m in [m for m, st in self._models.items() if m != self._current and (
+                    st["state"] == "error" or now - st.get("used", st["at"]) > self.idle_s)]:
+                del self._models[m]
+            st = self._models.get(self._current) if self._current else None
+            model = self._current if st and st["state"] == "loaded" and \
+                now - st.get("used", st["at"]) <= self.idle_s else None
+        if model is None:
+            return  # nothing in use; an error is retried by the next ensure()
+        try:
+            self.load(model)
+        except Exception:
+            pass  # state records the error; ensure() retries after retry_s
+        self.probe()
+
+    def start_pinger(self) -> Optional[threading.Thread]:
+        if self.ping_interval <= 0 or self._pinger is not None:
+            return self._pinger
+
+        def _loop():
+            while not self._stop.wait(self.ping_interval):
+                self.ping()
+        self._pinger = threading.Thread(target=_loop, name="ollama-keep-warm", daemon=True)
+        self._pinger.start()
+        return self._pinger
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def probe(self) -> None:
+        """Ask Ollama (/api/ps) which models are resident and until when; recorded for
+        status(). Called from the warm-up and pinger threads, never from a render."""
+        try:
+            running = self.client.ps()
+        except Exception as e:
+            with self._lock:
+                for st in self._models.values():
+                    st.update(resident=None, error=st.get("error") or str(e))
+            return
+        resident = {}
+        for m in _models_of(running):
+            name = m.get("name") if isinstance(m, dict) else getattr(m, "model", None)
+            if name:
+                resident[name] = m.get("expires_at") if isinstance(m, dict) else getattr(m, "expires_at", None)
+        with self._lock:
+            for model, st in self._models.items():
+                hit = _match(resident, model)
+                st.update(resident=hit is not None, expires_at=resident.get(hit))
+
+    def status(self, model: str) -> Dict[str, Any]:
+        """Local load state of `model` and the last probed residency ("resident": True /
+        False, None = Ollama unreachable, absent = not probed yet). No HTTP."""
+        with self._lock:
+            return dict(self._models.get(model, {"state": "not loaded"}))
+
+    def describe(self, model: str) -> str:
+        """One-line load state for the settings panel."""
+        st = self.status(model)
+        if "resident" in st and st["resident"] is None:
+            return f"Ollama unreachable at {self.base_url} ({st.get('error')})"
+        if st.get("resident"):
+            until = st.get("expires_at")
+            until = until.strftime("%H:%M") if hasattr(until, "strftime") else str(until or "")[11:16]
+            took = f" (warm-up took {st['load_s']:.1f}s)" if st.get("load_s") else ""
+            return f"`{model}` loaded{took}" + (f", kept until {until}" if until else "")
+        if st["state"] == "loading":
+            return f"`{model}` loading…"
+        if st["state"] == "error":
+            return f"`{model}` failed to load: {st.get('error')}"
+        return f"`{model}` not loaded (first answer will wait for the model load)"
@@ -11,7 +11,7 @@ from langchain_community.vectorstores import FAISS
 root = Path("data/kb/chunks.jsonl")
 records = [json.loads(l) for l in root.read_text(encoding='utf-8').splitlines()]
 from langchain.schema import Document
-children = [Document(page_content=r['text'], metadata=r.get('meta', {})) for r in records]
+children = [Document(page_content=r['text'], metadata=r.get('meta', {})) for r in records if not r.get('dup_of')]
 
 emb = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2", encode_kwargs={"normalize_embeddings": True})
 vectorstore = FAISS.from_documents(children, emb)
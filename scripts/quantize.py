@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Compact embedding codes for the mmap store: float16, scalar int8, product quantization.
+
+Codes are what stays resident and gets scanned; the float32 matrix remains on disk
+(vectors.npy, memory-mapped) and is only paged in for the few rows an exact rerank
+touches. Knobs live under store.quantization in config/settings.yaml.
+
+  float16  codes.npy  (n, d) float16                         2 bytes/dim
+  int8     codes.npy  (n, d) int8 + scale.npy (d,) float32   1 byte/dim, per-dim symmetric scale
+  pq       pq.faiss   faiss IndexPQ (m sub-quantizers)       m * nbits / 8 bytes/vector
+"""
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+QUANT_MODES = ("none", "float16", "int8", "pq")
+_SCAN_ROWS = 65536  # rows decoded per block when scanning codes
+
+
+def quant_params(cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    cfg = cfg or {}
+    mode = cfg.get("mode", "none") or "none"
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {QUANT_MODES}")
+    return {
+        "mode": mode,
+        "rerank_factor": int(cfg.get("rerank_factor", 4)),
+        "min_candidates": int(cfg.get("min_candidates", 100)),
+        "pq_m": int(cfg.get("pq_m", 48)),
+        "pq_nbits": int(cfg.get("pq_nbits", 8)),
+        "train_sample": int(cfg.get("train_sample", 20000)),
+    }
+
+
+def write_codes(out_dir: Path, X: np.ndarray, params: Dict[str, Any]) -> None:
+    """Encode X (float32, normalized rows) into out_dir according to params["mode"].
+    X may be a memmap; it is read in blocks of _SCAN_ROWS rows."""
+    out_dir = Path(out_dir)
+    mode = params["mode"]
+    blocks = [slice(a, a + _SCAN_ROWS) for a in range(0, X.shape[0], _SCAN_ROWS)]
+    if mode == "float16":
+        codes = np.lib.format.open_memmap(out_dir / "codes.npy", mode="w+", dtype=np.float16, shape=X.shape)
+        for b in blocks:
+            codes[b] = X[b]
+        codes.flush()
+    elif mode == "int8":
+        scale = np.zeros(X.shape[1], dtype=np.float32)
+        for b in blocks:
+            np.maximum(scale, np.abs(X[b]).max(axis=0), out=scale)
+        scale /= 127.0
+        scale[scale == 0] = 1.0
+        codes = np.lib.format.open_memmap(out_dir / "codes.npy", mode="w+", dtype=np.int8, shape=X.shape)
+        for b in blocks:
+            codes[b] = np.clip(np.rint(X[b] / scale), -127, 127)
+        codes.flush()
+        np.save(out_dir / "scale.npy", scale)
+    elif mode == "pq":
+        import faiss
+        try:
+            from .ann_index import training_sample
+        except ImportError:
+            from ann_index import training_sample
+        d = X.shape[1]
+        if d % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dim {d}")
+        index = faiss.IndexPQ(d, params["pq_m"], params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        # 2**nbits centroids per sub-quantizer need a few dozen points each
+        index.train(training_sample(X, max(params["train_sample"], 40 * (1 << params["pq_nbits"]))))
+        for b in blocks:
+            index.add(np.ascontiguousarray(X[b], dtype=np.float32))
+        faiss.write_index(index, str(out_dir / "pq.faiss"))
+
+
+class QuantizedCodes:
+    """Approximate inner-product scan over resident codes (loaded fully, not mmapped)."""
+
+    def __init__(self, path: Path, params: Dict[str, Any]):
+        path = Path(path)
+        self.mode = params["mode"]
+        self.rerank_factor = params["rerank_factor"]
+        self.min_candidates = params["min_candidates"]
+        self.codes = self.scale = self.pq = None
+        if self.mode in ("float16", "int8"):
+            self.codes = np.load(path / "codes.npy")
+            if self.mode == "int8":
+                self.scale = np.load(path / "scale.npy")
+        elif self.mode == "pq":
+            import faiss
+            self.pq = faiss.read_index(str(path / "pq.faiss"))
+
+    @staticmethod
+    def exists(path: Path, mode: str) -> bool:
+        name = "pq.faiss" if mode == "pq" else "codes.npy"
+        return (Path(path) / name).exists()
+
+    def n_candidates(self, k: int, n: int) -> int:
+        return min(n, max(k * self.rerank_factor, self.min_candidates, k))
+
+    def scores(self, Q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate (nq, n_rows) similarities for float16 / int8 codes."""
+        Q = np.asarray(Q, dtype=np.float32).reshape(-1, self.codes.shape[1])
+        if self.scale is not None:
+            Q = Q * self.scale  # x ≈ code * scale  =>  x·q ≈ code · (scale * q)
+        codes = self.codes if rows is None else self.codes[rows]
+        out = np.empty((Q.shape[0], codes.shape[0]), dtype=np.float32)
+        for a in range(0, codes.shape[0], _SCAN_ROWS):
+            out[:, a:a + _SCAN_ROWS] = (codes[a:a + _SCAN_ROWS].astype(np.float32) @ Q.T).T
+        return out
+
+    def candidates(self, Q: np.ndarray, n_cand: int, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """(nq, <=n_cand) ids of the best rows by approximate score; -1 pads PQ misses."""
+        Q = np.asarray(Q, dtype=np.float32)
+        Q = Q.reshape(1, -1) if Q.ndim == 1 else Q
+        if self.pq is not None and allowed is None:
+            _, ids = self.pq.search(Q, n_cand)
+            return ids.astype(np.int64)
+        if self.pq is not None:
+            # IndexPQ has no IDSelector support: decode just the allowed rows' codes
+            S = Q @ self.pq.reconstruct_batch(allowed.astype(np.int64)).T
+        else:
+            S = self.scores(Q, rows=allowed)
+        n_cand = min(n_cand, S.shape[1])
+        if n_cand <= 0:
+            return np.zeros((Q.shape[0], 0), dtype=np.int64)
+        top = np.argpartition(-S, n_cand - 1, axis=1)[:, :n_cand]
+        return (allowed[top] if allowed is not None else top).astype(np.int64)
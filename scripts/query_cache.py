@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Two-level cache for query embeddings: in-process LRU + optional SQLite file."""
+from pathlib import Path
+from array import array
+from collections import OrderedDict
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    # MiniLM is uncased, so lowercasing + whitespace folding never changes the vector
+    return " ".join((text or "").lower().split())
+
+
+class QueryEmbeddingCache:
+    """LRU of (model, normalized query) -> vector, backed by an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 2048, db_path: Optional[Path] = None):
+        self.max_entries = max(0, int(max_entries))
+        self._lru: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if db_path:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS qemb ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+
+    def _remember(self, key: tuple, vec: List[float]) -> None:
+        if not self.max_entries:
+            return
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, query)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits_mem += 1
+                return vec
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vec FROM qemb WHERE model = ? AND query = ?", key
+                ).fetchone()
+                if row:
+                    vec = array("f", row[0]).tolist()
+                    self._remember(key, vec)
+                    self.hits_disk += 1
+                    return vec
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, vec: List[float]) -> None:
+        key = (model, query)
+        vec = [float(x) for x in vec]
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO qemb (model, query, vec) VALUES (?, ?, ?)",
+                    (model, query, array("f", vec).tobytes()),
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits_mem": self.hits_mem,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "size_mem": len(self._lru),
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings object; embed_query goes through QueryEmbeddingCache."""
+
+    def __init__(self, inner: Embeddings, model_name: str, cache: QueryEmbeddingCache):
+        self.inner = inner
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        q = normalize_query(text)
+        vec = self.cache.get(self.model_name, q)
+        if vec is None:
+            vec = [float(x) for x in self.inner.embed_query(q)]
+            self.cache.put(self.model_name, q, vec)
+        return vec
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batch version of embed_query: cache lookups, then one encoder call for all misses."""
+        qs = [normalize_query(t) for t in texts]
+        out: List[Optional[List[float]]] = [self.cache.get(self.model_name, q) for q in qs]
+        misses = list(dict.fromkeys(q for q, v in zip(qs, out) if v is None))
+        if misses:
+            fresh = {q: [float(x) for x in v] for q, v in zip(misses, self.inner.embed_documents(misses))}
+            for q, v in fresh.items():
+                self.cache.put(self.model_name, q, v)
+            out = [v if v is not None else fresh[q] for q, v in zip(qs, out)]
+        return out
@@ -1,25 +1,108 @@
 #!/usr/bin/env python3
 from pathlib import Path
 import json
-from typing import Dict, Any, List, Optional
+import re
+import threading
+import importlib
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Pattern, Tuple, Union
 from functools import lru_cache
 
-from langchain_community.vectorstores import FAISS
-try:
-    # preferred modern package
-    from langchain_huggingface import HuggingFaceEmbeddings
-except ImportError:  # graceful fallback if not installed
-    from langchain_community.embeddings import HuggingFaceEmbeddings
+import yaml
+
+if TYPE_CHECKING:  # heavy imports stay off the import path; see get_embedder()/_cached_vs()
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from .query_cache import CachedEmbeddings, QueryEmbeddingCache
+    from .mmap_store import MmapVectorStore
 
 ROOT = Path(__file__).resolve().parents[1]
 VSDIR = ROOT / "data/kb/vectorstore/faiss_index"
+MMAPDIR = ROOT / "data/kb/vectorstore/mmap"
 ALIASES = ROOT / "data/curated/aliases.json"
+SETTINGS = ROOT / "config/settings.yaml"
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+@lru_cache(maxsize=1)
+def _settings() -> dict:
+    try:
+        return yaml.safe_load(SETTINGS.read_text(encoding="utf-8")) or {}
+    except Exception:
+        return {}
+
+def get_settings() -> dict:
+    """Parsed config/settings.yaml ({} if missing or invalid)."""
+    return _settings()
+
+def _retrieval_cfg() -> dict:
+    return _settings().get("retrieval") or {}
+
+def _sibling(name: str):
+    """Import scripts/<name>.py whether we run as scripts.retriever (app.py) or retriever (scripts/*.py)."""
+    if __package__:
+        return importlib.import_module(f"{__package__}.{name}")
+    return importlib.import_module(name)
+
+# Query-embedding cache (LRU + optional SQLite tier); repeat questions skip the encoder
+@lru_cache(maxsize=1)
+def get_query_cache() -> "QueryEmbeddingCache":
+    cfg = _retrieval_cfg().get("query_cache") or {}
+    db = cfg.get("sqlite_path")
+    return _sibling("query_cache").QueryEmbeddingCache(
+        max_entries=int(cfg.get("max_entries", 2048)),
+        db_path=(ROOT / db) if db else None,
+    )
+
+# Single, shared embedder, built on first use: torch + sentence-transformers
+# cost seconds to import, and the FAQ fast-path never needs them.
+_EMB_LOCK = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _build_embedder() -> "CachedEmbeddings":
+    try:
+        # preferred modern package
+        from langchain_huggingface import HuggingFaceEmbeddings
+    except ImportError:  # graceful fallback if not installed
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+    return _sibling("query_cache").CachedEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name=EMBED_MODEL,
+            encode_kwargs={"normalize_embeddings": True},
+        ),
+        model_name=EMBED_MODEL,
+        cache=get_query_cache(),
+    )
 
-# Single, shared embedder
-emb = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    encode_kwargs={"normalize_embeddings": True},
-)
+def get_embedder() -> "CachedEmbeddings":
+    with _EMB_LOCK:  # lru_cache alone would let two threads build the model at once
+        return _build_embedder()
+
+def __getattr__(name: str):
+    # keep `from retriever import emb` working without eager construction
+    if name == "emb":
+        return get_embedder()
+    if name == "query_cache":
+        return get_query_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def query_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the query-embedding cache (for sizing max_entries)."""
+    return get_query_cache().stats()
+
+def warm_up(background: bool = True) -> Optional[threading.Thread]:
+    """Build the embedder, open the vector store and run one query so the first
+    real question doesn't pay for it. Runs in a daemon thread unless background=False."""
+    def _run():
+        try:
+            get_embedder().inner.embed_query("warm up")
+            get_vectorstore()
+        except Exception as e:  # a missing index must not crash the app at startup
+            print(f"[warn] retriever warm-up failed: {e}")
+    if not background:
+        _run()
+        return None
+    t = threading.Thread(target=_run, name="trammate-warmup", daemon=True)
+    t.start()
+    return t
 
 # --- load alias map safely (tolerate missing file / BOM) ---
 def _load_aliases() -> dict:
@@ -30,56 +113,180 @@ def _load_aliases() -> dict:
     except Exception:
         return {}
 
+# --- compiled alias matcher: built once, rebuilt only when aliases.json changes ---
+_ALIAS_LOCK = threading.Lock()
+_ALIAS_STATE: Dict[str, Any] = {"mtime": object(), "pattern": None, "lookup": {}}
+
+def _compile_aliases(alias_map: dict) -> Tuple[Optional[Pattern[str]], Dict[str, str]]:
+    """One alternation over every alias (longest first) + alias -> canonical lookup."""
+    lookup: Dict[str, str] = {}
+    for canon, alist in alias_map.items():
+        for a in (alist or []):
+            if not a:
+                continue
+            # first canonical wins, matching the old replace order
+            lookup.setdefault(str(a).lower(), str(canon).lower())
+    if not lookup:
+        return None, {}
+    alts = sorted(lookup, key=len, reverse=True)
+    return re.compile("|".join(re.escape(a) for a in alts)), lookup
+
+def _alias_matcher() -> Tuple[Optional[Pattern[str]], Dict[str, str]]:
+    try:
+        mtime = ALIASES.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != _ALIAS_STATE["mtime"]:
+        with _ALIAS_LOCK:
+            if mtime != _ALIAS_STATE["mtime"]:
+                pattern, lookup = _compile_aliases(_load_aliases() if mtime is not None else {})
+                _ALIAS_STATE.update(mtime=mtime, pattern=pattern, lookup=lookup)
+    return _ALIAS_STATE["pattern"], _ALIAS_STATE["lookup"]
+
 # --- optional: alias expansion for user slang/nicknames ---
 def preprocess_query(q: Optional[str]) -> str:
-    """Always return a non-None string. Expand known aliases."""
+    """Always return a non-None string. Expand known aliases in a single pass."""
     base = (q or "").strip()
     if not base:
         return ""
-    alias_map = _load_aliases()
     text = base.lower()
-    for canon, alist in alias_map.items():
-        for a in (alist or []):
-            if not a:
-                continue
-            a_l = a.lower()
-            if a_l in text:
-                text = text.replace(a_l, str(canon).lower())
-    return text
+    pattern, lookup = _alias_matcher()
+    if pattern is None:
+        return text
+    return pattern.sub(lambda m: lookup[m.group(0)], text)
 
-@lru_cache(maxsize=1)
-def _cached_vs() -> FAISS:
+_VS_LOCK = threading.Lock()
+# the open store and the index generation it was opened at
+_VS_STATE: Dict[str, Any] = {"vs": None, "generation": None}
+
+def _load_vs() -> Union["MmapVectorStore", "FAISS"]:
+    mm = _sibling("mmap_store")
+    # prefer the pickle-free mmap store: zero-copy load, pages faulted in on demand
+    if mm.store_exists(MMAPDIR):
+        return mm.MmapVectorStore(MMAPDIR, get_embedder())
     if not VSDIR.exists():
         raise FileNotFoundError(
             f"FAISS index not found at {VSDIR}. "
             "Build it first with: scripts/make_chunks.py then scripts/build_faiss.py"
         )
-    # allow_dangerous_deserialization is required for FAISS docstore pickle
-    return FAISS.load_local(str(VSDIR), emb, allow_dangerous_deserialization=True)
+    from langchain_community.vectorstores import FAISS
+    # legacy index: allow_dangerous_deserialization is required for FAISS docstore pickle
+    return FAISS.load_local(str(VSDIR), get_embedder(), allow_dangerous_deserialization=True)
+
+def _cached_vs() -> Union["MmapVectorStore", "FAISS"]:
+    gen = index_generation()
+    with _VS_LOCK:  # warm-up thread and first request may race here
+        if _VS_STATE["vs"] is None or _VS_STATE["generation"] != gen:
+            # first use, or the index was rebuilt on disk since it was opened
+            vs = _load_vs()
+            _VS_STATE.update(vs=vs, generation=getattr(vs, "generation", None) or gen)
+        return _VS_STATE["vs"]
+
+_GEN_STATE: Dict[str, Any] = {"stamp": None, "generation": ""}
+
+def index_generation() -> str:
+    """Id of the on-disk index, without loading it (or the embedder).
+    Content hash from the mmap manifest; mtime of the legacy FAISS index otherwise."""
+    mm = _sibling("mmap_store")
+    path = MMAPDIR / mm.MANIFEST if mm.store_exists(MMAPDIR) else VSDIR / "index.faiss"
+    try:
+        stamp = (str(path), path.stat().st_mtime_ns)
+    except OSError:
+        return ""
+    if stamp != _GEN_STATE["stamp"]:
+        if path.name == mm.MANIFEST:
+            gen = json.loads(path.read_text(encoding="utf-8")).get("generation", "")
+        else:
+            gen = f"faiss-{stamp[1]}"
+        _GEN_STATE.update(stamp=stamp, generation=gen)
+    return _GEN_STATE["generation"]
+
+def store_generation(vs: Any = None) -> str:
+    """Generation of the store that answers (or just answered) a query: `vs` (e.g. a
+    retriever's .vectorstore) when given, else the open store, else the one on disk
+    that get_vectorstore() would open. Cache keys use this, so an answer is never
+    filed under an index it wasn't retrieved from."""
+    if vs is not None:
+        gen = getattr(vs, "generation", None)
+        if gen is None and vs is _VS_STATE["vs"]:
+            gen = _VS_STATE["generation"]
+        return gen or ""
+    return index_generation()  # get_vectorstore() reopens whenever this changes
+
+def retrieval_settings(search_type: Optional[str] = None, fetch_k: Optional[int] = None) -> Dict[str, Any]:
+    """Every retrieval knob get_retriever() applies besides k and λ (for cache keys)."""
+    cfg = _retrieval_cfg()
+    search_type = search_type or cfg.get("search_type", "mmr")
+    if search_type == "hybrid":
+        hcfg = cfg.get("hybrid") or {}
+        return {"search_type": "hybrid", "fetch_k": int(fetch_k or hcfg.get("fetch_k", 20)),
+                "rrf_k": int(hcfg.get("rrf_k", 60))}
+    return {"search_type": "mmr", "fetch_k": int(fetch_k or cfg.get("fetch_k", 35))}
 
 # --- load vector store and build a retriever ---
-def get_vectorstore() -> FAISS:
-    # allow_dangerous_deserialization required for FAISS docstore pickle
+def get_vectorstore() -> Union["MmapVectorStore", "FAISS"]:
     return _cached_vs()
 
-def get_retriever(k: int = 6, lambda_mult: float = 0.5):
+def get_retriever(k: int = 6, lambda_mult: float = 0.5, search_type: Optional[str] = None,
+                  fetch_k: Optional[int] = None):
+    """search_type: "mmr" (default) or "hybrid"; defaults come from retrieval.* in settings.yaml."""
+    cfg = _retrieval_cfg()
     vs = get_vectorstore()
+    search_type = search_type or cfg.get("search_type", "mmr")
+    if search_type == "hybrid" and getattr(vs, "bm25", None) is not None:
+        hcfg = cfg.get("hybrid") or {}
+        # exact tokens (route/stop numbers) come from BM25, so a short dense list suffices
+        return _sibling("mmap_store").HybridRetriever(
+            vectorstore=vs,
+            k=k,
+            fetch_k=int(fetch_k or hcfg.get("fetch_k", 20)),
+            rrf_k=int(hcfg.get("rrf_k", 60)),
+        )
     # MMR => diverse results (policy + routes + landmarks)
     return vs.as_retriever(
         search_type="mmr",
-        search_kwargs={"k": k, "fetch_k": 35, "lambda_mult": float(lambda_mult)},
+        search_kwargs={"k": k, "fetch_k": int(fetch_k or cfg.get("fetch_k", 35)), "lambda_mult": float(lambda_mult)},
     )
 
-# --- metadata filter (manual, since FAISS has no native filters) ---
+# --- batched retrieval (log replay, evals) ---
+def retrieve_many(questions: List[str], k: int = 6, lambda_mult: float = 0.5,
+                  fetch_k: Optional[int] = None) -> List[List["Document"]]:
+    """MMR retrieval for many questions: one batched encode, one batched search,
+    MMR per query. Empty questions get []."""
+    qs = [preprocess_query(q) for q in questions]
+    live = [i for i, q in enumerate(qs) if q]
+    out: List[List["Document"]] = [[] for _ in qs]
+    if not live:
+        return out
+    fetch_k = int(fetch_k or _retrieval_cfg().get("fetch_k", 35))
+    vecs = get_embedder().embed_queries([qs[i] for i in live])
+    vs = get_vectorstore()
+    if hasattr(vs, "mmr_many_by_vector"):
+        import numpy as np
+        results = vs.mmr_many_by_vector(np.asarray(vecs, dtype=np.float32), k=k,
+                                        fetch_k=fetch_k, lambda_mult=float(lambda_mult))
+    else:  # legacy FAISS: still one encoder call, search per query
+        results = [vs.max_marginal_relevance_search_by_vector(v, k=k, fetch_k=fetch_k,
+                                                              lambda_mult=float(lambda_mult))
+                   for v in vecs]
+    for i, docs in zip(live, results):
+        out[i] = docs
+    return out
+
+# --- metadata filter ---
 def filtered_similar_docs(query: str, where: Optional[Dict[str, Any]] = None, k: int = 6):
-    """Apply a simple post-filter over metadata keys.
+    """Similarity search restricted to docs whose metadata passes `where`.
     Example: where={"source": lambda s: s and ("policy" in s or s.endswith("policy_summaries.md"))}
+    On the mmap store the filter runs on the metadata inverted index *before* scoring,
+    so k docs come back whenever k match. The legacy FAISS index still post-filters.
     """
     vs = get_vectorstore()
     q_norm = preprocess_query(query)
     if not q_norm:
         return []
-    # grab more then filter down
+    if hasattr(vs, "filter_mask"):
+        return vs.similarity_search(q_norm, k=k, filter=where)
+    # legacy FAISS: grab more then filter down (manual, since FAISS has no native filters)
     docs = vs.similarity_search(q_norm, k=25)
     if where:
         kept: List = []
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""CBD tram route graph and transfer planner.
+
+RouteGraph turns data/curated/route_stops_cbd.csv into a compact CSR adjacency
+(indptr / dst / weight / kind arrays) over three kinds of node:
+- platform: one per CBD stop, where a journey starts and ends;
+- walked-to platform: the same stop reached on foot; it can only board, so walks
+  don't chain into an all-walking "tram" journey;
+- route stop: one per (route, stop) row, joined to its platform by board / alight
+  edges and to the next stop of the same route by a ride edge.
+order_in_cbd interleaves both directions of a route (it is the median stop_sequence
+over all trips), so each route's rows are split into direction chains first: in
+ascending order, a stop extends the nearest chain whose last stop is at most
+max_order_gap earlier and max_hop_m away and that doesn't already contain a stop
+of the same name (which would be the opposite platform, i.e. a U-turn). Walking
+edges join stops within walk_radius_m (found with stop_index.StopIndex).
+
+TransferPlanner runs Dijkstra from every FTZ stop once for two objectives, fastest
+(seconds) and fewest transfers (boardings first, seconds second), and keeps the
+distance / predecessor-edge tables, so a query is an array lookup plus a short walk
+back along predecessors. Place names resolve landmark-first (the part of a stop name
+before "/"), then by cross street; a name matching stops far apart resolves to nothing,
+and answer() only takes routing questions, so fare / policy questions go to the KB.
+Times are timetable-free estimates (tram speed, dwell,
+average wait per boarding), not live departures. Knobs live under `planner` in
+config/settings.yaml.
+
+  python scripts/route_planner.py "how do I get from Flinders St to Melbourne Central"
+"""
+import argparse
+import csv
+import heapq
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# requires: pip install rapidfuzz
+from rapidfuzz import fuzz, process
+
+try:  # imported as scripts.route_planner (app.py) or as route_planner (scripts/*.py)
+    from .stop_index import StopIndex
+except ImportError:
+    from stop_index import StopIndex
+
+ROOT = Path(__file__).resolve().parents[1]
+CURATED = ROOT / "data/curated"
+ROUTE_STOPS_CSV = CURATED / "route_stops_cbd.csv"
+STOPS_CSV = CURATED / "tram_stops.csv"
+FTZ_CSV = CURATED / "stops_in_ftz.csv"
+
+RIDE, BOARD, ALIGHT, WALK = 0, 1, 2, 3
+FASTEST, FEWEST_TRANSFERS = "fastest", "fewest_transfers"
+_BOARDING_COST = 1e6  # seconds-equivalent of one boarding when minimising transfers
+
+
+class Leg(NamedTuple):
+    mode: str  # "tram" | "walk"
+    route_no: str  # "" for walks
+    from_stop: str
+    to_stop: str
+    stops: int  # stops travelled on the tram
+    metres: float
+    seconds: float  # includes the expected wait when boarding
+
+
+class Itinerary(NamedTuple):
+    legs: List[Leg]
+    seconds: float
+    transfers: int
+
+
+class RouteGraph:
+    def __init__(self, route_stops_csv: Path = ROUTE_STOPS_CSV, stops_csv: Path = STOPS_CSV,
+                 ftz_csv: Path = FTZ_CSV, tram_speed_kmh: float = 12.0, dwell_s: float = 20.0,
+                 board_wait_s: float = 180.0, walk_speed_mps: float = 1.3, walk_detour: float = 1.3,
+                 walk_radius_m: float = 250.0, max_hop_m: float = 700.0, max_order_gap: float = 3.0):
+        coords, names = {}, {}
+        with Path(stops_csv).open(newline="", encoding="utf-8-sig") as f:
+            for r in csv.DictReader(f):
+                try:
+                    coords[r["stop_id"]] = (float(r["lat"]), float(r["lon"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                names[r["stop_id"]] = (r.get("stop_name") or "").strip()
+        rows = []
+        with Path(route_stops_csv).open(newline="", encoding="utf-8-sig") as f:
+            for r in csv.DictReader(f):
+                if r["stop_id"] in coords:
+                    rows.append((r["route_id"], r["route_no"], r["stop_id"], float(r["order_in_cbd"])))
+        ftz: List[str] = []
+        if Path(ftz_csv).exists():
+            with Path(ftz_csv).open(newline="", encoding="utf-8-sig") as f:
+                ftz = [r["stop_id"] for r in csv.DictReader(f) if r["stop_id"] in coords]
+
+        # platforms: FTZ stops plus any other stop a CBD route row mentions
+        self.stop_ids: List[str] = list(dict.fromkeys(ftz + [sid for _, _, sid, _ in rows]))
+        if not self.stop_ids:
+            raise ValueError(f"No CBD stops found in {route_stops_csv} / {ftz_csv}")
+        self.stop_row: Dict[str, int] = {sid: i for i, sid in enumerate(self.stop_ids)}
+        self.names = [names.get(sid, sid) for sid in self.stop_ids]
+        self.ftz = [self.stop_row[sid] for sid in ftz]
+        self.index = StopIndex(self.stop_ids, self.names, *zip(*(coords[s] for s in self.stop_ids)))
+        xy = np.column_stack(self.index.proj.to_xy(self.index.lat, self.index.lon))
+        S = len(self.stop_ids)
+
+        self.routes: List[Tuple[str, str]] = []  # route index -> (route_id, route_no)
+        node_stop = list(range(S)) * 2  # platform i, walked-to platform S + i
+        node_route = [-1] * (2 * S)
+        edges: List[Tuple[int, int, float, int]] = []
+
+        by_route: Dict[Tuple[str, str], List[Tuple[float, int]]] = defaultdict(list)
+        for rid, rno, sid, order in rows:
+            by_route[rid, rno].append((order, self.stop_row[sid]))
+        ride_s_per_m = 3.6 / float(tram_speed_kmh)
+        for (rid, rno), members in by_route.items():
+            r = len(self.routes)
+            self.routes.append((rid, rno))
+            node_of = {}
+            for _, s in members:
+                if s not in node_of:
+                    node_of[s] = len(node_stop)
+                    node_stop.append(s)
+                    node_route.append(r)
+                    edges.append((s, node_of[s], float(board_wait_s), BOARD))
+                    edges.append((S + s, node_of[s], float(board_wait_s), BOARD))
+                    edges.append((node_of[s], s, 0.0, ALIGHT))
+            for chain in self._chains(members, xy, self.names, max_order_gap, max_hop_m):
+                for a, b in zip(chain, chain[1:]):
+                    metres = float(np.hypot(*(xy[a] - xy[b])))
+                    edges.append((node_of[a], node_of[b], metres * ride_s_per_m + float(dwell_s), RIDE))
+
+        for a, (hits, dist) in enumerate(self.index.within_many(self.index.lat, self.index.lon, walk_radius_m)):
+            for b, metres in zip(hits.tolist(), dist.tolist()):
+                if b != a:
+                    edges.append((a, S + b, metres * walk_detour / walk_speed_mps, WALK))
+
+        self.n_stops = S
+        self.node_stop = np.asarray(node_stop, dtype=np.int32)
+        self.node_route = np.asarray(node_route, dtype=np.int32)
+        e = np.array(edges, dtype=np.float64).reshape(-1, 4)
+        order = np.argsort(e[:, 0], kind="stable")
+        self.edge_src = e[order, 0].astype(np.int32)
+        self.dst = e[order, 1].astype(np.int32)
+        self.weight = e[order, 2].astype(np.float32)
+        self.kind = e[order, 3].astype(np.int8)
+        self.metres = np.zeros(len(e), dtype=np.float32)
+        walk = self.kind == WALK
+        self.metres[walk] = self.weight[walk] * walk_speed_mps / walk_detour
+        ride = self.kind == RIDE
+        self.metres[ride] = (self.weight[ride] - float(dwell_s)) / ride_s_per_m
+        self.indptr = np.searchsorted(self.edge_src, np.arange(len(node_stop) + 1)).astype(np.int32)
+
+    @staticmethod
+    def _chains(members: Sequence[Tuple[float, int]], xy: np.ndarray, names: Sequence[str],
+                max_gap: float, max_hop: float) -> List[List[int]]:
+        """Split one route's (order, stop) rows into direction chains (see module doc)."""
+        chains: List[List[int]] = []
+        last: List[float] = []
+        seen: List[Set[str]] = []  # stop names per chain
+        levels: Dict[float, List[int]] = defaultdict(list)
+        for order, s in members:
+            levels[order].append(s)
+        for order in sorted(levels):
+            options = []
+            for c, chain in enumerate(chains):
+                if not (0 < order - last[c] <= max_gap):
+                    continue
+                for s in levels[order]:
+                    metres = float(np.hypot(*(xy[chain[-1]] - xy[s])))
+                    if metres <= max_hop:
+                        options.append((metres, c, s))
+            taken_c, taken_s = set(), set()
+            for metres, c, s in sorted(options):
+                if c in taken_c or s in taken_s or names[s] in seen[c]:
+                    continue
+                chains[c].append(s)
+                last[c] = order
+                seen[c].add(names[s])
+                taken_c.add(c)
+                taken_s.add(s)
+            for s in levels[order]:
+                if s not in taken_s:
+                    chains.append([s])
+                    last.append(order)
+                    seen.append({names[s]})
+        return chains
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    def stop_node(self, stop: int, walked: bool = False) -> int:
+        return stop + self.n_stops if walked else stop
+
+
+_DROP = {"the", "railway", "stop", "tram", "platform"}
+_ABBREV = {"street": "st", "road": "rd", "parade": "pde", "avenue": "ave", "square": "sq",
+           "stations": "station", "stn": "station"}
+
+
+def normalize_place(text: str) -> str:
+    """Lower-case, '#N' stop numbers removed, street types abbreviated, filler dropped.
+    "station" is kept: "Flinders Street Station" is the station, not Flinders St."""
+    words = re.findall(r"[a-z0-9&']+", re.sub(r"#\s*\S+", " ", (text or "").lower()))
+    return " ".join(_ABBREV.get(w, w) for w in words if w not in _DROP)
+
+
+_TRIP = [
+    re.compile(r"\bfrom\s+(?P<a>.+?)\s+to\s+(?P<b>.+?)[\s?.!]*$"),
+    re.compile(r"\bbetween\s+(?P<a>.+?)\s+and\s+(?P<b>.+?)[\s?.!]*$"),
+    # greedy prefix: the destination follows the last "to" before "from" ("how to get to X from Y")
+    re.compile(r"^.*\bto\s+(?P<b>.+?)\s+from\s+(?P<a>.+?)[\s?.!]*$"),
+]
+
+
+# the planner only answers questions about getting somewhere; "is it free to ride from
+# X to Y" or "do I touch on from X to Y" are fare / policy questions for the KB
+_ROUTE_INTENT = re.compile(
+    r"\b(how (do|can|should|would) (i|we|you) (get|go|travel)|how to (get|go)|get (to|from)|"
+    r"how long|how far|quickest|fastest|which (tram|route)|what (tram|route)|route|directions?|"
+    r"travel (from|to|between)|go (from|to)|^(from|between))\b")
+_POLICY = re.compile(r"\b(free|fares?|myki|touch(ing)? on|tap(ping)? on|tickets?|cost|pay|concession|"
+                     r"wheelchair|accessib\w*|fines?)\b")
+
+
+def is_route_question(query: Optional[str]) -> bool:
+    """True for routing questions ("how do I get from X to Y") that aren't about fares,
+    myki or accessibility."""
+    q = (query or "").lower()
+    return bool(_ROUTE_INTENT.search(q)) and not _POLICY.search(q)
+
+
+def parse_trip(query: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(origin, destination) from 'from X to Y', 'between X and Y' or 'to Y from X'."""
+    q = (query or "").strip().lower()
+    for pattern in _TRIP:
+        m = pattern.search(q)
+        if m:
+            return m.group("a").strip(), m.group("b").strip()
+    return None
+
+
+class TransferPlanner:
+    def __init__(self, graph: RouteGraph, name_threshold: int = 85, max_spread_m: float = 700.0):
+        self.graph = graph
+        self.name_threshold = int(name_threshold)
+        self.max_spread_m = float(max_spread_m)
+        g = graph
+        # plain lists: Dijkstra touches one edge at a time
+        self._indptr = g.indptr.tolist()
+        self._dst = g.dst.tolist()
+        fast = g.weight.astype(np.float64)
+        self._weights = {
+            FASTEST: fast.tolist(),
+            FEWEST_TRANSFERS: (fast + (g.kind == BOARD) * _BOARDING_COST).tolist(),
+        }
+        self.sources = list(g.ftz) or list(range(g.n_stops))
+        self._src_row = {s: i for i, s in enumerate(self.sources)}
+        self._dist: Dict[str, np.ndarray] = {}
+        self._pred: Dict[str, np.ndarray] = {}
+        # place name -> stops, for resolving free-text origins / destinations. A stop name
+        # is "<landmark>/<cross street>": landmarks (plus station names without "station")
+        # are matched before cross streets, so "Flinders Street Station" never means
+        # every stop on Flinders St.
+        self._landmarks: Dict[str, Set[int]] = defaultdict(set)
+        self._streets: Dict[str, Set[int]] = defaultdict(set)
+        for i, name in enumerate(g.names):
+            landmark, *streets = name.split("/")
+            key = normalize_place(landmark)
+            for k in (key, " ".join(w for w in key.split() if w != "station")):
+                if k:
+                    self._landmarks[k].add(i)
+            for part in streets + [name]:
+                k = normalize_place(part)
+                if k:
+                    self._streets[k].add(i)
+        self._xy = np.column_stack(g.index.proj.to_xy(g.index.lat, g.index.lon))
+        self._resolved: Dict[str, Tuple[int, ...]] = {}
+
+    def precompute(self) -> "TransferPlanner":
+        """All-pairs tables from every FTZ stop, for both objectives."""
+        for mode in (FASTEST, FEWEST_TRANSFERS):
+            dist = np.empty((len(self.sources), self.graph.n_nodes))
+            pred = np.empty((len(self.sources), self.graph.n_nodes), dtype=np.int32)
+            for i, s in enumerate(self.sources):
+                dist[i], pred[i] = self._dijkstra(s, mode)
+            self._dist[mode], self._pred[mode] = dist, pred
+        return self
+
+    def _dijkstra(self, source: int, mode: str) -> Tuple[List[float], List[int]]:
+        indptr, dst, w = self._indptr, self._dst, self._weights[mode]
+        dist = [float("inf")] * self.graph.n_nodes
+        pred = [-1] * self.graph.n_nodes
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v, nd = dst[e], d + w[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = e
+                    heapq.heappush(heap, (nd, v))
+        return dist, pred
+
+    def _tables(self, source: int, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        row = self._src_row.get(source)
+        if row is not None and mode in self._dist:
+            return self._dist[mode][row], self._pred[mode][row]
+        dist, pred = self._dijkstra(source, mode)
+        return np.asarray(dist), np.asarray(pred, dtype=np.int32)
+
+    def resolve(self, place: str) -> Tuple[int, ...]:
+        """Stops matching place: an exact landmark, then an exact cross street, then the
+        best token_set_ratio match among landmarks, then among cross streets. () when
+        nothing scores name_threshold or the best matches are more than max_spread_m
+        apart (ambiguous: "flinders" or "swanston st" name stops all over the CBD)."""
+        key = normalize_place(place)
+        if key not in self._resolved:
+            if len(self._resolved) >= 1024:
+                self._resolved.clear()
+            self._resolved[key] = self._resolve(key)
+        return self._resolved[key]
+
+    def _resolve(self, key: str) -> Tuple[int, ...]:
+        if not key:
+            return ()
+        stops: Set[int] = set()
+        for table in (self._landmarks, self._streets):
+            stops = set(table.get(key, ()))
+            if stops:
+                break
+        else:
+            for table in (self._landmarks, self._streets):
+                hits = process.extract(key, list(table), scorer=fuzz.token_set_ratio, limit=None,
+                                       score_cutoff=self.name_threshold)
+                if hits:
+                    best = max(score for _, score, _ in hits)
+                    stops = {s for name, score, _ in hits if score == best for s in table[name]}
+                    break
+        if not stops:
+            return ()
+        pts = self._xy[sorted(stops)]
+        spread = float(np.max(np.hypot(*(pts[:, None, :] - pts[None, :, :]).transpose(2, 0, 1))))
+        return tuple(sorted(stops)) if spread <= self.max_spread_m else ()
+
+    def plan(self, origins: Sequence[int], destinations: Sequence[int], mode: str = FASTEST) -> Optional[Itinerary]:
+        """Best itinerary from any origin stop to any destination stop."""
+        g = self.graph
+        best = None
+        dst_nodes = np.array([[d, d + g.n_stops] for d in destinations], dtype=np.int64).ravel()
+        for o in origins:
+            dist, pred = self._tables(o, mode)
+            j = int(np.argmin(dist[dst_nodes]))
+            if np.isfinite(dist[dst_nodes[j]]) and (best is None or dist[dst_nodes[j]] < best[0]):
+                best = (float(dist[dst_nodes[j]]), int(dst_nodes[j]), pred)
+        if best is None:
+            return None
+        _, node, pred = best
+        path = []
+        while pred[node] >= 0:
+            e = int(pred[node])
+            path.append(e)
+            node = int(g.edge_src[e])
+        return self._legs(path[::-1])
+
+    def _legs(self, path: List[int]) -> Itinerary:
+        g = self.graph
+        legs: List[Leg] = []
+        boarding = None  # (route_no, from stop, seconds) of the tram leg in progress
+        stops, metres = 0, 0.0
+        for e in path:
+            kind, w = int(g.kind[e]), float(g.weight[e])
+            src, dst = int(g.edge_src[e]), int(g.dst[e])
+            if kind == WALK:
+                legs.append(Leg("walk", "", g.stop_ids[g.node_stop[src]], g.stop_ids[g.node_stop[dst]], 0,
+                                float(g.metres[e]), w))
+            elif kind == BOARD:
+                boarding = (g.routes[g.node_route[dst]][1], g.stop_ids[g.node_stop[src]], w)
+                stops, metres = 0, 0.0
+            elif kind == RIDE:
+                stops += 1
+                metres += float(g.metres[e])
+                boarding = (boarding[0], boarding[1], boarding[2] + w)
+            elif kind == ALIGHT and boarding:
+                legs.append(Leg("tram", boarding[0], boarding[1], g.stop_ids[g.node_stop[dst]], stops, metres,
+                                boarding[2]))
+                boarding = None
+        trams = sum(1 for leg in legs if leg.mode == "tram")
+        return Itinerary(legs, sum(leg.seconds for leg in legs), max(0, trams - 1))
+
+    def describe(self, itinerary: Itinerary) -> str:
+        g = self.graph
+        name = lambda sid: g.names[g.stop_row[sid]]  # noqa: E731
+        legs = itinerary.legs
+        lines = [f"From {name(legs[0].from_stop)} to {name(legs[-1].to_stop)}:"] if legs else []
+        for i, leg in enumerate(legs, 1):
+            mins = max(1, round(leg.seconds / 60))
+            if leg.mode == "walk":
+                lines.append(f"{i}. Walk about {leg.metres:.0f} m from {name(leg.from_stop)} to {name(leg.to_stop)} "
+                             f"(~{mins} min)")
+            else:
+                lines.append(f"{i}. Take route {leg.route_no} from {name(leg.from_stop)} to {name(leg.to_stop)} "
+                             f"({leg.stops} stop{'s' if leg.stops != 1 else ''}, ~{mins} min incl. waiting)")
+        total = max(1, round(itinerary.seconds / 60))
+        transfers = f"{itinerary.transfers} transfer{'s' if itinerary.transfers != 1 else ''}"
+        return "\n".join(lines + [f"About {total} min, {transfers}."])
+
+    def answer(self, query: Optional[str]) -> Optional[str]:
+        """Deterministic answer to a 'from X to Y' routing question, or None to fall
+        through (not a routing question, or a stop that doesn't resolve unambiguously)."""
+        trip = parse_trip(query) if is_route_question(query) else None
+        if not trip:
+            return None
+        origins, destinations = self.resolve(trip[0]), self.resolve(trip[1])
+        if not origins or not destinations or set(origins) & set(destinations):
+            return None
+        fastest = self.plan(origins, destinations, FASTEST)
+        if fastest is None:
+            return None
+        parts = [f"Fastest:\n{self.describe(fastest)}"]
+        fewest = self.plan(origins, destinations, FEWEST_TRANSFERS)
+        if fewest is not None and fewest.transfers < fastest.transfers:
+            parts.append(f"Fewest transfers:\n{self.describe(fewest)}")
+        parts.append("Estimated from the static tram network (free tram zone); not live departure times.")
+        return "\n\n".join(parts)
+
+
+def build_planner(cfg: Optional[dict] = None) -> TransferPlanner:
+    """RouteGraph + precomputed TransferPlanner from the `planner` settings block."""
+    cfg = dict(cfg or {})
+    threshold = int(cfg.pop("name_threshold", 85))
+    spread = float(cfg.pop("max_spread_m", 700))
+    cfg.pop("enabled", None)
+    graph = RouteGraph(**{k: float(v) for k, v in cfg.items()})
+    return TransferPlanner(graph, name_threshold=threshold, max_spread_m=spread).precompute()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Plan a CBD tram trip")
+    ap.add_argument("query", help='e.g. "from Flinders St to Melbourne Central"')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    planner = build_planner()
+    t1 = time.perf_counter()
+    ans = planner.answer(args.query)
+    t2 = time.perf_counter()
+    g = planner.graph
+    print(f"graph: {g.n_stops} stops, {g.n_nodes} nodes, {len(g.dst)} edges, {len(g.routes)} routes; "
+          f"built + precomputed in {(t1 - t0) * 1e3:.0f} ms; answered in {(t2 - t1) * 1e3:.2f} ms\n")
+    print(ans or "No route found (could not parse or resolve the stops).")
+
+
+if __name__ == "__main__":
+    main()
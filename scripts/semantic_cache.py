@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Semantic answer cache: reuse an answer when a new question embeds close to a past one.
+
+Entries live in a small inner-product FAISS index per namespace (model / temperature /
+k / λ / retrieval settings / index generation, see answer_cache.answer_key) so a paraphrase only ever hits
+answers generated under the same settings. Bounded by entry count (oldest evicted) and
+age. In-memory only; the exact-key AnswerCache is the persistent tier.
+"""
+from collections import OrderedDict
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.9, max_entries: int = 512,
+                 max_age_seconds: float = 86400, search_k: int = 4,
+                 clock: Callable[[], float] = time.time):
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.max_age = float(max_age_seconds)
+        self.search_k = int(search_k)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # id -> (namespace, created, question, answer, sources); insertion order == age
+        self._entries: "OrderedDict[int, Tuple[str, float, str, str, list]]" = OrderedDict()
+        self._indexes: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).reshape(1, -1)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _index(self, namespace: str, dim: int):
+        index = self._indexes.get(namespace)
+        if index is None:
+            import faiss
+            index = self._indexes[namespace] = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        return index
+
+    def _drop(self, ids: List[int]) -> None:
+        for i in ids:
+            ns = self._entries.pop(i)[0]
+            index = self._indexes[ns]
+            index.remove_ids(np.asarray([i], dtype=np.int64))
+            if index.ntotal == 0:
+                del self._indexes[ns]
+
+    def _expire(self) -> None:
+        cutoff = self.clock() - self.max_age
+        old = list(itertools.takewhile(lambda i: self._entries[i][1] < cutoff, self._entries))
+        if old:
+            self._drop(old)
+
+    def get(self, namespace: str, query_vec) -> Optional[Tuple[str, str, List[Dict[str, Any]], float]]:
+        """(matched question, answer, sources, similarity) of the closest fresh entry
+        at or above the threshold, else None."""
+        with self._lock:
+            self._expire()
+            index = self._indexes.get(namespace)
+            if index is None:
+                self.misses += 1
+                return None
+            sims, ids = index.search(self._unit(query_vec), min(self.search_k, index.ntotal))
+            for sim, i in zip(sims[0], ids[0]):
+                if i >= 0 and sim >= self.threshold:
+                    _, _, question, answer, sources = self._entries[int(i)]
+                    self.hits += 1
+                    return question, answer, sources, float(sim)
+            self.misses += 1
+            return None
+
+    def put(self, namespace: str, query_vec, question: str, answer: str,
+            sources: List[Dict[str, Any]]) -> None:
+        v = self._unit(query_vec)
+        with self._lock:
+            self._expire()
+            i = next(self._ids)
+            self._index(namespace, v.shape[1]).add_with_ids(v, np.asarray([i], dtype=np.int64))
+            self._entries[i] = (namespace, self.clock(), question, answer, sources)
+            if len(self._entries) > self.max_entries:
+                self._drop(list(itertools.islice(self._entries, len(self._entries) - self.max_entries)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
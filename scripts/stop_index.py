@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Nearest tram stop lookups over data/curated/tram_stops.csv.
+
+StopIndex projects the stops to local metres (geo.LocalProjection) and buckets them
+in a uniform grid of cell_m squares, kept two ways:
+- a dict of non-empty cells -> [(x, y, row)] for single queries, which walk rings of
+  cells outwards in plain Python until the k-th hit is closer than the next ring
+  (a few microseconds; no array overhead for one point);
+- a dense (cells + 1, max stops per cell) table of stop rows and coordinates (inf in
+  empty slots, last row all-empty) for batches: each query gathers the (2r+1)^2 cells
+  around its own as one fancy-index and one broadcast gives all its distances. Queries
+  whose k-th hit is farther than r cells retry with r doubled; once the box would
+  hold as many slots as there are stops they fall back to a scan over all stops.
+
+  python scripts/stop_index.py -37.8136 144.9631 --k 3
+  python scripts/stop_index.py -37.8136 144.9631 --radius 300
+"""
+import argparse
+import csv
+import math
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:  # imported as scripts.stop_index (app.py) or as stop_index (scripts/*.py)
+    from .geo import LocalProjection
+except ImportError:
+    from geo import LocalProjection
+
+ROOT = Path(__file__).resolve().parents[1]
+STOPS_CSV = ROOT / "data/curated/tram_stops.csv"
+
+
+class Stop(NamedTuple):
+    stop_id: str
+    name: str
+    lat: float
+    lon: float
+    distance_m: float
+
+
+class StopIndex:
+    def __init__(self, stop_ids: Sequence[str], names: Sequence[str], lat, lon, cell_m: float = 250.0):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if not len(lat):
+            raise ValueError("StopIndex needs at least one stop")
+        self.stop_ids = list(stop_ids)
+        self.names = list(names)
+        self.lat, self.lon = lat, lon
+        self.cell = float(cell_m)
+        self.proj = LocalProjection(lat.mean(), lon.mean())
+        self._x, self._y = self.proj.to_xy(lat, lon)
+        self.x0, self.y0 = float(self._x.min()), float(self._y.min())
+        gx, gy = self._cells(self._x, self._y)
+        self.nx, self.ny = int(gx.max()) + 1, int(gy.max()) + 1
+
+        self._buckets: Dict[Tuple[int, int], List[Tuple[float, float, int]]] = {}
+        for row, (x, y, cx, cy) in enumerate(zip(self._x.tolist(), self._y.tolist(), gx.tolist(), gy.tolist())):
+            self._buckets.setdefault((cx, cy), []).append((x, y, row))
+
+        key = gx * self.ny + gy
+        self._empty = self.nx * self.ny  # sentinel cell for neighbours off the grid
+        counts = np.bincount(key, minlength=self._empty + 1)
+        # slot of each stop within its cell = its rank among the cell's stops
+        order = np.argsort(key, kind="stable")
+        slot = np.empty(len(key), dtype=np.int64)
+        slot[order] = np.arange(len(key)) - (np.cumsum(counts) - counts)[key[order]]
+        m = int(counts.max())
+        self._slot_row = np.full((len(counts), m), -1, dtype=np.int64)
+        self._slot_x = np.full((len(counts), m), np.inf)
+        self._slot_y = np.full((len(counts), m), np.inf)
+        self._slot_row[key, slot] = np.arange(len(key))
+        self._slot_x[key, slot] = self._x
+        self._slot_y[key, slot] = self._y
+
+    @classmethod
+    def from_csv(cls, path: Path = STOPS_CSV, cell_m: float = 250.0) -> "StopIndex":
+        ids, names, lats, lons = [], [], [], []
+        with Path(path).open(newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat, lon = float(row["lat"]), float(row["lon"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not (math.isfinite(lat) and math.isfinite(lon)) or (lat == 0 and lon == 0):
+                    continue
+                ids.append(row["stop_id"]); names.append(row.get("stop_name", ""))
+                lats.append(lat); lons.append(lon)
+        return cls(ids, names, lats, lons, cell_m=cell_m)
+
+    def __len__(self) -> int:
+        return len(self.stop_ids)
+
+    def stop(self, i: int, distance_m: float = 0.0) -> Stop:
+        return Stop(self.stop_ids[i], self.names[i], float(self.lat[i]), float(self.lon[i]), float(distance_m))
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Grid cell of each point; may lie outside the grid for far-away points."""
+        return (np.floor((x - self.x0) / self.cell).astype(np.int64),
+                np.floor((y - self.y0) / self.cell).astype(np.int64))
+
+    # --- single point ------------------------------------------------------------
+
+    @staticmethod
+    def _ring(cx: int, cy: int, r: int) -> Iterator[Tuple[int, int]]:
+        if r == 0:
+            yield cx, cy
+            return
+        for gx in range(cx - r, cx + r + 1):
+            yield gx, cy - r
+            yield gx, cy + r
+        for gy in range(cy - r + 1, cy + r):
+            yield cx - r, gy
+            yield cx + r, gy
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Stop]:
+        """The k stops nearest to (lat, lon), nearest first."""
+        k = min(int(k), len(self))
+        if k < 1:
+            return []
+        qx, qy = self.proj.point(lat, lon)
+        cx, cy = math.floor((qx - self.x0) / self.cell), math.floor((qy - self.y0) / self.cell)
+        # first ring that touches the grid, and the ring that covers all of it
+        r = max(0, -cx, cx - (self.nx - 1), -cy, cy - (self.ny - 1))
+        r_max = max(cx, self.nx - 1 - cx, cy, self.ny - 1 - cy, 0)
+        best: List[Tuple[float, int]] = []
+        while True:
+            for cell in self._ring(cx, cy, r):
+                for x, y, row in self._buckets.get(cell, ()):
+                    best.append(((x - qx) ** 2 + (y - qy) ** 2, row))
+            if len(best) >= k:
+                best.sort()
+                del best[k:]
+                # anything in a later ring is at least r cells away from the query's cell
+                if best[-1][0] <= (r * self.cell) ** 2:
+                    break
+            if r >= r_max:
+                best.sort()
+                break
+            r += 1
+        return [self.stop(row, math.sqrt(d2)) for d2, row in best]
+
+    def within(self, lat: float, lon: float, radius_m: float, limit: Optional[int] = None) -> List[Stop]:
+        """Every stop within radius_m of (lat, lon), nearest first."""
+        qx, qy = self.proj.point(lat, lon)
+        cx, cy = math.floor((qx - self.x0) / self.cell), math.floor((qy - self.y0) / self.cell)
+        r = int(math.ceil(radius_m / self.cell))
+        r2 = float(radius_m) ** 2
+        hits: List[Tuple[float, int]] = []
+        for gx in range(max(cx - r, 0), min(cx + r, self.nx - 1) + 1):
+            for gy in range(max(cy - r, 0), min(cy + r, self.ny - 1) + 1):
+                for x, y, row in self._buckets.get((gx, gy), ()):
+                    d2 = (x - qx) ** 2 + (y - qy) ** 2
+                    if d2 <= r2:
+                        hits.append((d2, row))
+        hits.sort()
+        return [self.stop(row, math.sqrt(d2)) for d2, row in hits[:limit]]
+
+    # --- batches -------------------------------------------------------------------
+
+    def _box_slots(self, r: int) -> int:
+        return (2 * r + 1) ** 2 * self._slot_row.shape[1]
+
+    def _gather(self, qx: np.ndarray, qy: np.ndarray, r: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(stop rows, squared metres), one row per query, over the (2r+1)^2 cells
+        around each query's cell; off-grid neighbours read the empty sentinel cell."""
+        gx, gy = self._cells(qx, qy)
+        d = np.arange(-r, r + 1)
+        nbx = gx[:, None, None] + d[None, :, None]
+        nby = gy[:, None, None] + d[None, None, :]
+        valid = (nbx >= 0) & (nbx < self.nx) & (nby >= 0) & (nby < self.ny)
+        cells = np.where(valid, nbx * self.ny + nby, self._empty).reshape(len(qx), -1)
+        shape = (len(qx), self._box_slots(r))
+        d2 = (self._slot_x[cells].reshape(shape) - qx[:, None]) ** 2 + \
+             (self._slot_y[cells].reshape(shape) - qy[:, None]) ** 2
+        return self._slot_row[cells].reshape(shape), d2
+
+    def _scan(self, qx: np.ndarray, qy: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+        """Exact fallback: squared metres from each query to every stop, in row blocks."""
+        step = max(1, (1 << 22) // len(self))
+        for a in range(0, len(qx), step):
+            yield a, (self._x[None, :] - qx[a:a + step, None]) ** 2 + (self._y[None, :] - qy[a:a + step, None]) ** 2
+
+    @staticmethod
+    def _top(d2: np.ndarray, k: int) -> np.ndarray:
+        """Column indices of the k smallest per row, nearest first."""
+        if k == 1:
+            return np.argmin(d2, axis=1)[:, None]
+        top = np.argpartition(d2, k - 1, axis=1)[:, :k] if d2.shape[1] > k else \
+            np.broadcast_to(np.arange(d2.shape[1]), d2.shape)
+        return np.take_along_axis(top, np.argsort(np.take_along_axis(d2, top, 1), axis=1, kind="stable"), 1)
+
+    def nearest_many(self, lat, lon, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """(stop rows (n, k), distances in metres (n, k)) for many points at once,
+        nearest first; padded with -1 / inf when k exceeds the number of stops."""
+        qx, qy = self.proj.to_xy(np.ravel(lat), np.ravel(lon))
+        k = max(int(k), 0)
+        idx = np.full((len(qx), k), -1, dtype=np.int64)
+        dist = np.full((len(qx), k), np.inf)
+        kk = min(k, len(self))
+        if not len(qx) or kk < 1:
+            return idx, dist
+        pending = np.arange(len(qx))
+        r = 1
+        while len(pending) and self._box_slots(r) < len(self):
+            rows, d2 = self._gather(qx[pending], qy[pending], r)
+            if rows.shape[1] >= kk:
+                top = self._top(d2, kk)
+                best = np.take_along_axis(d2, top, 1)
+                ok = best[:, -1] <= (r * self.cell) ** 2
+                idx[pending[ok], :kk] = np.take_along_axis(rows, top, 1)[ok]
+                dist[pending[ok], :kk] = np.sqrt(best[ok])
+                pending = pending[~ok]
+            r *= 2
+        for a, d2 in self._scan(qx[pending], qy[pending]):
+            top = self._top(d2, kk)
+            sel = pending[a:a + len(d2)]
+            idx[sel, :kk] = top
+            dist[sel, :kk] = np.sqrt(np.take_along_axis(d2, top, 1))
+        return idx, dist
+
+    def within_many(self, lat, lon, radius_m: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per point: (stop rows, distances in metres) within radius_m, nearest first."""
+        qx, qy = self.proj.to_xy(np.ravel(lat), np.ravel(lon))
+        if not len(qx):
+            return []
+        r = int(math.ceil(radius_m / self.cell))
+        if self._box_slots(r) < len(self):
+            blocks = [self._gather(qx, qy, r)]
+        else:
+            all_rows = np.arange(len(self))
+            blocks = [(np.broadcast_to(all_rows, d2.shape), d2) for _, d2 in self._scan(qx, qy)]
+        out = []
+        r2 = float(radius_m) ** 2
+        for rows, d2 in blocks:
+            for row_ids, row in zip(rows, d2):
+                hit = np.flatnonzero(row <= r2)
+                hit = hit[np.argsort(row[hit], kind="stable")]
+                out.append((row_ids[hit], np.sqrt(row[hit])))
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Nearest tram stops to a lat/lon")
+    ap.add_argument("lat", type=float)
+    ap.add_argument("lon", type=float)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--radius", type=float, default=None, help="metres; list every stop within it instead")
+    ap.add_argument("--stops", type=Path, default=STOPS_CSV)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    index = StopIndex.from_csv(args.stops)
+    t1 = time.perf_counter()
+    hits = index.within(args.lat, args.lon, args.radius) if args.radius else index.nearest(args.lat, args.lon, args.k)
+    t2 = time.perf_counter()
+    print(f"{len(index)} stops indexed in {(t1 - t0) * 1e3:.1f} ms; query {(t2 - t1) * 1e6:.0f} µs")
+    for s in hits:
+        print(f"{s.distance_m:8.0f} m  {s.stop_id:>6}  {s.name}")
+
+
+if __name__ == "__main__":
+    main()
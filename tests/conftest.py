@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# tests import the app's modules the way app.py does: `from scripts.x import ...`
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+from scripts import retriever
+
+
+@pytest.fixture
+def aliases(tmp_path, monkeypatch):
+    """retriever reading a tmp aliases.json, with the compiled matcher reset."""
+    path = tmp_path / "aliases.json"
+    monkeypatch.setattr(retriever, "ALIASES", path)
+    monkeypatch.setitem(retriever._ALIAS_STATE, "mtime", object())
+
+    def write(alias_map):
+        path.write_text(json.dumps(alias_map), encoding="utf-8")
+        st = path.stat()  # a rewrite within the same mtime tick must still be picked up
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    return write
+
+
+def test_longer_overlapping_alias_wins(aliases):
+    aliases({
+        "flinders street station": ["Flinders Street", "FSS"],
+        "flinders lane": ["Flinders"],
+    })
+    assert retriever.preprocess_query("Tram to Flinders Street?") == "tram to flinders street station?"
+    assert retriever.preprocess_query("cafe on flinders") == "cafe on flinders lane"
+    # single pass: an expansion is never re-expanded by a shorter alias inside it
+    assert retriever.preprocess_query("fss or flinders") == "flinders street station or flinders lane"
+
+
+def test_first_canonical_wins_for_a_shared_alias(aliases):
+    aliases({"melbourne central": ["MC"], "museum of chinese": ["mc"]})
+    assert retriever.preprocess_query("  MC stop ") == "melbourne central stop"
+
+
+def test_touching_the_alias_file_reloads_it(aliases):
+    aliases({"city circle": ["35"]})
+    assert retriever.preprocess_query("route 35 times") == "route city circle times"
+    pattern = retriever._ALIAS_STATE["pattern"]
+    assert retriever.preprocess_query("the 35") == "the city circle"
+    assert retriever._ALIAS_STATE["pattern"] is pattern  # unchanged file: no recompile
+
+    aliases({"city circle": ["35"], "free tram zone": ["FTZ"]})
+    assert retriever.preprocess_query("is the ftz near the 35") == "is the free tram zone near the city circle"
+
+
+def test_missing_or_empty_alias_file(aliases):
+    assert retriever.preprocess_query("  Hello  ") == "hello"
+    assert retriever.preprocess_query(None) == ""
+    aliases({"x": [], "y": [""]})
+    assert retriever.preprocess_query("x y") == "x y"
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from scripts import ann_index
+from scripts.ann_index import auto_nlist, build_index, search_params
+
+faiss = pytest.importorskip("faiss")
+
+
+def _unit(n, dim=32, seed=0):
+    X = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def _recall(index, X, Q, k=10):
+    _, got = index.search(Q, k)
+    exact = np.argsort(-(Q @ X.T), axis=1)[:, :k]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(got.tolist(), exact.tolist())])
+
+
+def test_flat_is_exact_with_blocked_add(monkeypatch):
+    monkeypatch.setattr(ann_index, "_ADD_ROWS", 97)  # several add() blocks
+    X, Q = _unit(1000), _unit(20, seed=1)
+    index = build_index(X, "flat")
+    assert index.ntotal == len(X)
+    assert _recall(index, X, Q) == 1.0
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw"])
+def test_approximate_kinds_reach_high_recall(kind):
+    # clustered like real chunk embeddings; queries land near stored chunks (see recall_report)
+    rng = np.random.default_rng(3)
+    X = np.repeat(_unit(40, seed=3), 75, axis=0) + rng.normal(0, 0.15, (3000, 32)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    Q = X[:50] + np.random.default_rng(2).normal(0, 0.05, (50, X.shape[1])).astype(np.float32)
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True)
+    params = search_params(kind, {"nprobe": 16, "ef_search": 128}, len(X))
+    index = build_index(X, kind, params)
+    assert index.ntotal == len(X)
+    assert _recall(index, X, Q) >= 0.9
+
+
+def test_params():
+    assert auto_nlist(10) == 1
+    assert auto_nlist(100000) == int(4 * np.sqrt(100000))
+    p = search_params("ivf_flat", {"nlist": 4, "nprobe": 8}, 1000)
+    assert p["nlist"] == 4 and p["nprobe"] == 4  # nprobe capped at nlist
+    assert search_params("flat", None, 10) == {}
+    with pytest.raises(ValueError):
+        build_index(_unit(10), "lsh")
@@ -0,0 +1,63 @@
+from scripts.answer_cache import AnswerCache, answer_key
+
+
+class _Clock:
+    def __init__(self, t=1_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+RETRIEVAL = {"search_type": "mmr", "fetch_k": 24}
+SOURCES = [{"page_content": "City Circle is free", "metadata": {"source": "faq.json"}}]
+
+
+def _key(**kw):
+    args = dict(question="is the city circle free", model="llama3.2:3b", temperature=0.2, k=6,
+                lambda_mult=0.5, generation="gen-1", retrieval=RETRIEVAL)
+    args.update(kw)
+    return answer_key(**args)
+
+
+def test_hit_only_under_the_same_model_generation_and_settings():
+    cache = AnswerCache()
+    cache.put(_key(), "Yes.", SOURCES)
+    assert cache.get(_key()) == ("Yes.", SOURCES)
+    assert _key() == _key(retrieval=dict(RETRIEVAL))  # key is order/identity independent
+    for other in (_key(generation="gen-2"), _key(model="mistral"), _key(temperature=0.7),
+                  _key(retrieval={**RETRIEVAL, "search_type": "hybrid"})):
+        assert cache.get(other) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 4
+
+
+def test_expired_entry_is_not_returned():
+    clock = _Clock()
+    cache = AnswerCache(ttl_seconds=60, clock=clock)
+    cache.put(_key(), "Yes.", SOURCES)
+    clock.t += 60
+    assert cache.get(_key()) == ("Yes.", SOURCES)
+    clock.t += 1
+    assert cache.get(_key()) is None
+    assert cache.stats()["size_mem"] == 0
+
+
+def test_sqlite_tier_survives_restart_but_not_expiry(tmp_path):
+    clock = _Clock()
+    db = tmp_path / "answers.sqlite"
+    AnswerCache(db_path=db, ttl_seconds=60, clock=clock).put(_key(), "Yes.", SOURCES)
+    assert AnswerCache(db_path=db, ttl_seconds=60, clock=clock).get(_key()) == ("Yes.", SOURCES)
+    clock.t += 61
+    reopened = AnswerCache(db_path=db, ttl_seconds=60, clock=clock)
+    assert reopened.get(_key()) is None
+    assert reopened._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 0  # purged on open
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AnswerCache(max_entries=2)
+    for q in ("a", "b"):
+        cache.put(_key(question=q), q, [])
+    cache.get(_key(question="a"))
+    cache.put(_key(question="c"), "c", [])
+    assert cache.get(_key(question="b")) is None
+    assert cache.get(_key(question="a")) == ("a", [])
@@ -0,0 +1,72 @@
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from scripts.bm25_index import BM25Index, build_bm25, reciprocal_rank_fusion, tokenize
+
+
+def _corpus(n=300, vocab=60, seed=3):
+    rnd = random.Random(seed)
+    words = [f"w{i}" for i in range(vocab)]
+    return [" ".join(rnd.choices(words, k=rnd.randint(0, 25))) for _ in range(n)]
+
+
+def _brute_scores(texts, query, k1=1.2, b=0.75):
+    docs = [Counter(tokenize(t)) for t in texts]
+    lens = [sum(d.values()) for d in docs]
+    avg = (sum(lens) / len(lens)) or 1.0
+    out = []
+    for d, dl in zip(docs, lens):
+        s = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for x in docs if term in x)
+            if not df or term not in d:
+                continue
+            idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+            tf = d[term]
+            s += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avg))
+        out.append(s)
+    return np.array(out, dtype=np.float32)
+
+
+@pytest.mark.parametrize("run_postings", [7, 1000, 1 << 22])
+def test_scores_match_formula_across_run_sizes(tmp_path, run_postings):
+    texts = _corpus()
+    index = BM25Index(build_bm25(tmp_path / "bm25", iter(texts), run_postings=run_postings))
+    for query in ("w1 w2", "w5", "w7 w7 w30 nothing"):
+        np.testing.assert_allclose(index.scores(query), _brute_scores(texts, query), rtol=1e-5, atol=1e-6)
+    assert not (tmp_path / "bm25" / "runs.tmp").exists()
+
+
+def test_postings_sorted_by_doc_within_each_term(tmp_path):
+    index = BM25Index(build_bm25(tmp_path / "bm25", iter(_corpus()), run_postings=11))
+    indptr, doc_ids = np.asarray(index.indptr), np.asarray(index.doc_ids)
+    for t in range(len(indptr) - 1):
+        assert np.all(np.diff(doc_ids[indptr[t]:indptr[t + 1]]) > 0)
+
+
+def test_search_top_k_and_mask(tmp_path):
+    texts = _corpus()
+    index = BM25Index(build_bm25(tmp_path / "bm25", iter(texts)))
+    ids, scores = index.search("w3 w4", 5)
+    brute = _brute_scores(texts, "w3 w4")
+    np.testing.assert_allclose(np.sort(scores)[::-1], np.sort(brute)[::-1][:5], rtol=1e-5)
+    mask = np.zeros(len(texts), dtype=bool)
+    mask[::2] = True
+    ids, _ = index.search("w3 w4", 50, mask=mask)
+    assert len(ids) and np.all(ids % 2 == 0)
+    assert len(index.search("unknownterm", 5)[0]) == 0
+
+
+def test_empty_corpus(tmp_path):
+    index = BM25Index(build_bm25(tmp_path / "bm25", iter([])))
+    assert index.n_docs == 0 and len(index.search("w1", 3)[0]) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1, 9])], k=3, rrf_k=60)
+    # 1: 1/61 + 1/62, 3: 1/63 + 1/61, 2: 1/62, 9: 1/63
+    assert fused == [1, 3, 2]
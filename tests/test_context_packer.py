@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+
+from scripts.context_packer import estimate_tokens, merge_passages, pack_context
+
+TEXT = " ".join(f"word{i}" for i in range(400))
+
+
+def _doc(text, source="a.pdf", page=1):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_overlapping_windows_are_stitched():
+    a, b = TEXT[:900], TEXT[750:1650]
+    passages = merge_passages([_doc(b), _doc(a)], min_overlap=30)
+    assert len(passages) == 1
+    assert passages[0].text == TEXT[:1650].strip()
+    assert passages[0].rank == 0
+
+
+def test_contained_repeat_keeps_citation_not_text():
+    passages = merge_passages([_doc(TEXT[:900]), _doc("  " + TEXT[100:400], source="faq.json", page=None)])
+    assert len(passages) == 1
+    assert passages[0].sources == ["a.pdf", "faq.json"]
+
+
+def test_different_pages_are_not_stitched():
+    passages = merge_passages([_doc(TEXT[:900], page=1), _doc(TEXT[750:1650], page=2)])
+    assert len(passages) == 2
+
+
+def test_budget_is_respected_with_truncation():
+    docs = [_doc(TEXT[:900], source="s.md"),
+            _doc(TEXT[1000:1900], source="t.md"), _doc(TEXT[2000:2900], source="u.md")]
+    context, stats = pack_context(docs, max_tokens=400, min_tail_tokens=32)
+    assert estimate_tokens(context) <= 400
+    assert stats["tokens"] <= 400
+    assert stats["packed"] == 2 and stats["truncated"] == 1 and stats["dropped"] == 1
+    assert context.rstrip().endswith("[t.md]")
+
+
+def test_empty_context():
+    context, stats = pack_context([], max_tokens=100)
+    assert context == "[no context retrieved]" and stats["packed"] == 0
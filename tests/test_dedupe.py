@@ -0,0 +1,33 @@
+from scripts.dedupe import ChunkDeduper, lsh_params
+
+BASE = ("Trams in the free tram zone are free to ride and you do not need to touch on "
+        "your myki as long as your whole trip stays inside the zone boundary shown on the map")
+
+
+def test_lsh_params_factor_num_perm():
+    bands, rows = lsh_params(64, 0.85)
+    assert bands * rows == 64
+    assert abs((1 / bands) ** (1 / rows) - 0.85) < 0.1
+
+
+def test_exact_duplicate_ignores_case_and_whitespace():
+    d = ChunkDeduper()
+    assert d.check("a", BASE) is None
+    assert d.check("b", "  " + BASE.upper().replace(" ", "\n ")) == "a"
+    assert d.stats() == {"exact": 1, "near": 0}
+
+
+def test_near_duplicate_found_distinct_text_kept():
+    d = ChunkDeduper(threshold=0.8)
+    assert d.check("a", BASE) is None
+    assert d.check("b", BASE + " today") == "a"
+    assert d.check("c", "Route 96 runs from East Brunswick to St Kilda Beach along Bourke Street "
+                        "and Nicholson Street stopping at the Melbourne Museum and Southern Cross") is None
+    assert d.stats()["near"] == 1
+
+
+def test_short_texts_only_match_exactly():
+    d = ChunkDeduper(min_shingles=8)
+    assert d.check("a", "route 96") is None
+    assert d.check("b", "route 96 tram") is None
+    assert d.check("c", "Route 96") == "a"
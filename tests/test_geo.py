@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+
+from scripts.geo import LocalProjection, PolygonSet
+
+
+def _ray_cast(x, y, rings):
+    """Scalar even-odd reference over every ring of one polygon."""
+    inside = False
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+def _star(cx, cy, r_out, r_in, n):
+    t = np.linspace(0, 2 * np.pi, 2 * n, endpoint=False)
+    r = np.where(np.arange(2 * n) % 2, r_in, r_out)
+    return [[float(cx + a * np.cos(b)), float(cy + a * np.sin(b))] for a, b in zip(r, t)]
+
+
+MULTI = {
+    "type": "MultiPolygon",
+    "coordinates": [
+        # outer star with a square hole
+        [_star(0, 0, 10, 4, 150), [[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]]],
+        [[[20, 20], [30, 20], [30, 30], [20, 30]]],  # open ring: closed by PolygonSet
+    ],
+}
+
+
+def test_contains_matches_scalar_ray_cast():
+    polys = PolygonSet(MULTI["coordinates"])
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-12, 32, 1500)
+    y = rng.uniform(-12, 32, 1500)
+    got = polys.contains(x, y)
+    expect = np.array([any(_ray_cast(a, b, poly) for poly in MULTI["coordinates"]) for a, b in zip(x, y)])
+    assert np.array_equal(got, expect)
+
+
+def test_hole_and_second_polygon():
+    polys = PolygonSet(MULTI["coordinates"])
+    assert polys.contains([0.0, 5.0, 25.0, 15.0], [0.0, 0.0, 25.0, 15.0]).tolist() == [False, True, True, False]
+    assert len(polys) == 2
+    assert polys.bounds[2:] == (30.0, 30.0)
+
+
+def test_from_geojson_feature_collection_and_shape(tmp_path):
+    path = tmp_path / "ftz.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection",
+                                "features": [{"type": "Feature", "geometry": MULTI}]}), encoding="utf-8")
+    polys = PolygonSet.from_geojson(path)
+    grid = np.array([[0.0, 5.0], [25.0, 40.0]])
+    assert polys.contains(grid, grid).shape == (2, 2)
+
+
+def test_local_projection_distances():
+    proj = LocalProjection(-37.8136, 144.9631)
+    x, y = proj.to_xy([-37.8136, -37.8136 + 0.01], [144.9631 + 0.01, 144.9631])
+    # 0.01° of latitude ≈ 1112 m; of longitude at -37.8° ≈ 879 m
+    assert abs(y[1] - 1111.95) < 1 and abs(x[0] - 879.0) < 2
+    assert proj.point(-37.8136, 144.9631) == (0.0, 0.0)
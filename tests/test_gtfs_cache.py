@@ -0,0 +1,206 @@
+import csv
+import importlib
+import io
+import json
+import random
+import statistics
+import zipfile
+from collections import defaultdict
+
+import pytest
+
+from conftest import ROOT
+
+SQUARE = [(144.95, -37.82), (144.97, -37.82), (144.97, -37.80), (144.95, -37.80)]
+
+
+@pytest.fixture
+def curate(tmp_path, monkeypatch):
+    # curate_gtfs imports its siblings the way `python scripts/curate_gtfs.py` sees them
+    monkeypatch.syspath_prepend(str(ROOT / "scripts"))
+    monkeypatch.chdir(tmp_path)  # the module mkdirs data/ dirs relative to the cwd on import
+    mod = importlib.import_module("curate_gtfs")
+    gc = importlib.import_module("gtfs_cache")
+    monkeypatch.setattr(gc, "CACHE_ROOT", tmp_path / "cache")
+    monkeypatch.setattr(mod, "GTFS_DIR", tmp_path / "gtfs")
+    monkeypatch.setattr(mod, "OUT_DIR", tmp_path / "curated")
+    monkeypatch.setattr(mod, "POLY_PATH", tmp_path / "poly.geojson")
+    for d in ("gtfs", "curated"):
+        (tmp_path / d).mkdir(exist_ok=True)
+    (tmp_path / "poly.geojson").write_text(json.dumps(
+        {"type": "Polygon", "coordinates": [[list(p) for p in SQUARE + SQUARE[:1]]]}))
+    return mod, gc
+
+
+def _csv(header, rows) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    w.writerows(rows)
+    return buf.getvalue()
+
+
+def _feed(rng, prefix, route_types, n_stops=40, n_trips=30):
+    """One synthetic GTFS feed as {name: csv text}; ids carry `prefix` so feeds don't clash."""
+    routes = [(f"{prefix}R{i}", str(10 + i), f"Route {i}", "", t) for i, t in enumerate(route_types)]
+    stops = [(f"{prefix}S{i}", f"Stop {i}", f"{rng.uniform(-37.83, -37.79):.6f}",
+              f"{rng.uniform(144.94, 144.98):.6f}", rng.choice(["0", "1", ""])) for i in range(n_stops)]
+    trips, stop_times = [], []
+    for t in range(n_trips):
+        rid = rng.choice(routes)[0]
+        trips.append((rid, f"{prefix}T{t}"))
+        for seq, s in enumerate(rng.sample(stops, 8), 1):
+            # shifted / odd sequences make medians land on .5; a few are unparsable
+            val = rng.choice([str(seq), str(seq + 1), str(seq + 3), "3.5"] if rng.random() < 0.1
+                             else [str(seq), str(seq + 1), str(seq + 3)])
+            stop_times.append((f"{prefix}T{t}", s[0], val))
+    return {
+        "routes.txt": _csv(["route_id", "route_short_name", "route_long_name", "route_desc", "route_type"], routes),
+        "stops.txt": _csv(["stop_id", "stop_name", "stop_lat", "stop_lon", "wheelchair_boarding"], stops),
+        "trips.txt": _csv(["route_id", "trip_id"], trips),
+        "stop_times.txt": "﻿" + _csv(["trip_id", "stop_id", "stop_sequence"], stop_times),
+    }
+
+
+def _write_nested(path, feeds):
+    """Statewide layout: the outer zip only holds <mode>/google_transit.zip members."""
+    with zipfile.ZipFile(path, "w") as outer:
+        outer.writestr("readme.txt", "synthetic")
+        for mode, files in feeds.items():
+            inner = io.BytesIO()
+            with zipfile.ZipFile(inner, "w", zipfile.ZIP_DEFLATED) as z:
+                for name, text in files.items():
+                    z.writestr(name, text)
+            outer.writestr(f"{mode}/google_transit.zip", inner.getvalue())
+
+
+def _rows(feeds, name):
+    return [r for files in feeds.values() for r in csv.DictReader(io.StringIO(files[name].lstrip("﻿")))]
+
+
+def _baseline(feeds):
+    """The original curate_gtfs algorithm (csv.DictReader, statistics.median, ray cast)
+    over the concatenated feeds: {csv name: text}."""
+    routes, trips, stop_times, stops = (_rows(feeds, f"{t}.txt") for t in ("routes", "trips", "stop_times", "stops"))
+
+    def rtype(r):
+        try:
+            return int(float(r.get("route_type", 0)))
+        except Exception:
+            return 0
+
+    def inside(x, y):
+        hit = False
+        for (x1, y1), (x2, y2) in zip(SQUARE, SQUARE[1:] + SQUARE[:1]):
+            if ((y1 > y) != (y2 > y)) and (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-12) + x1):
+                hit = not hit
+        return hit
+
+    tram = [r for r in routes if rtype(r) == 0]
+    tram_ids = {r["route_id"] for r in tram}
+    out = {"tram_routes.csv": _csv(["route_id", "route_no", "route_name"],
+                                   [(r["route_id"], r["route_short_name"], r["route_long_name"] or r["route_desc"])
+                                    for r in tram])}
+    in_ftz = {s["stop_id"] for s in stops if inside(float(s["stop_lon"]), float(s["stop_lat"]))}
+    out["tram_stops.csv"] = _csv(["stop_id", "stop_name", "lat", "lon", "wheelchair_boarding"],
+                                 [(s["stop_id"], s["stop_name"], float(s["stop_lat"]), float(s["stop_lon"]),
+                                   s["wheelchair_boarding"]) for s in stops])
+    out["stops_in_ftz.csv"] = _csv(["stop_id"], [(sid,) for sid in sorted(in_ftz)])
+    trip_route = {t["trip_id"]: t["route_id"] for t in trips if t["route_id"] in tram_ids}
+    seqs = defaultdict(lambda: defaultdict(list))
+    for st in stop_times:
+        rid = trip_route.get(st["trip_id"])
+        if not rid or st["stop_id"] not in in_ftz:
+            continue
+        try:
+            seqs[rid][st["stop_id"]].append(int(st["stop_sequence"]))
+        except ValueError:
+            continue
+    name = {s["stop_id"]: s["stop_name"] for s in stops}
+    no = {r["route_id"]: r["route_short_name"] for r in tram}
+    medians = {(rid, sid): statistics.median(v) for rid, d in seqs.items() for sid, v in d.items()}
+    rows = [(rid, no[rid], sid, name[sid], f"{med:09.2f}") for (rid, sid), med in medians.items()]
+    rows.sort(key=lambda r: (r[1], r[0], r[4]))
+    out["route_stops_cbd.csv"] = _csv(["route_id", "route_no", "stop_id", "stop_name", "order_in_cbd"], rows)
+    return out
+
+
+def _feeds(seed=0):
+    rng = random.Random(seed)
+    # trams live in one nested feed; the bus feed must be filtered out by route_type
+    return {"2": _feed(rng, "3-", ["0", "0", "0.0", "3.0"]), "4": _feed(rng, "4-", ["3", "3", "700"])}
+
+
+def test_curated_csvs_match_the_baseline_algorithm(curate, tmp_path):
+    mod, _ = curate
+    feeds = _feeds()
+    _write_nested(tmp_path / "gtfs" / "gtfs.zip", feeds)
+    mod.main()
+    want = _baseline(feeds)
+    for name, text in want.items():
+        got = (tmp_path / "curated" / name).read_text(encoding="utf-8")
+        assert got.splitlines() == text.splitlines(), name
+
+
+def test_route_stop_orders_matches_plain_python(curate, tmp_path):
+    mod, gc = curate
+    feeds = _feeds(seed=3)
+    zip_path = tmp_path / "gtfs" / "gtfs.zip"
+    _write_nested(zip_path, feeds)
+    cache = gc.open_cache(zip_path, mod.iter_columns)
+    rng = random.Random(3)
+    tram = {"3-R0", "3-R2", "4-R1"}
+    ftz = {s["stop_id"] for s in _rows(feeds, "stops.txt") if rng.random() < 0.5}
+
+    trip_route = {t["trip_id"]: t["route_id"] for t in _rows(feeds, "trips.txt") if t["route_id"] in tram}
+    seqs = {}  # first-appearance order of (route, stop) in stop_times
+    for st in _rows(feeds, "stop_times.txt"):
+        rid = trip_route.get(st["trip_id"])
+        if rid and st["stop_id"] in ftz and st["stop_sequence"].isdigit():
+            seqs.setdefault((rid, st["stop_id"]), []).append(int(st["stop_sequence"]))
+    want = [(r, s, statistics.median(v)) for (r, s), v in seqs.items()]
+
+    route_code, stop_code = cache.code_of("route_id"), cache.code_of("stop_id")
+    got = mod.route_stop_orders(cache, sorted(route_code[r] for r in tram), sorted(stop_code[s] for s in ftz))
+    route_ids, stop_ids = cache.strings("route_id"), cache.strings("stop_id")
+    assert [(route_ids[r], stop_ids[s], m) for (r, s), m in got.items()] == want
+    assert len(want) > 20
+
+
+def test_cache_is_keyed_by_zip_hash_and_rebuilt_on_change(curate, tmp_path, monkeypatch):
+    mod, gc = curate
+    calls = []
+    convert = gc.convert
+    monkeypatch.setattr(gc, "convert", lambda *a: calls.append(a) or convert(*a))
+    zip_path = tmp_path / "gtfs" / "gtfs.zip"
+    _write_nested(zip_path, _feeds(seed=1))
+
+    first = gc.open_cache(zip_path, mod.iter_columns)
+    assert first.path.name == gc.zip_hash(zip_path)[:16]
+    assert gc.open_cache(zip_path, mod.iter_columns).path == first.path
+    assert len(calls) == 1  # second open memory-maps the existing columns
+    assert first.n("stop_times") == 2 * 30 * 8  # both nested feeds, concatenated
+
+    feeds = _feeds(seed=2)
+    feeds["2"]["stops.txt"] = feeds["2"]["stops.txt"].replace("Stop 0,", "Flinders St,")
+    _write_nested(zip_path, feeds)
+    second = gc.open_cache(zip_path, mod.iter_columns)
+    assert second.path != first.path and len(calls) == 2
+    assert "Flinders St" in second.text("stops", "stop_name")
+    assert first.path.exists()  # the old zip's cache is left alone
+
+
+def test_flat_zip_and_missing_tables(curate, tmp_path):
+    mod, gc = curate
+    files = _feeds()["2"]
+    flat = tmp_path / "flat.zip"
+    with zipfile.ZipFile(flat, "w") as z:
+        for name, text in files.items():
+            z.writestr(name, text)
+    cache = gc.open_cache(flat, mod.iter_columns)
+    assert cache.text("routes", "route_id") == [r["route_id"] for r in _rows({"2": files}, "routes.txt")]
+
+    del files["trips.txt"]
+    _write_nested(tmp_path / "broken.zip", {"2": files})
+    with pytest.raises(FileNotFoundError, match="trips.txt"):
+        gc.open_cache(tmp_path / "broken.zip", mod.iter_columns)
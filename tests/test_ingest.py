@@ -0,0 +1,129 @@
+import hashlib
+import importlib
+import json
+import random
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from conftest import ROOT
+
+WORDS = "tram stop zone free city circle route swanston flinders collins bourke spencer".split()
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """scripts/ingest.py over a tmp KB of markdown sources (one an exact copy of another)."""
+    monkeypatch.syspath_prepend(str(ROOT / "scripts"))
+    monkeypatch.chdir(ROOT)  # make_chunks reads settings.yaml on import
+    mod = importlib.import_module("ingest")
+    make_chunks = importlib.import_module("make_chunks")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data/kb").mkdir(parents=True)
+    rng = random.Random(0)
+    paths = []
+    for name in ("a", "b", "c"):
+        p = tmp_path / f"{name}.md"
+        p.write_text(" ".join(rng.choice(WORDS) + str(rng.randrange(1000)) for _ in range(150)), encoding="utf-8")
+        paths.append(str(p))
+    (tmp_path / "copy.md").write_text((tmp_path / "a.md").read_text(encoding="utf-8"), encoding="utf-8")
+    paths.append(str(tmp_path / "copy.md"))
+    cfg = {
+        "chunk": {"size_chars": 200, "overlap_chars": 20},
+        "sources": {"include_markdown": paths},
+        "dedupe": {"enabled": True},
+        "ingest": {"batch_size": 3, "queue_batches": 1},
+        "embed": {"model_name": "fake", "normalize": True, "cache_path": ""},
+        "store": {"kind": "mmap", "path": "data/kb/vectorstore"},
+    }
+    monkeypatch.setattr(mod, "CFG", cfg)
+    monkeypatch.setattr(make_chunks, "CFG", cfg)
+    return mod, tmp_path
+
+
+class _Encoder:
+    def __init__(self, fail_after=None):
+        self.texts = []
+        self.fail_after = fail_after
+
+    def __call__(self, texts):
+        if self.fail_after is not None and len(self.texts) >= self.fail_after:
+            raise RuntimeError("encoder crashed")
+        self.texts += texts
+        X = np.stack([np.frombuffer(hashlib.sha256(t.encode()).digest(), dtype=np.uint8)[:16] for t in texts])
+        X = X.astype(np.float32) - 127.5
+        return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def _run(fn, timeout=30):
+    """Call fn in a thread; the test fails (rather than hangs) if it doesn't return."""
+    box = {}
+
+    def target():
+        try:
+            box["result"] = fn()
+        except BaseException as e:
+            box["error"] = e
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "ingest hung"
+    return box
+
+
+def _indexed(tmp_path):
+    lines = (tmp_path / "data/kb/chunks.jsonl").read_text(encoding="utf-8").splitlines()
+    chunks = [json.loads(line) for line in lines]
+    return chunks, [ch for ch in chunks if "dup_of" not in ch]
+
+
+def test_ingest_writes_a_deduped_store(ingest):
+    mod, tmp_path = ingest
+    enc = _Encoder()
+    assert "error" not in _run(lambda: mod.main(enc))
+    chunks, kept = _indexed(tmp_path)
+    assert len(kept) < len(chunks)  # copy.md's chunks were marked, not indexed
+    vs = importlib.import_module("mmap_store").MmapVectorStore(tmp_path / "data/kb/vectorstore/mmap", None)
+    assert len(vs) == len(kept) == len(enc.texts)
+    assert [vs.text(i) for i in range(len(vs))] == [ch["text"] for ch in kept]
+    survivor = next(ch for ch in kept if "sources" in ch["meta"])
+    row = [ch["id"] for ch in kept].index(survivor["id"])
+    assert vs.metadata(row)["sources"] == [str(tmp_path / "a.md"), str(tmp_path / "copy.md")]
+    ids, _ = vs.search_vectors(_Encoder()([kept[5]["text"]]), 1)
+    assert ids[0, 0] == 5
+
+    enc2 = _Encoder()
+    assert "error" not in _run(lambda: mod.main(enc2))
+    assert enc2.texts == []  # unchanged KB: every vector reused from the store
+
+
+def test_producer_error_is_reraised_not_hung(ingest, monkeypatch):
+    mod, tmp_path = ingest
+    assert "error" not in _run(lambda: mod.main(_Encoder()))
+    before = sorted(p.name for p in (tmp_path / "data/kb/vectorstore/mmap").iterdir())
+
+    def broken(merged=None):
+        for i in range(10):
+            yield {"id": f"c{i}", "text": f"chunk {i}", "meta": {}}
+        raise ValueError("extractor blew up")
+    monkeypatch.setattr(mod, "stream_chunks", broken)
+    box = _run(lambda: mod.main(_Encoder()))
+    assert isinstance(box.get("error"), ValueError)
+    store = tmp_path / "data/kb/vectorstore"
+    assert sorted(p.name for p in (store / "mmap").iterdir()) == before  # old store untouched
+    assert not (store / "mmap.building").exists()
+
+
+def test_consumer_error_stops_the_producer(ingest):
+    mod, tmp_path = ingest
+    box = _run(lambda: mod.main(_Encoder(fail_after=3)))
+    assert isinstance(box.get("error"), RuntimeError)
+    for t in threading.enumerate():
+        if t.name == "ingest-extract":  # stop is set: a producer blocked on the full queue exits
+            t.join(5)
+            assert not t.is_alive()
+    assert not (tmp_path / "data/kb/vectorstore/mmap").exists()
+    assert not (tmp_path / "data/kb/vectorstore/mmap.building").exists()
@@ -0,0 +1,104 @@
+import functools
+import importlib
+import json
+import random
+
+import pytest
+
+from conftest import ROOT
+
+WORDS = "tram stop zone free city circle route swanston flinders collins bourke spencer".split()
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """make_chunks on a tmp KB of three markdown sources, with md_to_chunks counting calls."""
+    monkeypatch.syspath_prepend(str(ROOT / "scripts"))
+    monkeypatch.chdir(ROOT)  # settings.yaml is read on import
+    mod = importlib.import_module("make_chunks")
+    manifest = importlib.import_module("kb_manifest")
+    monkeypatch.chdir(tmp_path)  # CHUNKS / MANIFEST_PATH are relative to the cwd
+    (tmp_path / "data/kb").mkdir(parents=True)
+    rng = random.Random(0)
+    paths = []
+    for name in ("a", "b", "c"):
+        p = tmp_path / f"{name}.md"
+        p.write_text(" ".join(rng.choice(WORDS) + str(rng.randrange(1000)) for _ in range(120)), encoding="utf-8")
+        paths.append(str(p))
+    monkeypatch.setattr(mod, "CFG", {
+        "chunk": {"size_chars": 200, "overlap_chars": 20},
+        "sources": {"include_markdown": paths},
+        "dedupe": {"enabled": True},
+    })
+    calls = []
+
+    @functools.wraps(mod.md_to_chunks)  # the manifest records the extractor by __name__
+    def counting(path, _inner=mod.md_to_chunks):
+        calls.append(path.name)
+        return _inner(path)
+    monkeypatch.setattr(mod, "md_to_chunks", counting)
+    return mod, manifest, tmp_path, calls
+
+
+def _build(mod):
+    return [ch["id"] for ch in mod.stream_chunks()]
+
+
+def _by_source(tmp_path):
+    out = {}
+    for line in (tmp_path / "data/kb/chunks.jsonl").read_text(encoding="utf-8").splitlines():
+        ch = json.loads(line)
+        out.setdefault(ch["meta"]["source"], []).append(ch)
+    return out
+
+
+def test_unchanged_sources_are_replayed_without_rechunking(kb):
+    mod, _, tmp_path, calls = kb
+    first = _build(mod)
+    assert sorted(calls) == ["a.md", "b.md", "c.md"] and len(first) > 6
+    before = (tmp_path / "data/kb/chunks.jsonl").read_text(encoding="utf-8")
+    calls.clear()
+    assert _build(mod) == first
+    assert calls == []
+    assert (tmp_path / "data/kb/chunks.jsonl").read_text(encoding="utf-8") == before
+
+
+def test_modified_source_is_rechunked_and_spliced_in_place(kb):
+    mod, _, tmp_path, calls = kb
+    first = _build(mod)
+    old = _by_source(tmp_path)
+    b = tmp_path / "b.md"
+    b.write_text(b.read_text(encoding="utf-8") + " brand new trailing sentence about myki", encoding="utf-8")
+    calls.clear()
+    second = _build(mod)
+    assert calls == ["b.md"]
+    new = _by_source(tmp_path)
+    assert [s for s in new] == [s for s in old]  # build order kept: b's chunks stay between a and c
+    for src in (str(tmp_path / "a.md"), str(tmp_path / "c.md")):
+        assert new[src] == old[src]
+    assert new[str(b)][-1]["text"].endswith("about myki")
+    assert set(second) - set(first) and set(first) - set(second)
+    entry = json.loads((tmp_path / "data/kb/build_manifest.json").read_text())["sources"][str(b)]
+    assert entry["chunk_ids"] == [ch["id"] for ch in new[str(b)]]
+
+
+def test_deleted_source_drops_its_chunks(kb):
+    mod, _, tmp_path, calls = kb
+    _build(mod)
+    gone = set(ch["id"] for ch in _by_source(tmp_path)[str(tmp_path / "c.md")])
+    (tmp_path / "c.md").unlink()
+    calls.clear()
+    ids = _build(mod)
+    assert calls == []
+    assert not gone & set(ids)
+    assert str(tmp_path / "c.md") not in _by_source(tmp_path)
+    assert str(tmp_path / "c.md") not in json.loads((tmp_path / "data/kb/build_manifest.json").read_text())["sources"]
+
+
+def test_chunker_version_bump_forces_full_rebuild(kb, monkeypatch):
+    mod, manifest, _, calls = kb
+    first = _build(mod)
+    calls.clear()
+    monkeypatch.setattr(manifest, "CHUNKER_VERSION", manifest.CHUNKER_VERSION + 1)
+    assert _build(mod) == first  # same chunker output, but every source was re-extracted
+    assert sorted(calls) == ["a.md", "b.md", "c.md"]
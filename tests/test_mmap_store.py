@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from scripts import mmap_store
+from scripts.mmap_store import MmapVectorStore, write_store
+
+
+def _unit(n, dim=16, seed=0):
+    X = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def _write(path, X, prefix="t", **kw):
+    return write_store(path, X, [f"{prefix}{i}" for i in range(len(X))],
+                       [{"kind": ["a", "b", "c"][i % 3]} for i in range(len(X))], **kw)
+
+
+def test_search_matches_brute_force(tmp_path):
+    X = _unit(200)
+    vs = MmapVectorStore(_write(tmp_path / "mmap", X), None)
+    Q = _unit(5, seed=1)
+    ids, _ = vs.search_vectors(Q, 7)
+    expect = np.argsort(-(Q @ X.T), axis=1)[:, :7]
+    assert np.array_equal(ids, expect)
+    mask = vs.filter_mask({"kind": "b"})
+    ids, _ = vs.search_vectors(Q, 7, mask=mask)
+    assert np.all(ids % 3 == 1)
+
+
+def test_quantized_rebuild_does_not_reuse_old_flat_index(tmp_path):
+    out = tmp_path / "mmap"
+    _write(out, _unit(50))
+    X = _unit(20, seed=2)
+    _write(out, X, quantization={"mode": "int8"})
+    vs = MmapVectorStore(out, None)
+    assert vs.index is None and len(vs) == 20
+    ids, _ = vs.search_vectors(X[:5], 5)
+    assert ids.max() < 20 and list(ids[:, 0]) == [0, 1, 2, 3, 4]
+
+
+def test_interrupted_build_leaves_old_store_intact(tmp_path, monkeypatch):
+    out = tmp_path / "mmap"
+    _write(out, _unit(30))
+    before = MmapVectorStore(out, None).generation
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(mmap_store, "build_bm25", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        _write(out, _unit(10, seed=5), prefix="new")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mmap"]
+    vs = MmapVectorStore(out, None)
+    assert vs.generation == before and len(vs) == 30 and vs.text(4) == "t4"
+    assert vs.bm25.n_docs == 30
+
+
+def test_open_store_survives_a_rebuild(tmp_path):
+    out = tmp_path / "mmap"
+    X = _unit(30)
+    old = MmapVectorStore(_write(out, X), None)
+    _write(out, _unit(12, seed=9), prefix="new")
+    assert old.text(3) == "t3" and np.allclose(old.vectors[3], X[3])
+    assert MmapVectorStore(out, None).text(3) == "new3"
+
+
+@pytest.mark.parametrize("kind,mode", [("ivf_flat", "int8"), ("ivf_flat", "pq"),
+                                       ("hnsw", "float16"), ("hnsw", "pq")])
+def test_ann_index_holds_the_quantized_codes(tmp_path, kind, mode):
+    faiss = pytest.importorskip("faiss")
+    rng = np.random.default_rng(4)
+    X = np.repeat(_unit(20, seed=4), 60, axis=0) + rng.normal(0, 0.15, (1200, 16)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    out = _write(tmp_path / "mmap", X, index_kind=kind, ann={"nprobe": 8, "ef_search": 64},
+                 quantization={"mode": mode, "pq_m": 4, "pq_nbits": 6, "min_candidates": 50})
+    assert not (out / "codes.npy").exists() and not (out / "pq.faiss").exists()
+    vs = MmapVectorStore(out, None)
+    assert vs.manifest["index"]["quantized"] and vs.quant is None
+    codes = faiss.downcast_index(vs.index.storage) if kind == "hnsw" else vs.index
+    assert codes.code_size < 16 * 4  # no full float32 vectors in the index
+
+    Q = X[:30] + rng.normal(0, 0.05, (30, 16)).astype(np.float32)
+    ids, scores = vs.search_vectors(Q, 5)
+    assert np.allclose(scores, np.take_along_axis(Q @ X.T, ids, axis=1), atol=1e-5)  # exact rerank
+    exact = np.argsort(-(Q @ X.T), axis=1)[:, :5]
+    assert np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids.tolist(), exact.tolist())]) >= 0.9
+    ids, _ = vs.search_vectors(Q, 5, mask=vs.filter_mask({"kind": "b"}))
+    assert np.all(ids % 3 == 1)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from scripts.mmr import mmr_select
+
+maximal_marginal_relevance = pytest.importorskip("langchain_community.vectorstores.utils").maximal_marginal_relevance
+
+
+def _unit(X):
+    return X / np.linalg.norm(X, axis=-1, keepdims=True)
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.25, 0.5, 0.9, 1.0])
+def test_matches_langchain(lambda_mult):
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        C = _unit(rng.normal(size=(30, 16)).astype(np.float32))
+        q = _unit(rng.normal(size=16).astype(np.float32))
+        ours = mmr_select(q, C, k=6, lambda_mult=lambda_mult)
+        theirs = maximal_marginal_relevance(q, list(C), lambda_mult=lambda_mult, k=6)
+        assert ours == theirs
+
+
+def test_first_pick_is_most_similar_at_lambda_zero():
+    C = np.eye(4, dtype=np.float32)
+    q = np.array([0.1, 0.2, 0.9, 0.3], dtype=np.float32)
+    assert mmr_select(q, C, k=1, lambda_mult=0.0) == [2]
+
+
+def test_k_larger_than_candidates_and_empty():
+    C = np.eye(3, dtype=np.float32)
+    assert sorted(mmr_select(C[0], C, k=10)) == [0, 1, 2]
+    assert mmr_select(C[0], np.zeros((0, 3), dtype=np.float32), k=4) == []
@@ -0,0 +1,85 @@
+import time
+
+from scripts.ollama_keeper import OllamaKeeper
+
+
+class _FakeClient:
+    def __init__(self, installed=("llama3.2:3b",), fail=()):
+        self.installed = list(installed)
+        self.fail = set(fail)
+        self.loads = []
+
+    def list(self):
+        return {"models": [{"name": n} for n in self.installed]}
+
+    def generate(self, model, prompt, keep_alive):
+        self.loads.append(model)
+        if model in self.fail:
+            raise RuntimeError("boom")
+
+    def ps(self):
+        return {"models": [{"name": m, "expires_at": None} for m in self.installed
+                           if m.split(":")[0] in {n.split(":")[0] for n in self.loads}]}
+
+
+def _keeper(client, **kw):
+    keeper = OllamaKeeper(ping_interval_s=0, **kw)
+    keeper._client = client  # skip the lazy ollama.Client
+    return keeper
+
+
+def test_ensure_loads_once_and_matches_tagless_name():
+    client = _FakeClient()
+    keeper = _keeper(client)
+    keeper.ensure("llama3.2", background=False)
+    keeper.ensure("llama3.2", background=False)
+    assert client.loads == ["llama3.2"]
+    st = keeper.status("llama3.2")
+    assert st["state"] == "loaded" and st["resident"] is True
+
+
+def test_unpulled_model_is_not_loaded():
+    client = _FakeClient()
+    keeper = _keeper(client)
+    keeper.ensure("mistral", background=False)
+    assert client.loads == []
+    assert keeper.status("mistral")["state"] == "error"
+    assert "ollama pull mistral" in keeper.describe("mistral")
+
+
+def test_failed_warm_up_backs_off_until_retry_s():
+    client = _FakeClient(fail={"llama3.2:3b"})
+    keeper = _keeper(client, retry_s=60)
+    keeper.ensure("llama3.2:3b", background=False)
+    assert keeper.ensure("llama3.2:3b", background=False) is None
+    assert client.loads == ["llama3.2:3b"]  # the rerun didn't retry
+    keeper._models["llama3.2:3b"]["at"] -= 61
+    keeper.ensure("llama3.2:3b", background=False)
+    assert client.loads == ["llama3.2:3b"] * 2
+
+
+def test_ping_refreshes_only_the_selected_model_and_drops_the_rest():
+    client = _FakeClient(installed=("a:latest", "b:latest", "c:latest"), fail={"c"})
+    keeper = _keeper(client)
+    for m in ("c", "a", "b"):
+        keeper.ensure(m, background=False)
+    client.loads.clear()
+    keeper.ping()
+    assert client.loads == ["b"]
+    assert set(keeper._models) == {"a", "b"}  # the failed model is gone
+    keeper._models["a"]["used"] -= keeper.idle_s + 1
+    keeper.ping()
+    assert set(keeper._models) == {"b"}
+
+
+def test_ping_stops_once_the_selected_model_is_idle():
+    client = _FakeClient()
+    keeper = _keeper(client, idle_s=600)
+    keeper.ensure("llama3.2:3b", background=False)
+    keeper._models["llama3.2:3b"]["used"] = time.time() - 601
+    client.loads.clear()
+    keeper.ping()
+    assert client.loads == []
+    keeper.ensure("llama3.2:3b", background=False)  # selected again on a rerun
+    keeper.ping()
+    assert client.loads == ["llama3.2:3b"]
@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import Embeddings
+
+from scripts.query_cache import CachedEmbeddings, QueryEmbeddingCache, normalize_query
+
+
+class _Counting(Embeddings):
+    """Deterministic fake encoder that records every text it is asked to embed."""
+
+    def __init__(self):
+        self.seen = []
+
+    def _vec(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+    def embed_documents(self, texts):
+        self.seen += list(texts)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        self.seen.append(text)
+        return self._vec(text)
+
+
+def _cached(max_entries=8, db_path=None, model="minilm"):
+    inner = _Counting()
+    return CachedEmbeddings(inner, model, QueryEmbeddingCache(max_entries, db_path)), inner
+
+
+def test_normalized_variants_share_one_entry():
+    emb, inner = _cached()
+    first = emb.embed_query("Is the City Circle   free?")
+    assert emb.embed_query("  is the city circle free?\n") == first
+    assert emb.embed_query("IS THE CITY CIRCLE FREE?") == first
+    assert inner.seen == [normalize_query("Is the City Circle free?")]
+    assert emb.cache.stats()["hits_mem"] == 2 and emb.cache.stats()["misses"] == 1
+
+
+def test_lru_evicts_least_recently_used_at_capacity():
+    emb, inner = _cached(max_entries=2)
+    emb.embed_query("a")
+    emb.embed_query("b")
+    emb.embed_query("a")  # refresh a: b is now the oldest
+    emb.embed_query("c")
+    assert emb.cache.stats()["size_mem"] == 2
+    inner.seen.clear()
+    emb.embed_query("a")
+    emb.embed_query("c")
+    assert inner.seen == []
+    emb.embed_query("b")
+    assert inner.seen == ["b"]
+
+
+def test_models_do_not_share_entries():
+    cache = QueryEmbeddingCache()
+    a, b = _Counting(), _Counting()
+    CachedEmbeddings(a, "minilm", cache).embed_query("tram")
+    CachedEmbeddings(b, "mpnet", cache).embed_query("tram")
+    assert a.seen == b.seen == ["tram"]
+
+
+def test_batch_encodes_each_distinct_miss_once():
+    emb, inner = _cached()
+    emb.embed_query("free tram zone")
+    out = emb.embed_queries(["Free Tram Zone", "route 96", "ROUTE  96", "city loop"])
+    assert inner.seen == ["free tram zone", "route 96", "city loop"]
+    assert out[1] == out[2] and out[0] == emb.embed_query("free tram zone")
+
+
+def test_sqlite_tier_serves_a_fresh_process(tmp_path):
+    db = tmp_path / "qemb.sqlite"
+    emb, _ = _cached(db_path=db)
+    vec = emb.embed_query("bourke street mall")
+    emb2, inner2 = _cached(db_path=db)
+    assert emb2.embed_query("Bourke Street Mall") == pytest.approx(vec)
+    assert inner2.seen == [] and emb2.cache.stats()["hits_disk"] == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from scripts.route_planner import (
+    CURATED, FASTEST, FEWEST_TRANSFERS, TransferPlanner, build_planner, is_route_question, parse_trip,
+)
+
+pytestmark = pytest.mark.skipif(not (CURATED / "route_stops_cbd.csv").exists(),
+                                reason="curated GTFS CSVs not present")
+
+
+@pytest.fixture(scope="module")
+def planner():
+    return build_planner()
+
+
+def _names(planner, stops):
+    return {planner.graph.names[s] for s in stops}
+
+
+@pytest.mark.parametrize("mode", [FASTEST, FEWEST_TRANSFERS])
+def test_precomputed_tables_match_dijkstra(planner, mode):
+    for row, source in enumerate(planner.sources):
+        dist, _ = planner._dijkstra(source, mode)
+        np.testing.assert_allclose(planner._dist[mode][row], dist)
+
+
+def test_fewest_transfers_never_has_more_transfers(planner):
+    stops = planner.sources[::5]
+    for a in stops:
+        for b in stops:
+            if a == b:
+                continue
+            fast = planner.plan([a], [b], FASTEST)
+            few = planner.plan([a], [b], FEWEST_TRANSFERS)
+            assert fast is not None and few is not None
+            assert few.transfers <= fast.transfers
+            assert fast.seconds <= few.seconds + 1e-6
+
+
+def test_station_names_resolve_to_the_station_only(planner):
+    assert _names(planner, planner.resolve("Flinders Street Station")) == {
+        "Flinders Street Railway Station/Elizabeth St #1"}
+    assert all("Southern Cross" in n for n in _names(planner, planner.resolve("Southern Cross")))
+
+
+@pytest.mark.parametrize("place", ["Queen Victoria Market", "flinders", "nowhere in particular"])
+def test_loose_or_ambiguous_names_do_not_resolve(planner, place):
+    assert planner.resolve(place) == ()
+
+
+def test_resolve_cache_is_per_instance(planner):
+    other = TransferPlanner(planner.graph)
+    planner.resolve("melbourne central")
+    assert "melbourne central" in planner._resolved and not other._resolved
+
+
+@pytest.mark.parametrize("query", [
+    "Is it free to ride from Flinders St to Melbourne Central?",
+    "Do I need to touch on my myki from Melbourne Central to Parliament?",
+    "what is the fare from casino to the mcg",
+])
+def test_fare_and_policy_questions_fall_through(planner, query):
+    assert not is_route_question(query)
+    assert planner.answer(query) is None
+
+
+def test_route_answer_names_origin_and_walk_starts(planner):
+    ans = planner.answer("how long from Flinders Street Station to Southern Cross")
+    assert ans is not None
+    lines = ans.splitlines()
+    assert lines[1].startswith("From Flinders Street Railway Station/Elizabeth St #1 to ")
+    assert all(" from " in line for line in lines if ". Walk about" in line)
+
+
+def test_parse_trip():
+    assert parse_trip("how do i get from flinders st to melbourne central?") == ("flinders st", "melbourne central")
+    assert parse_trip("how to get to the mcg from spencer st") == ("spencer st", "the mcg")
+    assert parse_trip("between casino and mcg") == ("casino", "mcg")
+    assert parse_trip("is route 96 free") is None
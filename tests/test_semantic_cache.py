@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from scripts.answer_cache import answer_key
+from scripts.semantic_cache import SemanticAnswerCache
+
+DIM = 16
+
+
+class _Clock:
+    def __init__(self, t=1_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _at(cos, base=0, other=1):
+    """Unit vector at cosine `cos` to axis `base` (scaled: the cache normalizes)."""
+    v = np.zeros(DIM, dtype=np.float32)
+    v[base], v[other] = cos, np.sqrt(1 - cos * cos)
+    return 3 * v
+
+
+def _ns(model="llama3.2:3b", generation="gen-1"):
+    return answer_key("", model, 0.2, 6, 0.5, generation, {"search_type": "mmr"})
+
+
+def test_threshold_boundary():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(_ns(), _at(1.0), "is the city circle free?", "Yes.", [])
+    hit = cache.get(_ns(), _at(0.91))
+    assert hit is not None and hit[:2] == ("is the city circle free?", "Yes.")
+    assert hit[3] == pytest.approx(0.91, abs=1e-5)
+    assert cache.get(_ns(), _at(0.89)) is None
+
+
+def test_closest_entry_above_threshold_wins():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(_ns(), _at(0.95, other=2), "near", "A1", [])
+    cache.put(_ns(), _at(1.0), "exact", "A2", [])
+    assert cache.get(_ns(), _at(1.0))[1] == "A2"
+
+
+def test_namespaces_are_isolated_by_model_and_generation():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(_ns(), _at(1.0), "q", "A", [])
+    assert cache.get(_ns(model="mistral"), _at(1.0)) is None
+    assert cache.get(_ns(generation="gen-2"), _at(1.0)) is None
+    cache.put(_ns(generation="gen-2"), _at(1.0), "q", "B", [])
+    assert cache.get(_ns(), _at(1.0))[1] == "A"
+    assert cache.get(_ns(generation="gen-2"), _at(1.0))[1] == "B"
+
+
+def test_max_entries_evicts_oldest_across_namespaces():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=3)
+    for i in range(5):
+        cache.put(_ns(generation=f"gen-{i % 2}"), _at(1.0, base=i, other=(i + 1) % DIM), f"q{i}", f"A{i}", [])
+    assert cache.stats()["size"] == 3
+    assert cache.get(_ns(generation="gen-0"), _at(1.0, base=0)) is None
+    assert cache.get(_ns(generation="gen-1"), _at(1.0, base=1)) is None
+    assert [cache.get(_ns(generation=f"gen-{i % 2}"), _at(1.0, base=i))[1] for i in (2, 3, 4)] == ["A2", "A3", "A4"]
+
+
+def test_entries_expire_after_max_age():
+    clock = _Clock()
+    cache = SemanticAnswerCache(threshold=0.9, max_age_seconds=60, clock=clock)
+    cache.put(_ns(), _at(1.0), "old", "A", [])
+    clock.t += 30
+    cache.put(_ns(), _at(1.0, base=2), "newer", "B", [])
+    clock.t += 30
+    assert cache.get(_ns(), _at(1.0))[1] == "A"  # exactly max_age old: still fresh
+    clock.t += 1
+    assert cache.get(_ns(), _at(1.0)) is None
+    assert cache.get(_ns(), _at(1.0, base=2))[1] == "B"
+    assert cache.stats()["size"] == 1
+    clock.t += 60
+    assert cache.get(_ns(), _at(1.0, base=2)) is None
+    assert cache._indexes == {}  # an emptied namespace drops its index
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from scripts.stop_index import StopIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    rng = np.random.default_rng(4)
+    # clustered like CBD stops, plus a few outliers far outside the grid's dense part
+    lat = np.concatenate([rng.normal(-37.815, 0.006, 400), rng.uniform(-37.9, -37.7, 20)])
+    lon = np.concatenate([rng.normal(144.963, 0.008, 400), rng.uniform(144.85, 145.1, 20)])
+    ids = [str(i) for i in range(len(lat))]
+    return StopIndex(ids, [f"stop {i}" for i in ids], lat, lon, cell_m=200)
+
+
+@pytest.fixture(scope="module")
+def queries():
+    rng = np.random.default_rng(5)
+    return rng.uniform(-37.95, -37.65, 300), rng.uniform(144.8, 145.15, 300)
+
+
+def _brute(index, lat, lon):
+    qx, qy = index.proj.to_xy(lat, lon)
+    x, y = index.proj.to_xy(index.lat, index.lon)
+    return np.sqrt((x[None, :] - np.ravel(qx)[:, None]) ** 2 + (y[None, :] - np.ravel(qy)[:, None]) ** 2)
+
+
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_nearest_matches_brute_force(index, queries, k):
+    lat, lon = queries
+    d = _brute(index, lat, lon)
+    expect = np.sort(d, axis=1)[:, :k]
+    for i in range(0, len(lat), 10):
+        got = index.nearest(lat[i], lon[i], k=k)
+        np.testing.assert_allclose([s.distance_m for s in got], expect[i], rtol=1e-9)
+    rows, dist = index.nearest_many(lat, lon, k=k)
+    np.testing.assert_allclose(dist, expect, rtol=1e-9)
+    np.testing.assert_allclose(np.take_along_axis(d, rows, 1), expect, rtol=1e-9)
+
+
+@pytest.mark.parametrize("radius", [50.0, 300.0, 5000.0])
+def test_within_matches_brute_force(index, queries, radius):
+    lat, lon = queries
+    d = _brute(index, lat, lon)
+    batch = index.within_many(lat, lon, radius)
+    for i, (rows, dist) in enumerate(batch):
+        expect = np.flatnonzero(d[i] <= radius)
+        assert sorted(rows.tolist()) == sorted(expect.tolist())
+        assert np.all(np.diff(dist) >= 0)
+        if i % 20 == 0:
+            single = index.within(lat[i], lon[i], radius)
+            assert sorted(int(s.stop_id) for s in single) == sorted(expect.tolist())
+
+
+def test_k_larger_than_stops_and_empty_batch():
+    index = StopIndex(["a", "b"], ["A", "B"], [-37.81, -37.82], [144.96, 144.97])
+    rows, dist = index.nearest_many([-37.81], [144.96], k=4)
+    assert rows[0, :2].tolist() == [0, 1] and rows[0, 2:].tolist() == [-1, -1]
+    assert np.isinf(dist[0, 2:]).all()
+    assert [s.stop_id for s in index.nearest(-37.82, 144.97, k=5)] == ["b", "a"]
+    assert index.nearest_many([], [], k=2)[0].shape == (0, 2)
+    assert index.within_many([], [], 100) == []